@@ -6,16 +6,20 @@ from __future__ import unicode_literals
 from __future__ import print_function
 
 import logging
+import socket
 import threading
-import time
-from collections import OrderedDict
 
-import requests
 from PyQt5.QtCore import QThread
+from werkzeug.debug import DebuggedApplication
+from werkzeug.serving import make_server
 
 from ..thread_support.gui_side import GuiSide
 from ..thread_support.thread_side import ThreadSide
 from ..constants import UERROR, ADD_TO_QUEUE
+from .events import EventHub
+from .qgis_events import QgisEventSource
+from .store import ResultStore
+from .wsgi import PooledWSGIServer
 
 logger = logging.getLogger('plutil.http.s')
 
@@ -46,12 +50,30 @@ class HttpServer(GuiSide):
         self.api = None
         self.prev_banner = None
 
-        # These are processed messages that the thread wants to keep track
-        # The gui side will process messages and keep them until
-        # the thread takes them out or the list becomes full.
-        self.messages = OrderedDict()
-        self.messages_limit = 100
-        self.messages_lock = threading.Lock()
+        # The results of processed messages are kept until the clients
+        # take them out or they expire; the oldest are evicted when
+        # there are too many.
+        self.results = ResultStore(
+            max_entries=int(plugin.get('http-server/result-limit', 1000)),
+            max_bytes=int(plugin.get('http-server/result-bytes',
+                                     32 * 1024 * 1024)),
+            ttl=float(plugin.get('http-server/result-ttl', 60)),
+            waiters_limit=int(plugin.get('http-server/max-waiters', 16)),
+            max_wait=float(plugin.get('http-server/max-wait', 30)))
+
+        # The operations that can be submitted in bulk, by name.
+        self.operations = {}
+        self.max_batch = int(plugin.get('http-server/max-batch', 1000))
+
+        # The clients of the /events stream; the signals of QGIS are
+        # connected while someone listens to them.
+        self.events = EventHub(
+            buffer_size=int(plugin.get('http-server/event-buffer', 256)),
+            max_subscribers=int(plugin.get('http-server/max-subscribers', 16)),
+            listener=self.event_topics_changed)
+        self.event_heartbeat = float(
+            plugin.get('http-server/event-heartbeat', 15))
+        self.qgis_events = QgisEventSource(self.events)
 
     def __str__(self):
         """ Represent this object as a human-readable string. """
@@ -61,17 +83,106 @@ class HttpServer(GuiSide):
         """ Represent this object as a python constructor. """
         return 'HttpServer()'
 
-    def message_accepted(self, message):
-        """ We re-implement this so that we can add the message to queue. """
-        if message.on_gui_side() == ADD_TO_QUEUE:
-            with self.messages_lock:
-                self.messages[str(message.message_id)] = message
-                logger.debug("added message %r to http gui side queue",
-                             message.message_id)
-                while len(self.messages) > self.messages_limit:
-                    logger.debug("dropping message %r because queue is full",
-                                 message.message_id)
-                    self.messages.popitem()
+    def message_handled(self, message, result):
+        """
+        We re-implement this so that we can store the result.
+
+        Only the result type and data are kept, not the message. The
+        result is also pushed to the subscribers of the `result` topic;
+        it stays in the store for the clients that poll.
+        """
+        if result == ADD_TO_QUEUE:
+            self.results.put(message.external_id,
+                             message.result_type, message.result_data)
+            logger.debug("stored the result of message %r",
+                         message.external_id)
+            if self.events.wanted(EventHub.TOPIC_RESULT):
+                self.events.publish(EventHub.TOPIC_RESULT, {
+                    'id': message.external_id,
+                    'status': message.result_type,
+                    'result': message.result_data,
+                })
+
+    def event_topics_changed(self, topics):
+        """
+        Called by the event hub in a request thread when the topics
+        with subscribers changed; the signals of QGIS are connected
+        or disconnected in the gui thread.
+
+        sync() looks at the topics of the hub when it runs, so calls
+        that arrive out of order do no harm.
+        """
+        server_thread = self.server_thread
+        if server_thread is not None:
+            server_thread.call_in_gui(self.qgis_events.sync)
+
+    def register_operation(self, name, factory):
+        """
+        Makes an operation available to the /submit route.
+
+        Arguments:
+            name (str):
+                The name clients use.
+            factory (callable):
+                Called in a request thread with the plugin, the server
+                thread and the parameters sent by the client (a dict);
+                returns the HttpMessage that performs the operation.
+                It may raise ValueError for bad parameters.
+        """
+        self.operations[name] = factory
+
+    def submit_many(self, operations):
+        """
+        Creates the messages for a list of operations and sends them to
+        the gui thread in a single envelope. Called in request threads.
+
+        Arguments:
+            operations (list):
+                Dictionaries with the name of the operation under `op`
+                and its parameters under `params`.
+
+        Returns:
+            The list of the ids of the results, in the same order.
+
+        Raises:
+            ValueError if the list is too long, an operation is unknown
+            or its parameters are wrong; nothing is sent in that case.
+            RuntimeError if the server is not running or it is too busy.
+        """
+        if len(operations) > self.max_batch:
+            raise ValueError("At most %d operations may be submitted "
+                             "at once" % self.max_batch)
+        server_thread = self.server_thread
+        if server_thread is None:
+            raise RuntimeError("The server is not running")
+        messages = []
+        for index, operation in enumerate(operations):
+            name = operation.get('op') if isinstance(operation, dict) \
+                else None
+            factory = self.operations.get(name)
+            if factory is None:
+                raise ValueError("Operation %d: unknown operation %r" % (
+                    index, name))
+            try:
+                messages.append(factory(
+                    self.plugin, server_thread,
+                    operation.get('params') or {}))
+            except ValueError as exc:
+                raise ValueError("Operation %d: %s" % (index, exc))
+        if not server_thread.send_batch(messages):
+            raise RuntimeError("The server is too busy")
+        return [message.external_id for message in messages]
+
+    def stats(self):
+        """
+        The statistics of GuiSide.stats() and, under `results` and
+        `events`, those of the result store (see ResultStore.stats())
+        and of the event hub (see EventHub.stats()).
+        """
+        result = super(HttpServer, self).stats()
+        result['results'] = self.results.stats()
+        result['events'] = self.events.stats()
+        return result
 
     def start(self, host=None, port=None):
         """
@@ -101,6 +212,15 @@ class HttpServer(GuiSide):
 
             self.server_thread = ServerThread(
                 host=host, port=port, app=self.app, server=self)
+            if self.server_thread.mode == ServerThread.MODE_PRODUCTION:
+                # Event streams and waiting requests hold a thread of
+                # the pool; leave one for the others.
+                threads = self.server_thread.threads
+                self.events.max_subscribers = min(
+                    self.events.max_subscribers, max(1, threads // 2))
+                free = threads - self.events.max_subscribers - 1
+                if self.results.waiters_limit > free:
+                    self.results.limit_waiters(max(1, free))
 
             # Register routes.
             define_common_routes(app=self.app, server=self, plugin=self.plugin)
@@ -121,37 +241,21 @@ class HttpServer(GuiSide):
     def stop(self, host=None, port=None):
         """
         Stops the http server.
+
+        The server thread is asked to stop serving and is forgotten
+        without waiting for it, so the gui does not freeze; it ends
+        once the requests it is serving are done. `host` and `port`
+        are not used any more.
         """
         logger.debug("flask server is being stopped...")
 
         try:
-            if host is None:
-                host = self.plugin.get('http-server/host', '127.0.0.1')
-            if port is None:
-                port = int(self.plugin.get('http-server/port', 7768))
-
-            # Asking the server to shut down nicely.
-            api_url = 'http://%s:%d/shut_me_down_used_for_restarts' % (host, port)
-            headers = {
-                'Content-Type': 'application/json',
-                'User-Agent': 'plutil',
-                'Accept': 'application/json'
-            }
-            response = requests.post(api_url, headers=headers)
-
-            # The server accepts or not.
-            if response.status_code == 200:
-                logger.debug("200 OK for request to shutdown")
-                logger.debug(response.content)
-                time.sleep(1)
-            else:
-                self.plugin.show_error(
-                    self.plugin.tr("Unable to stop server (%r)") %
-                    response.status_code)
-
-            # Terminate the thread.
-            self.server_thread.terminate()
-            self.server_thread.wait()
+            # Python threads cannot be killed; abort whatever work the
+            # thread is doing and forget about it. What it still sends
+            # is ignored.
+            self.server_thread.stop_serving()
+            self.cancel(self.server_thread, "server stopped")
+            self.retire(self.server_thread)
         except (SystemExit, KeyboardInterrupt):
             raise
         except Exception:
@@ -160,6 +264,11 @@ class HttpServer(GuiSide):
 
         self.server_thread = None
 
+        # Ends the event streams; with no server thread the listener
+        # does not post anything to it.
+        self.events.close_all("server stopped")
+        self.qgis_events.disconnect()
+
         setattr(self.app, 'plutil_server', None)
         self.api = None
         self.app = None
@@ -171,7 +280,54 @@ class HttpServer(GuiSide):
 
 
 class ServerThread(ThreadSide, threading.Thread):
-    """ The object in the server thread. """
+    """
+    The object in the server thread.
+
+    The `http-server/mode` setting decides how the app is served:
+
+    - ``development`` (the default) uses the werkzeug server behind
+      Flask.run(), which starts a thread for each connection;
+    - ``production`` uses a PooledWSGIServer: at most
+      `http-server/threads` connections are served at a time, up to
+      `http-server/backlog` more wait to be accepted, idle connections
+      are closed after `http-server/keep-alive` seconds and stalled
+      ones after `http-server/request-timeout` seconds.
+
+    The Flask debug mode is enabled by `http-server/debug`; it is off
+    by default.
+
+    Attributes:
+        app (Flask):
+            The application being served.
+        host (str):
+            The address to listen on.
+        port (int):
+            The port to listen on.
+        server (HttpServer):
+            The gui side.
+        mode (str):
+            One of the MODE_ constants.
+        threads (int):
+            Connections served at the same time in production mode.
+        backlog (int):
+            Connections waiting to be accepted in production mode.
+        keep_alive (float):
+            Seconds an idle connection is kept in production mode.
+        request_timeout (float):
+            Seconds a stalled request is kept in production mode.
+        debug (bool):
+            Run the application in debug mode.
+        wsgi_server (BaseWSGIServer, None):
+            The server, once the thread runs.
+        stopping (threading.Event):
+            Set by stop_serving().
+    """
+    MODE_DEVELOPMENT = 'development'
+    MODE_PRODUCTION = 'production'
+
+    # Seconds between checks of `stopping`.
+    POLL_INTERVAL = 0.5
+
     def __init__(self, app, host, port, server):
         super(ServerThread, self).__init__(self)
         self.app = app
@@ -180,14 +336,71 @@ class ServerThread(ThreadSide, threading.Thread):
         self.plugin = server.plugin
         self.server = server
 
+        get = self.plugin.get
+        self.mode = get('http-server/mode', self.MODE_DEVELOPMENT)
+        self.threads = int(get('http-server/threads', 8))
+        self.backlog = int(get('http-server/backlog', 64))
+        self.keep_alive = float(get('http-server/keep-alive', 5))
+        self.request_timeout = float(get('http-server/request-timeout', 30))
+        self.debug = str(get('http-server/debug', False)).lower() in (
+            '1', 'true', 'yes')
+        self.wsgi_server = None
+        self.stopping = threading.Event()
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'ServerThread(%s:%d)' % (self.host, self.port)
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'ServerThread(host=%r, port=%r)' % (self.host, self.port)
+
+    def make_wsgi_server(self):
+        """ Creates the server for the configured mode. """
+        app = self.app
+        app.debug = self.debug
+        if self.mode == self.MODE_PRODUCTION:
+            return PooledWSGIServer(
+                self.host, self.port, app,
+                threads=self.threads, backlog=self.backlog,
+                keep_alive=self.keep_alive,
+                request_timeout=self.request_timeout)
+        if self.mode != self.MODE_DEVELOPMENT:
+            logger.warning("Unknown http server mode %r; using %r",
+                           self.mode, self.MODE_DEVELOPMENT)
+        if self.debug:
+            app = DebuggedApplication(app, evalex=False)
+        return make_server(self.host, self.port, app, threaded=True)
+
+    def stop_serving(self):
+        """
+        Asks the thread to stop serving. Does not wait for it, so it
+        can be called from the gui thread or from a request.
+        """
+        self.stopping.set()
+        wsgi_server = self.wsgi_server
+        if wsgi_server is not None:
+            # Wakes up the thread and releases the port right away.
+            try:
+                wsgi_server.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
     def run(self):
         # noinspection PyBroadException
         try:
             self.thread_side_started()
             self.plugin.logger.debug(
-                "Start serving at %r port %r",
-                self.host, self.port)
-            self.app.run(host=self.host, port=self.port, debug=True,
-                         load_dotenv=True, use_evalex=False, use_reloader=False)
-        except Exception as exc:
+                "Start serving at %r port %r in %s mode",
+                self.host, self.port, self.mode)
+            self.wsgi_server = self.make_wsgi_server()
+            self.wsgi_server.timeout = self.POLL_INTERVAL
+            while not self.stopping.is_set():
+                self.wsgi_server.handle_request()
+        except (Exception, SystemExit):
+            # werkzeug exits when the port is taken.
             self.plugin.logger.error("Failed to run the server", exc_info=True)
+        finally:
+            if self.wsgi_server is not None:
+                self.wsgi_server.server_close()
+            self.thread_side_finished()
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Contains the definition of the EventHub and Subscriber classes.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger('plutil.http.s')
+
+
+class Subscriber(object):
+    """
+    The events waiting to be streamed to one client.
+
+    Attributes:
+        topics (frozenset):
+            The topics the client asked for.
+        buffer (collections.deque):
+            (event_id, topic, data) tuples not yet sent, oldest first.
+        buffer_size (int):
+            The client is evicted when it falls this many events behind.
+        condition (threading.Condition):
+            Protects the buffer and signals new events.
+        closed (bool):
+            No more events will come.
+        reason (str, None):
+            Why the subscriber was closed.
+    """
+
+    def __init__(self, topics, buffer_size=256):
+        """
+        Constructor.
+
+        Arguments:
+            topics (iterable):
+                The topics the client asked for.
+            buffer_size (int):
+                The client is evicted when it falls this many events behind.
+        """
+        super(Subscriber, self).__init__()
+        self.topics = frozenset(topics)
+        self.buffer = deque()
+        self.buffer_size = buffer_size
+        self.condition = threading.Condition()
+        self.closed = False
+        self.reason = None
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'Subscriber(%s)' % ', '.join(sorted(self.topics))
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'Subscriber(topics=%r, buffer_size=%r)' % (
+            sorted(self.topics), self.buffer_size)
+
+    def push(self, event):
+        """
+        Adds an event to the buffer.
+
+        Returns:
+            False if the buffer is full; the event was not added.
+        """
+        with self.condition:
+            if self.closed:
+                return True
+            if len(self.buffer) >= self.buffer_size:
+                return False
+            self.buffer.append(event)
+            self.condition.notify()
+        return True
+
+    def close(self, reason=None):
+        """ Ends the stream; events still in the buffer are dropped. """
+        with self.condition:
+            if not self.closed:
+                self.closed = True
+                self.reason = reason
+                self.buffer.clear()
+            self.condition.notify_all()
+
+    def next(self, timeout=None):
+        """
+        Waits for the next event. Call from the thread of the client.
+
+        Returns:
+            An (event_id, topic, data) tuple or None if nothing arrived
+            in `timeout` seconds or the subscriber was closed.
+        """
+        with self.condition:
+            if not self.buffer and not self.closed:
+                self.condition.wait(timeout)
+            if self.buffer:
+                return self.buffer.popleft()
+            return None
+
+
+class EventHub(object):
+    """
+    Hands events produced in the gui thread to the clients of the
+    /events stream.
+
+    Each subscriber has a bounded buffer. A client that does not read
+    fast enough to keep it from filling up is evicted: its stream
+    ends, so one slow client cannot make the server hold an unbounded
+    number of events.
+
+    `listener`, if given, is called with the set of topics that have
+    subscribers each time that set changes, so the sources of events
+    are only connected while someone listens.
+
+    Attributes:
+        subscribers (list):
+            The subscribers.
+        topics (dict):
+            The number of subscribers of each topic.
+        lock (threading.Lock):
+            Protects the subscribers and the topics.
+        buffer_size (int):
+            The buffer size of new subscribers.
+        max_subscribers (int):
+            New subscribers are refused above this number.
+        listener (callable, None):
+            Called when the set of topics changes.
+        last_id (int):
+            The id of the last event.
+        published (int):
+            Number of events handed to subscribers.
+        evictions (int):
+            Number of subscribers evicted for being slow.
+    """
+    TOPIC_RESULT = 'result'
+    TOPIC_LAYER_EDITED = 'layer-edited'
+    TOPIC_LEGEND_CHANGED = 'legend-changed'
+    TOPIC_SELECTION_CHANGED = 'selection-changed'
+
+    # The topics produced by QGIS (see QgisEventSource).
+    QGIS_TOPICS = frozenset((TOPIC_LAYER_EDITED, TOPIC_LEGEND_CHANGED,
+                             TOPIC_SELECTION_CHANGED))
+    TOPICS = QGIS_TOPICS | {TOPIC_RESULT}
+
+    def __init__(self, buffer_size=256, max_subscribers=16, listener=None):
+        """
+        Constructor.
+
+        Arguments:
+            buffer_size (int):
+                The buffer size of new subscribers.
+            max_subscribers (int):
+                New subscribers are refused above this number.
+            listener (callable, None):
+                Called when the set of topics changes.
+        """
+        super(EventHub, self).__init__()
+        self.subscribers = []
+        self.topics = {}
+        self.lock = threading.Lock()
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self.listener = listener
+        self.last_id = 0
+        self.published = 0
+        self.evictions = 0
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'EventHub(%d)' % len(self.subscribers)
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'EventHub(buffer_size=%r, max_subscribers=%r)' % (
+            self.buffer_size, self.max_subscribers)
+
+    def __len__(self):
+        return len(self.subscribers)
+
+    def wanted(self, topic):
+        """ Does anyone listen to this topic? Cheap; no lock is taken. """
+        return topic in self.topics
+
+    def subscribe(self, topics):
+        """
+        Creates a subscriber for some topics.
+
+        Raises:
+            RuntimeError if there are too many subscribers.
+        """
+        subscriber = Subscriber(topics, self.buffer_size)
+        with self.lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                raise RuntimeError("Too many subscribers")
+            self.subscribers.append(subscriber)
+            changed = self.count_topics(subscriber, 1)
+        if changed:
+            self.topics_changed()
+        logger.debug("%s subscribed", subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber, reason=None):
+        """ Removes a subscriber and closes it. """
+        with self.lock:
+            if subscriber not in self.subscribers:
+                changed = False
+            else:
+                self.subscribers.remove(subscriber)
+                changed = self.count_topics(subscriber, -1)
+        subscriber.close(reason)
+        if changed:
+            self.topics_changed()
+
+    def count_topics(self, subscriber, delta):
+        """
+        Updates the number of subscribers of each topic. Call with
+        the lock held.
+
+        Returns:
+            True if a topic appeared or disappeared.
+        """
+        topics = dict(self.topics)
+        changed = False
+        for topic in subscriber.topics:
+            count = topics.get(topic, 0) + delta
+            if count > 0:
+                changed = changed or topic not in topics
+                topics[topic] = count
+            else:
+                topics.pop(topic, None)
+                changed = True
+        # Replaced, not changed in place, so wanted() needs no lock.
+        self.topics = topics
+        return changed
+
+    def topics_changed(self):
+        """ Tells the listener which topics have subscribers now. """
+        if self.listener is not None:
+            try:
+                self.listener(set(self.topics))
+            except Exception:
+                logger.error("Event listener failed", exc_info=True)
+
+    def publish(self, topic, data):
+        """
+        Hands an event to the subscribers of its topic.
+
+        Subscribers whose buffer is full are evicted.
+
+        Arguments:
+            topic (str):
+                The kind of event.
+            data:
+                The payload; must be json friendly.
+        """
+        if topic not in self.topics:
+            return
+        slow = []
+        with self.lock:
+            self.last_id = self.last_id + 1
+            event = (self.last_id, topic, data)
+            for subscriber in self.subscribers:
+                if topic not in subscriber.topics:
+                    continue
+                if subscriber.push(event):
+                    self.published = self.published + 1
+                else:
+                    slow.append(subscriber)
+            self.evictions = self.evictions + len(slow)
+        for subscriber in slow:
+            logger.warning("%s was evicted for reading too slowly",
+                           subscriber)
+            self.unsubscribe(subscriber, "slow consumer")
+
+    def close_all(self, reason=None):
+        """ Ends all the streams. """
+        for subscriber in list(self.subscribers):
+            self.unsubscribe(subscriber, reason)
+
+    def stats(self):
+        """ The state of the hub, suitable for json. """
+        with self.lock:
+            return {
+                'subscribers': len(self.subscribers),
+                'topics': dict(self.topics),
+                'published': self.published,
+                'evictions': self.evictions,
+            }
@@ -24,6 +24,11 @@ class HttpMessage(TsMessage):
             For success the type of object depends on the message.
     """
 
+    __slots__ = ('result_type', 'result_data')
+
+    # The ids are handed to http clients.
+    opaque_id = True
+
     def __init__(self, *args, **kwargs):
         """
         Constructor.
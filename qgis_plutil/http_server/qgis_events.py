@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Contains the definition of the QgisEventSource class.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+
+from .events import EventHub
+
+logger = logging.getLogger('plutil.http.s')
+
+
+class QgisEventSource(object):
+    """
+    Turns the signals of the QGIS project into EventHub events.
+
+    The signals are only connected while someone subscribed to the
+    topics they produce; sync() connects and disconnects them to match
+    the topics of the hub. qgis is imported at that time, so the
+    http server can run without it as long as nobody asks for these
+    topics.
+
+    Everything here runs in the gui thread.
+
+    Attributes:
+        hub (EventHub):
+            Where the events go.
+        project (QgsProject, None):
+            The project to watch; the current one if None.
+        topics (frozenset):
+            The topics whose signals are connected.
+        connections (list):
+            (layer_id, signal, slot) tuples for the connected signals;
+            layer_id is None for the signals of the project.
+    """
+    # The signals of vector layers that produce each topic.
+    LAYER_SIGNALS = {
+        EventHub.TOPIC_LAYER_EDITED: 'layerModified',
+        EventHub.TOPIC_SELECTION_CHANGED: 'selectionChanged',
+    }
+
+    # The signals of the layer tree that mean the legend changed.
+    LEGEND_SIGNALS = ('addedChildren', 'removedChildren',
+                      'visibilityChanged', 'nameChanged')
+
+    def __init__(self, hub, project=None):
+        """
+        Constructor.
+
+        Arguments:
+            hub (EventHub):
+                Where the events go.
+            project (QgsProject, None):
+                The project to watch; the current one if None.
+        """
+        super(QgisEventSource, self).__init__()
+        self.hub = hub
+        self.project = project
+        self.topics = frozenset()
+        self.connections = []
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'QgisEventSource(%s)' % ', '.join(sorted(self.topics))
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'QgisEventSource(hub=%r)' % self.hub
+
+    def get_project(self):
+        """ The project to watch or None if qgis is not available. """
+        if self.project is not None:
+            return self.project
+        try:
+            from qgis.core import QgsProject
+        except ImportError:
+            logger.warning("qgis is not available; gui events are not sent")
+            return None
+        return QgsProject.instance()
+
+    def sync(self):
+        """ Connects the signals wanted by the subscribers of the hub. """
+        topics = frozenset(self.hub.topics) & EventHub.QGIS_TOPICS
+        if topics == self.topics:
+            return
+        self.disconnect()
+        if not topics:
+            return
+        project = self.get_project()
+        if project is None:
+            return
+        self.topics = topics
+
+        if EventHub.TOPIC_LEGEND_CHANGED in topics:
+            root = project.layerTreeRoot()
+            for name in self.LEGEND_SIGNALS:
+                self.connect(None, getattr(root, name),
+                             self.make_legend_slot(name))
+
+        if topics & set(self.LAYER_SIGNALS):
+            self.connect(None, project.layersAdded, self.layers_added)
+            self.connect(None, project.layerWillBeRemoved,
+                         self.layer_removed)
+            self.layers_added(list(project.mapLayers().values()))
+        logger.debug("%s connected", self)
+
+    def connect(self, layer_id, signal, slot):
+        signal.connect(slot)
+        self.connections.append((layer_id, signal, slot))
+
+    def disconnect(self, layer_id=None):
+        """
+        Disconnects the signals of a layer or, by default, all of them.
+        """
+        kept = []
+        for connection in self.connections:
+            if layer_id is not None and connection[0] != layer_id:
+                kept.append(connection)
+                continue
+            try:
+                connection[1].disconnect(connection[2])
+            except (TypeError, RuntimeError):
+                # Already gone with its layer.
+                pass
+        self.connections = kept
+        if layer_id is None:
+            self.topics = frozenset()
+
+    def layers_added(self, layers):
+        """ Connects the signals of new vector layers. """
+        for layer in layers:
+            layer_id = layer.id()
+            for topic, name in self.LAYER_SIGNALS.items():
+                signal = getattr(layer, name, None)
+                if topic in self.topics and signal is not None:
+                    self.connect(layer_id, signal,
+                                 self.make_layer_slot(topic, layer))
+
+    def layer_removed(self, layer_id):
+        self.disconnect(layer_id)
+
+    def make_layer_slot(self, topic, layer):
+        """ A slot that publishes an event about a layer. """
+        layer_id = layer.id()
+        if topic == EventHub.TOPIC_SELECTION_CHANGED:
+            def slot(*args):
+                self.hub.publish(topic, {
+                    'layer': layer_id,
+                    'name': layer.name(),
+                    'selected': layer.selectedFeatureCount(),
+                })
+        else:
+            def slot(*args):
+                self.hub.publish(topic, {
+                    'layer': layer_id,
+                    'name': layer.name(),
+                })
+        return slot
+
+    def make_legend_slot(self, change):
+        """ A slot that publishes a change of the layer tree. """
+        def slot(*args):
+            self.hub.publish(EventHub.TOPIC_LEGEND_CHANGED, {
+                'change': change,
+            })
+        return slot
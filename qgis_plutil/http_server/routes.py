@@ -7,7 +7,9 @@ from __future__ import print_function
 import logging
 from json import dumps
 
-from flask import request
+from flask import Response, request, stream_with_context
+
+from .events import EventHub
 
 logger = logging.getLogger('plutil.http.s')
 
@@ -30,10 +32,10 @@ def define_common_routes(plugin, app, server):
 
     @app.route('/shut_me_down_used_for_restarts', methods=['POST'])
     def route_shutdown():
-        func = request.environ.get('werkzeug.server.shutdown')
-        if func is None:
-            raise RuntimeError('Not running with the Werkzeug Server')
-        func()
+        server_thread = server.server_thread
+        if server_thread is None:
+            raise RuntimeError('The server is not running')
+        server_thread.stop_serving()
         return dumps({
             'status': 'OK',
             'result': "Shutting down..."
@@ -41,22 +43,24 @@ def define_common_routes(plugin, app, server):
 
     @app.route('/result', methods=['GET', 'POST'])
     def route_result():
+        """
+        Hands out a result. With `wait` the request waits at most that
+        many seconds for the result to be ready.
+        """
         logger.debug("We're being asked about a result")
 
         try:
             message_id = str(request.args['id'])
-            with server.messages_lock:
-                if message_id in server.messages:
-                    logger.debug("message %r found in queue", message_id)
-                    message = server.messages[message_id]
-                    del server.messages[message_id]
-                    result_type = message.result_type
-                    result_data = message.result_data
-                else:
-                    logger.debug("message %r NOT found in queue", message_id)
-                    result_type = 'NotFound'
-                    result_data = 'Result may not be ready or it ' \
-                                  'might have expired'
+            wait = float(request.args.get('wait', 0))
+            result = server.results.take(message_id, wait)
+            if result is not None:
+                logger.debug("message %r found in queue", message_id)
+                result_type, result_data = result
+            else:
+                logger.debug("message %r NOT found in queue", message_id)
+                result_type = 'NotFound'
+                result_data = 'Result may not be ready or it ' \
+                              'might have expired'
         except Exception:
             result_data = 'Exception in server while attempting to reply'
             result_type = 'Error'
@@ -66,3 +70,125 @@ def define_common_routes(plugin, app, server):
             'status': result_type,
             'result': result_data
         })
+
+    @app.route('/submit', methods=['POST'])
+    def route_submit():
+        """
+        Submits a list of operations at once (see
+        HttpServer.register_operation()). The body is a json list
+        of {"op": name, "params": {...}} objects, or an object with
+        that list under `operations`; the ids of the results are
+        returned in the same order.
+        """
+        try:
+            operations = request.get_json(force=True, silent=True)
+            if isinstance(operations, dict):
+                operations = operations.get('operations')
+            if not isinstance(operations, list):
+                raise ValueError("Expected a list of operations")
+            result_type = 'OK'
+            result_data = server.submit_many(operations)
+        except (ValueError, RuntimeError) as exc:
+            result_type = 'Error'
+            result_data = str(exc)
+        except Exception:
+            result_data = 'Exception in server while attempting to submit'
+            result_type = 'Error'
+            logger.error(result_data, exc_info=True)
+
+        return dumps({
+            'status': result_type,
+            'result': result_data
+        })
+
+    @app.route('/results', methods=['GET', 'POST'])
+    def route_results():
+        """
+        Hands out the results that are ready among a list of ids, given
+        as a comma separated `ids` argument or as a json object with
+        `ids` and `wait`. With `wait` the request waits at most that
+        many seconds for all of them to be ready.
+        """
+        logger.debug("We're being asked about many results")
+
+        try:
+            body = request.get_json(silent=True) or {}
+            if 'ids' in request.args:
+                ids = [result_id for result_id in
+                       request.args['ids'].split(',') if result_id]
+            else:
+                ids = [str(result_id) for result_id in body.get('ids', ())]
+            if len(ids) > server.max_batch:
+                raise ValueError("At most %d results may be requested "
+                                 "at once" % server.max_batch)
+            wait = float(request.args.get('wait', body.get('wait', 0)))
+            found = server.results.take_many(ids, wait)
+            result_type = 'OK'
+            result_data = {
+                result_id: {'status': found_type, 'result': found_data}
+                for result_id, (found_type, found_data) in found.items()
+            }
+        except ValueError as exc:
+            result_type = 'Error'
+            result_data = str(exc)
+        except Exception:
+            result_data = 'Exception in server while attempting to reply'
+            result_type = 'Error'
+            logger.error(result_data, exc_info=True)
+
+        return dumps({
+            'status': result_type,
+            'result': result_data
+        })
+
+    @app.route('/events', methods=['GET'])
+    def route_events():
+        """
+        A stream of server-sent events. `topics` is a comma separated
+        list of the topics to receive (see EventHub.TOPICS); only
+        results are sent by default.
+
+        Each event has an `id`, the topic as `event` and json `data`.
+        A comment is sent when nothing happened for a while, so dead
+        connections are noticed. A client that does not keep up is
+        evicted: it receives a `closed` event and the stream ends.
+        """
+        try:
+            topics = [topic for topic in request.args.get(
+                'topics', EventHub.TOPIC_RESULT).split(',') if topic]
+            unknown = set(topics) - EventHub.TOPICS
+            if unknown or not topics:
+                raise ValueError("Unknown topics: %s" % ', '.join(
+                    sorted(unknown)))
+            subscriber = server.events.subscribe(topics)
+        except (ValueError, RuntimeError) as exc:
+            return dumps({
+                'status': 'Error',
+                'result': str(exc)
+            })
+
+        heartbeat = server.event_heartbeat
+
+        def generate():
+            try:
+                yield ': subscribed to %s\n\n' % ','.join(topics)
+                while True:
+                    event = subscriber.next(heartbeat)
+                    if event is not None:
+                        yield 'id: %d\nevent: %s\ndata: %s\n\n' % (
+                            event[0], event[1], dumps(event[2]))
+                    elif subscriber.closed:
+                        yield 'event: closed\ndata: %s\n\n' % dumps(
+                            subscriber.reason)
+                        return
+                    else:
+                        yield ': keep-alive\n\n'
+            finally:
+                # Also when the client went away.
+                server.events.unsubscribe(subscriber)
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache',
+                     'X-Accel-Buffering': 'no'})
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+Contains the definition of the ResultStore class.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import sys
+import threading
+from collections import OrderedDict
+from time import perf_counter
+
+logger = logging.getLogger('plutil.http.s')
+
+
+def estimate_size(value, depth=4):
+    """
+    A cheap estimate of the number of bytes used by a result.
+
+    Lists, tuples and dictionaries are followed `depth` levels deep;
+    below that only their own size is counted.
+    """
+    size = sys.getsizeof(value)
+    if depth <= 0:
+        return size
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size = size + estimate_size(key, depth - 1) + \
+                estimate_size(item, depth - 1)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size = size + estimate_size(item, depth - 1)
+    return size
+
+
+class ResultStore(object):
+    """
+    Keeps the results of http messages until their clients collect them.
+
+    Only the result type and data of a message are kept, not the message
+    itself. A result lives for `ttl` seconds. When there are more than
+    `max_entries` results or they use more than `max_bytes` (estimated)
+    the oldest ones are evicted; the result being stored is always kept.
+    Evictions are counted and the first one is logged as a warning, as
+    it means clients lose results and the limits are too small.
+
+    A client may wait for a result that is not there yet (see take());
+    at most `waiters_limit` clients wait at the same time.
+
+    All methods may be called from any thread.
+
+    Attributes:
+        max_entries (int):
+            Maximum number of results.
+        max_bytes (int):
+            Maximum estimated size of all results.
+        ttl (float):
+            Number of seconds a result is kept.
+        max_wait (float):
+            Maximum number of seconds a client may wait.
+        entries (OrderedDict):
+            For each id a [deadline, size, result_type, result_data] list,
+            oldest first.
+        bytes (int):
+            Estimated size of all results.
+        lock (threading.Lock):
+            Protects everything else.
+        events (dict):
+            For each id someone waits for, the set of events of the
+            waiting clients.
+        waiting (int):
+            Number of clients waiting.
+        waiters_limit (int):
+            Maximum number of clients waiting at the same time.
+        waiters (threading.BoundedSemaphore):
+            One for each client that may still start waiting.
+        hits (int):
+            Number of results that were collected.
+        misses (int):
+            Number of requests for results that were not there.
+        evictions (int):
+            Number of results dropped to make room.
+        expirations (int):
+            Number of results dropped because nobody collected them in time.
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=32 * 1024 * 1024,
+                 ttl=60.0, waiters_limit=16, max_wait=30.0):
+        """
+        Constructor.
+
+        Arguments:
+            max_entries (int):
+                Maximum number of results.
+            max_bytes (int):
+                Maximum estimated size of all results.
+            ttl (float):
+                Number of seconds a result is kept.
+            waiters_limit (int):
+                Maximum number of clients waiting at the same time.
+            max_wait (float):
+                Maximum number of seconds a client may wait.
+        """
+        super(ResultStore, self).__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_wait = max_wait
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.events = {}
+        self.waiting = 0
+        self.waiters_limit = waiters_limit
+        self.waiters = threading.BoundedSemaphore(waiters_limit)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'ResultStore(%d)' % len(self.entries)
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'ResultStore(max_entries=%r, max_bytes=%r, ttl=%r)' % (
+            self.max_entries, self.max_bytes, self.ttl)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, result_id):
+        return result_id in self.entries
+
+    def limit_waiters(self, count):
+        """
+        Changes the number of clients that may wait at the same time.
+
+        Call before anyone waits.
+        """
+        self.waiters_limit = count
+        self.waiters = threading.BoundedSemaphore(count)
+
+    def put(self, result_id, result_type, result_data, now=None):
+        """
+        Stores a result and wakes up the clients waiting for it.
+
+        Arguments:
+            result_id (str):
+                The id that was handed to the client.
+            result_type (str):
+                The status reported to the client.
+            result_data:
+                The result reported to the client; must be json friendly.
+        """
+        if now is None:
+            now = perf_counter()
+        size = estimate_size(result_id) + estimate_size(result_data)
+        with self.lock:
+            self.drop_expired(now)
+            previous = self.entries.pop(result_id, None)
+            if previous is not None:
+                self.bytes = self.bytes - previous[1]
+            self.entries[result_id] = [
+                now + self.ttl, size, result_type, result_data]
+            self.bytes = self.bytes + size
+            self.evict()
+            for event in self.events.get(result_id, ()):
+                event.set()
+
+    def evict(self):
+        """
+        Drops the oldest results until we are within the limits.
+
+        The newest result is never dropped. Call with the lock held.
+        """
+        entries = self.entries
+        while len(entries) > 1 and (len(entries) > self.max_entries or
+                                    self.bytes > self.max_bytes):
+            result_id, entry = entries.popitem(last=False)
+            self.bytes = self.bytes - entry[1]
+            self.evictions = self.evictions + 1
+            if self.evictions == 1:
+                logger.warning(
+                    "Result %r was evicted before it was collected; the "
+                    "result store is too small (%d results, %d bytes). "
+                    "Further evictions are only counted.",
+                    result_id, self.max_entries, self.max_bytes)
+            else:
+                logger.debug("Result %r was evicted", result_id)
+
+    def drop_expired(self, now=None):
+        """
+        Forgets the results that nobody asked for in time.
+
+        All results live for the same number of seconds, so the expired
+        ones are at the start of the list. Call with the lock held.
+
+        Returns:
+            The number of results that were dropped.
+        """
+        if now is None:
+            now = perf_counter()
+        dropped = 0
+        entries = self.entries
+        while entries:
+            entry = next(iter(entries.values()))
+            if entry[0] >= now:
+                break
+            entries.popitem(last=False)
+            self.bytes = self.bytes - entry[1]
+            dropped = dropped + 1
+        if dropped:
+            self.expirations = self.expirations + dropped
+            logger.debug("%d results expired", dropped)
+        return dropped
+
+    def collect(self, missing, results):
+        """
+        Moves the results that are ready from the store to `results`.
+
+        Call with the lock held.
+
+        Arguments:
+            missing (set):
+                The ids still needed; the ones found are removed.
+            results (dict):
+                Receives a (result_type, result_data) tuple for each
+                id found.
+        """
+        entries = self.entries
+        found = [result_id for result_id in missing if result_id in entries]
+        for result_id in found:
+            entry = entries.pop(result_id)
+            self.bytes = self.bytes - entry[1]
+            results[result_id] = entry[2], entry[3]
+            missing.remove(result_id)
+        self.hits = self.hits + len(found)
+
+    def take(self, result_id, wait=None):
+        """
+        Removes a result from the store and returns it.
+
+        See take_many() for the meaning of `wait`.
+
+        Returns:
+            A (result_type, result_data) tuple or None if the result
+            is not ready in time (or it expired).
+        """
+        return self.take_many((result_id,), wait).get(result_id)
+
+    def take_many(self, result_ids, wait=None):
+        """
+        Removes a number of results from the store and returns them.
+
+        If some results are not there yet, the calling thread waits for
+        them at most `wait` seconds (capped to `max_wait`), returning
+        as soon as all are ready. No more than `waiters_limit` clients
+        wait at the same time; the others get their answer right away.
+
+        Arguments:
+            result_ids (iterable):
+                The ids that were handed to the client.
+            wait (float, None):
+                Seconds to wait for the results.
+
+        Returns:
+            A dictionary with a (result_type, result_data) tuple for
+            each id whose result was ready in time.
+        """
+        wanted = set(result_ids)
+        missing = set(wanted)
+        results = {}
+        with self.lock:
+            self.drop_expired()
+            self.collect(missing, results)
+            if not missing or not wait or wait <= 0:
+                self.misses = self.misses + len(missing)
+                return results
+            if not self.waiters.acquire(blocking=False):
+                logger.debug("too many waiting requests; %d results are "
+                             "not waited for", len(missing))
+                self.misses = self.misses + len(missing)
+                return results
+            event = threading.Event()
+            for result_id in missing:
+                self.events.setdefault(result_id, set()).add(event)
+            self.waiting = self.waiting + 1
+
+        deadline = perf_counter() + min(wait, self.max_wait)
+        try:
+            while True:
+                remaining = deadline - perf_counter()
+                if remaining <= 0 or not event.wait(remaining):
+                    break
+                with self.lock:
+                    # put() sets the event with the lock held, so
+                    # nothing is missed between clear() and collect().
+                    event.clear()
+                    self.collect(missing, results)
+                    if not missing:
+                        break
+        finally:
+            self.waiters.release()
+            with self.lock:
+                self.waiting = self.waiting - 1
+                for result_id in wanted:
+                    events = self.events.get(result_id)
+                    if events is not None:
+                        events.discard(event)
+                        if not events:
+                            del self.events[result_id]
+                self.collect(missing, results)
+                self.misses = self.misses + len(missing)
+        return results
+
+    def stats(self):
+        """ The state of the store, suitable for json. """
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'waiting': self.waiting,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Contains the definition of the PooledWSGIServer and PooledRequestHandler
+classes.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+logger = logging.getLogger('plutil.http.s')
+
+
+class PooledRequestHandler(WSGIRequestHandler):
+    """
+    Serves the requests of one connection in a PooledWSGIServer.
+
+    The connection is kept open between requests for at most
+    `keep_alive` seconds; once a request started, the client may not
+    stay silent (or stop reading the answer) for more than
+    `request_timeout` seconds.
+    """
+
+    @property
+    def protocol_version(self):
+        """ HTTP/1.0 closes the connection after each request. """
+        return 'HTTP/1.1' if self.server.keep_alive > 0 else 'HTTP/1.0'
+
+    def handle_one_request(self):
+        server = self.server
+        self.connection.settimeout(
+            server.keep_alive if server.keep_alive > 0
+            else server.request_timeout)
+        super(PooledRequestHandler, self).handle_one_request()
+
+    def parse_request(self):
+        # The first line arrived; the rest has its own deadline.
+        self.connection.settimeout(self.server.request_timeout)
+        return super(PooledRequestHandler, self).parse_request()
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    A WSGI server that handles connections in a fixed number of threads.
+
+    Unlike the development server, which starts a thread for each
+    connection, at most `threads` connections are served at a time;
+    a new connection is only accepted when a thread is free, so the
+    others wait in the listen backlog of the socket. Idle and slow
+    connections are closed (see PooledRequestHandler).
+
+    Call handle_request() in a loop, then server_close().
+
+    Attributes:
+        threads (int):
+            The number of connections served at the same time.
+        keep_alive (float):
+            Seconds an idle connection is kept open; 0 to close it
+            after each request.
+        request_timeout (float):
+            Seconds a client may stay silent in the middle of a request.
+        slots (threading.BoundedSemaphore):
+            One for each thread that is free.
+        slot_held (bool):
+            A slot was taken for the connection being accepted.
+        executor (ThreadPoolExecutor):
+            Runs the connections.
+    """
+    multithread = True
+
+    def __init__(self, host, port, app, threads=8, backlog=64,
+                 keep_alive=5.0, request_timeout=30.0, **kwargs):
+        """
+        Constructor.
+
+        Arguments:
+            host (str):
+                The address to listen on.
+            port (int):
+                The port to listen on.
+            app (callable):
+                The WSGI application.
+            threads (int):
+                The number of connections served at the same time.
+            backlog (int):
+                The number of connections the system keeps waiting for us.
+            keep_alive (float):
+                Seconds an idle connection is kept open.
+            request_timeout (float):
+                Seconds a client may stay silent in the middle of a request.
+        """
+        # Read by server_activate(), which the base class calls.
+        self.request_queue_size = backlog
+        self.threads = threads
+        self.keep_alive = keep_alive
+        self.request_timeout = request_timeout
+        self.slots = threading.BoundedSemaphore(threads)
+        self.slot_held = False
+        self.executor = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix='plutil-http')
+        kwargs.setdefault('handler', PooledRequestHandler)
+        super(PooledWSGIServer, self).__init__(host, port, app, **kwargs)
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'PooledWSGIServer(%s:%d)' % (self.host, self.port)
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'PooledWSGIServer(host=%r, port=%r, threads=%r)' % (
+            self.host, self.port, self.threads)
+
+    def handle_request(self):
+        """
+        Waits for a free thread, then for a connection, and hands the
+        connection to the thread. Gives up after `timeout` seconds.
+        """
+        if not self.slots.acquire(timeout=self.timeout):
+            return
+        self.slot_held = True
+        try:
+            super(PooledWSGIServer, self).handle_request()
+        finally:
+            if self.slot_held:
+                self.slot_held = False
+                self.slots.release()
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_thread,
+                             request, client_address)
+        self.slot_held = False
+
+    def process_request_thread(self, request, client_address):
+        """ Serves a connection in one of our threads. """
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+    def server_close(self):
+        super(PooledWSGIServer, self).server_close()
+        # Connections being served end on their own.
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Contains the definition of the CancelToken class.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import threading
+from concurrent.futures import CancelledError
+
+logger = logging.getLogger('plutil.cancel')
+
+
+class CancelToken(object):
+    """
+    Lets one thread ask another one to stop some work.
+
+    The gui side cancels the token; the thread doing the work checks
+    `cancelled` (a plain attribute, so it is cheap to check in tight
+    loops) or calls raise_if_cancelled(). Cancelling a token also
+    cancels all the tokens created with child().
+
+    Examples:
+        >>> for feature in layer.getFeatures():
+        ...     self.token.raise_if_cancelled()
+        ...     process(feature)
+
+    Attributes:
+        cancelled (bool):
+            Has cancel() been called?
+        reason (str, None):
+            The reason given to cancel().
+        parent (CancelToken, None):
+            The token that cancels this one.
+        callbacks (list):
+            Callables to be called with this token when it is cancelled.
+        lock (threading.Lock):
+            Protects the callbacks.
+        event (threading.Event):
+            Set when the token is cancelled.
+    """
+
+    def __init__(self, parent=None):
+        """
+        Constructor.
+
+        Arguments:
+            parent (CancelToken, None):
+                Cancelling the parent cancels this token, too.
+        """
+        super(CancelToken, self).__init__()
+        self.cancelled = False
+        self.reason = None
+        self.parent = None
+        self.callbacks = []
+        self.lock = threading.Lock()
+        self.event = threading.Event()
+        if parent is not None:
+            self.link(parent)
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'CancelToken(%s)' % (
+            'cancelled' if self.cancelled else 'active')
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'CancelToken()'
+
+    def child(self):
+        """ Creates a token that is cancelled together with this one. """
+        return CancelToken(self)
+
+    def link(self, parent):
+        """ Makes this token follow another one. """
+        self.unlink()
+        self.parent = parent
+        parent.add_callback(self.propagate)
+
+    def unlink(self):
+        """ Stops following the parent, so it forgets about us. """
+        parent = self.parent
+        if parent is not None:
+            self.parent = None
+            parent.remove_callback(self.propagate)
+
+    def propagate(self, parent):
+        """ The callback that cancels us when the parent is cancelled. """
+        self.cancel(parent.reason)
+
+    def add_callback(self, fn):
+        """
+        Arranges for a callable to be called when the token is cancelled.
+
+        The callable receives the token as its only argument. It is called
+        in the thread that cancels the token, or right away if the token
+        was already cancelled.
+        """
+        with self.lock:
+            if not self.cancelled:
+                self.callbacks.append(fn)
+                return
+        fn(self)
+
+    def remove_callback(self, fn):
+        """ Forgets a callable added with add_callback(). """
+        with self.lock:
+            try:
+                self.callbacks.remove(fn)
+            except ValueError:
+                pass
+
+    def cancel(self, reason=None):
+        """
+        Cancels the token and its children.
+
+        Can be called from any thread, any number of times.
+
+        Returns:
+            True if this call cancelled the token.
+        """
+        with self.lock:
+            if self.cancelled:
+                return False
+            self.reason = reason
+            self.cancelled = True
+            callbacks = self.callbacks
+            self.callbacks = []
+        self.event.set()
+        logger.debug("Token %r cancelled (%s)", self, reason)
+        for fn in callbacks:
+            try:
+                fn(self)
+            except Exception:
+                logger.error("Cancel callback %r failed", fn, exc_info=True)
+        return True
+
+    def raise_if_cancelled(self):
+        """
+        Raises:
+            concurrent.futures.CancelledError if the token was cancelled.
+        """
+        if self.cancelled:
+            raise CancelledError(self.reason)
+
+    def wait(self, timeout=None):
+        """
+        Sleeps until the token is cancelled or the timeout expires.
+
+        Returns:
+            True if the token was cancelled.
+        """
+        return self.event.wait(timeout)
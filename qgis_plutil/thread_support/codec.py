@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Contains the definition of the MessageCodec and PickleCodec classes.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import pickle
+
+logger = logging.getLogger('plutil.codec')
+
+
+class MessageCodec(object):
+    """
+    Converts messages to something that can cross a process boundary.
+
+    The `plugin` and `thread_side` references of a message cannot
+    leave the process, so the encoded form does not include them and
+    decode() attaches the local ones.
+    """
+
+    def __init__(self):
+        """
+        Constructor.
+        """
+        super(MessageCodec, self).__init__()
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'MessageCodec()'
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'MessageCodec()'
+
+    def encode(self, message):
+        """ Returns the encoded form of the message. """
+        raise NotImplementedError
+
+    def decode(self, data, plugin, thread_side):
+        """
+        Recreates a message from its encoded form.
+
+        Arguments:
+            data:
+                The value returned by encode().
+            plugin (PlUtilPlugin):
+                The plugin to attach to the message.
+            thread_side (ThreadSide):
+                The side to attach to the message.
+        """
+        raise NotImplementedError
+
+
+class PickleCodec(MessageCodec):
+    """
+    Encodes messages using the pickle module.
+
+    Attributes:
+        protocol (int):
+            The pickle protocol to use.
+    """
+
+    def __init__(self, protocol=pickle.HIGHEST_PROTOCOL):
+        """
+        Constructor.
+
+        Arguments:
+            protocol (int):
+                The pickle protocol to use.
+        """
+        super(PickleCodec, self).__init__()
+        self.protocol = protocol
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'PickleCodec()'
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'PickleCodec(protocol=%r)' % self.protocol
+
+    def encode(self, message):
+        return pickle.dumps(message, protocol=self.protocol)
+
+    def decode(self, data, plugin, thread_side):
+        message = pickle.loads(data)
+        message.attach(plugin, thread_side)
+        return message
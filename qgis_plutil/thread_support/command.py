@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Contains the definition of the Command class.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+from concurrent.futures import Future
+
+logger = logging.getLogger('plutil.command')
+
+
+class Command(object):
+    """
+    A piece of work handed by the gui side to a thread side.
+
+    The gui side creates it in GuiSide.submit() and places it in
+    ThreadSide.commands. The thread side runs it and sends
+    the outcome back in a ResultMessage, so the future is resolved
+    (and its callbacks are executed) in the gui thread.
+
+    Attributes:
+        fn (callable):
+            The function to call in the thread.
+        args (tuple):
+            Positional arguments for the function.
+        kwargs (dict):
+            Keyword arguments for the function.
+        future (Future):
+            The future that receives the outcome.
+        token (CancelToken, None):
+            Cancelling it skips the command if it did not start yet;
+            a running command is expected to check it.
+    """
+
+    def __init__(self, fn, args=(), kwargs=None, future=None, token=None):
+        """
+        Constructor.
+
+        Arguments:
+            fn (callable):
+                The function to call in the thread.
+            args (tuple):
+                Positional arguments for the function.
+            kwargs (dict):
+                Keyword arguments for the function.
+            future (Future):
+                The future that receives the outcome; a new one is
+                created if None.
+            token (CancelToken, None):
+                The token of this piece of work.
+        """
+        super(Command, self).__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs if kwargs else {}
+        self.future = future if future is not None else Future()
+        self.token = token
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'Command(%r)' % self.fn
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'Command(fn=%r, args=%r, kwargs=%r)' % (
+            self.fn, self.args, self.kwargs)
+
+    def run(self):
+        """
+        Executes the function.
+
+        The future is moved in the running state but it is not resolved
+        here.
+
+        Returns:
+            A (started, result, exception) tuple; started is False if the
+            future or the token was cancelled before we got to it.
+        """
+        if self.token is not None and self.token.cancelled:
+            self.future.cancel()
+        if not self.future.set_running_or_notify_cancel():
+            logger.debug("Command %r was cancelled", self)
+            return False, None, None
+        try:
+            return True, self.fn(*self.args, **self.kwargs), None
+        except Exception as exc:
+            logger.debug("Command %r raised %r", self, exc)
+            return True, None, exc
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Contains the definition of the DrainPolicy and DrainStats classes.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+
+logger = logging.getLogger('plutil.drain')
+
+
+class DrainPolicy(object):
+    """
+    Decides how much work GuiSide.receiver() does in one turn.
+
+    The receiver keeps taking messages out of the queues until the
+    time budget is used up or the message limit is reached. If messages
+    are left in the queues the gui side schedules another turn right away,
+    so the event loop gets a chance to process user input in between.
+
+    Attributes:
+        budget (float, None):
+            Number of seconds a turn may take; None for no limit.
+        max_messages (int, None):
+            Number of messages a turn may process; None for no limit.
+    """
+
+    def __init__(self, budget=0.008, max_messages=None):
+        """
+        Constructor.
+
+        Arguments:
+            budget (float, None):
+                Number of seconds a turn may take; None for no limit.
+            max_messages (int, None):
+                Number of messages a turn may process; None for no limit.
+        """
+        super(DrainPolicy, self).__init__()
+        self.budget = budget
+        self.max_messages = max_messages
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'DrainPolicy(%r, %r)' % (self.budget, self.max_messages)
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'DrainPolicy(budget=%r, max_messages=%r)' % (
+            self.budget, self.max_messages)
+
+    def exhausted(self, started, now, count):
+        """
+        Tells if the turn should end.
+
+        Arguments:
+            started (float):
+                The moment the turn started (perf_counter()).
+            now (float):
+                Current moment (perf_counter()).
+            count (int):
+                Number of messages processed so far in this turn.
+        """
+        if self.max_messages is not None and count >= self.max_messages:
+            return True
+        if self.budget is not None and now - started >= self.budget:
+            return True
+        return False
+
+
+class DrainStats(object):
+    """
+    Keeps track of the work done by GuiSide.receiver().
+
+    Attributes:
+        turns (int):
+            Number of turns that did some work.
+        messages (int):
+            Total number of messages processed.
+        busy_time (float):
+            Total number of seconds spent processing messages.
+        last_count (int):
+            Number of messages processed in last turn.
+        last_time (float):
+            Number of seconds spent in last turn.
+        backlog (int):
+            Number of messages left in the queues after last turn.
+        rate (float):
+            Moving average of the drain rate in messages per second.
+        smoothing (float):
+            The weight of the last turn in the moving average.
+    """
+
+    def __init__(self, smoothing=0.2):
+        """
+        Constructor.
+
+        Arguments:
+            smoothing (float):
+                The weight of the last turn in the moving average.
+        """
+        super(DrainStats, self).__init__()
+        self.smoothing = smoothing
+        self.turns = 0
+        self.messages = 0
+        self.busy_time = 0.0
+        self.last_count = 0
+        self.last_time = 0.0
+        self.backlog = 0
+        self.rate = 0.0
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'DrainStats()'
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'DrainStats()'
+
+    def record(self, count, elapsed, backlog):
+        """
+        Adds the result of a turn.
+
+        Arguments:
+            count (int):
+                Number of messages processed in this turn.
+            elapsed (float):
+                Number of seconds the turn took.
+            backlog (int):
+                Number of messages left in the queues.
+        """
+        self.backlog = backlog
+        if count == 0:
+            return
+        self.turns = self.turns + 1
+        self.messages = self.messages + count
+        self.busy_time = self.busy_time + elapsed
+        self.last_count = count
+        self.last_time = elapsed
+        if elapsed > 0:
+            turn_rate = count / elapsed
+            if self.rate:
+                self.rate = self.rate + self.smoothing * (
+                    turn_rate - self.rate)
+            else:
+                self.rate = turn_rate
+
+    def as_dict(self):
+        """ Returns a snapshot of the statistics. """
+        return {
+            'turns': self.turns,
+            'messages': self.messages,
+            'busy_time': self.busy_time,
+            'last_count': self.last_count,
+            'last_time': self.last_time,
+            'backlog': self.backlog,
+            'rate': self.rate,
+        }
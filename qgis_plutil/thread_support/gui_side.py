@@ -6,15 +6,32 @@ from __future__ import unicode_literals
 from __future__ import print_function
 
 import logging
+import threading
+from collections import OrderedDict, deque
+from math import ceil
 from queue import Empty
+from time import perf_counter
 
-from PyQt5.QtCore import QObject, QBasicTimer
+from PyQt5.QtCore import QObject, QBasicTimer, QCoreApplication, QEvent
 
+from qgis_plutil.thread_support.messages.base import TsMessage
+from qgis_plutil.thread_support.messages.batch import BatchMessage
+from qgis_plutil.thread_support.messages.coalescing import CoalescingMessage
+from .command import Command
 from qgis_plutil.thread_support.messages.hello import HelloMessage
+from .cancel import CancelToken
+from .drain import DrainPolicy, DrainStats
+from .lanes import LaneQueue
+from .scheduling import RoundRobinScheduler
 from .side import Side
+from .stats import MessageStats
+from .tasks import GuiTask
 
 logger = logging.getLogger('plutil.gui-side')
 
+# The type of the event that is posted to the gui side to wake it up.
+WAKEUP_EVENT_TYPE = QEvent.Type(QEvent.registerEventType())
+
 
 class GuiSide(Side, QObject):
     """
@@ -24,12 +41,69 @@ class GuiSide(Side, QObject):
     in the thread hosting this instance. This can be used directly
     with the plugin class as a mixin.
 
+    Two ways of waking up the gui side are supported:
+    - WAKEUP_TIMER: the timer fires every `thread/gui-pool-interval`
+      milliseconds and the queues are checked each time;
+    - WAKEUP_EVENT: each time a thread side sends a message an event is
+      posted to this object so the queues are drained in the next
+      turn of the event loop; the timer is only kept as a fallback
+      and fires every `thread/gui-fallback-interval` milliseconds.
+
     Attributes:
         side_workers (list):
             The list of associated thread instances.
         timer (QBasicTimer):
             The timer that we use to regularly check for messages.
+        wakeup_mode (str):
+            Either WAKEUP_TIMER or WAKEUP_EVENT. If None when the first
+            thread side is tied the `thread/gui-wakeup` setting is used.
+        wakeup_lock (threading.Lock):
+            Protects wakeup_pending.
+        wakeup_pending (bool):
+            Is there a wake-up event posted and not yet processed?
+        drain_policy (DrainPolicy):
+            Decides how much work is done in one call to receiver().
+        drain_stats (DrainStats):
+            Queue depth and drain rate as seen by receiver().
+        ready (OrderedDict):
+            The thread sides that have posted messages since we last
+            looked at their queues, in the order they did so.
+        ready_lock (threading.Lock):
+            Protects the ready set.
+        sample_every (int):
+            The timings of one message in this many are recorded in
+            message_stats; 0 turns the instrumentation off.
+        sample_countdown (int):
+            Number of messages until the next sample.
+        message_stats (MessageStats):
+            Wait, handler and total time histograms by message type,
+            for the sampled messages.
+        token (CancelToken):
+            The parent of the tokens of all tied thread sides.
+        cancelled_messages (int):
+            Number of messages discarded because their work was cancelled.
+        expired_messages (int):
+            Number of messages discarded because they arrived after
+            their deadline.
+        tasks (deque):
+            The GuiTask instances for handlers that did not finish yet.
+        task_share (float):
+            The fraction of the drain budget given to tasks when there
+            are also messages waiting.
+        dropped_handlers (set):
+            The message classes for which handler_dropped() was logged.
+        scheduler (RoundRobinScheduler):
+            Decides the order in which the ready thread sides are visited
+            and the share of the turn each of them gets; a
+            WeightedFairScheduler gives some of them more.
+        retiring (list):
+            Thread sides that are untied as soon as their queue is empty
+            (see retire()).
     """
+
+    WAKEUP_TIMER = 'timer'
+    WAKEUP_EVENT = 'event'
+
     def __init__(self, *args, **kwargs):
         """
         Constructor.
@@ -37,6 +111,24 @@ class GuiSide(Side, QObject):
         super(GuiSide, self).__init__(*args, **kwargs)
         self.side_workers = []
         self.timer = QBasicTimer()
+        self.wakeup_mode = None
+        self.wakeup_lock = threading.Lock()
+        self.wakeup_pending = False
+        self.drain_policy = DrainPolicy()
+        self.drain_stats = DrainStats()
+        self.ready = OrderedDict()
+        self.ready_lock = threading.Lock()
+        self.sample_every = 16
+        self.sample_countdown = 1
+        self.message_stats = MessageStats()
+        self.token = CancelToken()
+        self.cancelled_messages = 0
+        self.expired_messages = 0
+        self.tasks = deque()
+        self.task_share = 0.5
+        self.dropped_handlers = set()
+        self.scheduler = RoundRobinScheduler()
+        self.retiring = []
 
     def __str__(self):
         """ Represent this object as a human-readable string. """
@@ -47,35 +139,366 @@ class GuiSide(Side, QObject):
         return 'GuiSide()'
 
     def message_accepted(self, message):
-        """ Re-implement this to handle the message. """
-        message.on_gui_side()
+        """
+        Re-implement this to handle the message.
+
+        Implementations must return what on_gui_side() returned. If that
+        is a generator or a coroutine it is resumed in later turns (see
+        GuiTask); an implementation that drops it means the handler never
+        runs, which is logged. To act on the value of the handler
+        re-implement message_handled() instead.
+
+        Returns:
+            What on_gui_side() returned.
+        """
+        return message.on_gui_side()
+
+    def message_handled(self, message, result):
+        """
+        Re-implement this to act on the value returned by the handler.
+
+        For resumable handlers this is called when they finish, with
+        the value they returned; it is not called if they fail or are
+        cancelled.
+        """
+        pass
 
     def receiver(self):
-        """ The slot where we receive messages emitted by the other side. """
-        for thread_side in self.side_workers:
-            if not thread_side.sig.is_set():
-                continue
-            thread_side.sig.clear()
+        """
+        The slot where we receive messages emitted by the other side.
+
+        Only the thread sides in the ready set are visited, in the
+        order decided by the scheduler. The control and interactive lanes
+        of all of them are drained first. Then resumable handlers get
+        their share of the turn and the rest of the messages get what
+        is left, each thread side its share of it (see
+        RoundRobinScheduler), until the drain policy says the turn is
+        over. If messages or handlers are left another turn is
+        scheduled right away.
+        """
+        with self.ready_lock:
+            ready = list(self.ready)
+            self.ready.clear()
 
-            for i in range(10):
-                try:
-                    message = thread_side.queue.get(block=False)
-                except Empty:
+        scheduler = self.scheduler
+        ready = scheduler.plan(ready)
+        started = perf_counter()
+        count = 0
+        exhausted = False
+        for thread_side in ready:
+            if isinstance(thread_side.queue, LaneQueue):
+                before = count
+                visited = perf_counter()
+                count, exhausted = self.drain(
+                    thread_side, thread_side.queue.get_urgent,
+                    started, count)
+                if count != before:
+                    scheduler.charge(thread_side, count - before,
+                                     perf_counter() - visited)
+                if exhausted:
+                    self.requeue_ready(ready)
                     break
-                logger.debug("Received message %r in state %r",
-                             message, self.state)
-                if self.state == self.STATE_DISCONNECTED:
-                    assert False, "Should not receive a message in " \
-                                  "disconnected state"
-                elif self.state == self.STATE_CONNECTING:
-                    assert isinstance(message, HelloMessage)
-                    self.state = self.STATE_CONNECTED
-                    thread_side.state = self.STATE_CONNECTED
-                    self.message_accepted(message)
-                elif self.state == self.STATE_CONNECTED:
-                    self.message_accepted(message)
+
+        if self.tasks and not exhausted:
+            # Without a budget each handler is resumed once per turn.
+            budget = self.drain_policy.budget
+            if budget is None:
+                deadline = None
+            elif ready:
+                deadline = started + budget * self.task_share
+            else:
+                deadline = started + budget
+            self.run_tasks(deadline)
+
+        # Shares that some sides did not use go to the ones that
+        # still have messages, in more passes.
+        policy = self.drain_policy
+        pending = [] if exhausted else ready
+        while pending and not exhausted:
+            leftover = []
+            progress = count
+            for index, thread_side in enumerate(pending):
+                # Each side may use its share of what is left of the turn.
+                share = scheduler.share(thread_side, pending[index:])
+                visited = perf_counter()
+                until = limit = None
+                if policy.budget is not None:
+                    until = visited + share * (
+                        started + policy.budget - visited)
+                if policy.max_messages is not None:
+                    limit = count + max(1, int(ceil(
+                        share * (policy.max_messages - count))))
+                before = count
+                thread_side.sig.clear()
+                count, stopped = self.drain(
+                    thread_side, thread_side.queue.get_nowait,
+                    started, count, until, limit)
+                scheduler.charge(thread_side, count - before,
+                                 perf_counter() - visited)
+                if stopped:
+                    leftover.append(thread_side)
+                    if policy.exhausted(started, perf_counter(), count):
+                        # We need to come back to these and to the ones
+                        # that we did not get to, before any newcomers.
+                        leftover.extend(pending[index + 1:])
+                        exhausted = True
+                        break
+            pending = leftover
+            if count == progress:
+                break
+        if pending:
+            self.requeue_ready(pending)
+
+        if self.retiring:
+            self.untie_retired()
+
+        with self.ready_lock:
+            backlog = sum(thread_side.queue.qsize()
+                          for thread_side in self.ready)
+        self.drain_stats.record(count, perf_counter() - started, backlog)
+        if backlog or self.tasks:
+            logger.debug("%d messages and %d tasks left after processing %d",
+                         backlog, len(self.tasks), count)
+            self.wake_up()
+
+    def run_tasks(self, deadline):
+        """
+        Resumes the unfinished handlers in turn until the deadline.
+
+        Each handler runs until it yields, then goes to the back of
+        the line. Handlers of cancelled work are stopped.
+
+        Arguments:
+            deadline (float, None):
+                When to stop (perf_counter()); None to resume each
+                handler once. Handlers never run to the end in a single
+                turn unless they are short.
+        """
+        tasks = self.tasks
+        if deadline is None:
+            remaining = len(tasks)
+        while tasks:
+            if deadline is None:
+                if not remaining:
+                    break
+                remaining = remaining - 1
+            elif perf_counter() >= deadline:
+                break
+            task = tasks.popleft()
+            token = task.message.token
+            if token is not None and token.cancelled:
+                task.cancel()
+                self.cancelled_messages = self.cancelled_messages + 1
+                task.message.on_cancelled()
+                continue
+            if task.step():
+                self.task_finished(task)
+            else:
+                tasks.append(task)
+
+    def task_finished(self, task):
+        """ Called when a resumable handler ends. """
+        logger.debug("Handler of %r finished after %d steps",
+                     task.message, task.steps)
+        if task.exception is None:
+            self.message_handled(task.message, task.result)
+
+    def handler_dropped(self, message):
+        """
+        Called when message_accepted() did not return the generator or
+        coroutine that on_gui_side() created, so the handler did not run.
+        """
+        kind = type(message)
+        if kind not in self.dropped_handlers:
+            self.dropped_handlers.add(kind)
+            logger.warning(
+                "%s.on_gui_side() is resumable but %s.message_accepted() "
+                "did not return it, so it was never run; return the value "
+                "of on_gui_side() from message_accepted()",
+                kind.__name__, type(self).__name__)
+
+    def drain(self, thread_side, get, started, count, until=None, limit=None):
+        """
+        Dispatches the items returned by `get` until it raises Empty,
+        the drain policy says the turn is over or the share of this
+        thread side is used up.
+
+        Arguments:
+            until (float, None):
+                The end of the share of this thread side (perf_counter()).
+            limit (int, None):
+                The count at which the share of this thread side ends.
+
+        Returns:
+            The updated count and True if it stopped before `get`
+            ran out of items.
+        """
+        policy = self.drain_policy
+        while True:
+            now = perf_counter()
+            if policy.exhausted(started, now, count) or \
+                    (until is not None and now >= until) or \
+                    (limit is not None and count >= limit):
+                return count, True
+            try:
+                message = get()
+            except Empty:
+                return count, False
+            count = count + self.dispatch(thread_side, message)
+
+    def requeue_ready(self, thread_sides):
+        """ Places the thread sides in front of the ready set. """
+        with self.ready_lock:
+            newcomers = self.ready
+            self.ready = OrderedDict(
+                (thread_side, True) for thread_side in thread_sides)
+            for thread_side in newcomers:
+                self.ready[thread_side] = True
+            for thread_side in thread_sides:
+                thread_side.sig.set()
+
+    def collect_ready(self):
+        """
+        Adds to the ready set all thread sides that have pending messages.
+
+        This is a full scan that is only used as a fallback by the timer.
+        """
+        with self.ready_lock:
+            for thread_side in self.side_workers:
+                if thread_side.sig.is_set():
+                    self.ready[thread_side] = True
+
+    def dispatch(self, thread_side, message, enqueued=None):
+        """
+        Processes an item that was taken out of the queue.
+
+        Batches are unpacked and each message is handled in turn.
+        For a coalescing message the latest one with the same key
+        is handled instead. Messages of cancelled work are discarded
+        (see TsMessage.on_cancelled()), except control messages, and so
+        are messages past their deadline (see TsMessage.on_expired()).
+
+        Arguments:
+            thread_side (ThreadSide):
+                The side that posted the message.
+            message (TsMessage):
+                The item.
+            enqueued (float, None):
+                When the item was posted, if the message does not know;
+                used for the messages in a batch.
+
+        Returns:
+            The number of messages that were processed.
+        """
+        if isinstance(message, CoalescingMessage):
+            latest = thread_side.take_coalesced(message.key)
+            if latest is not None:
+                message = latest
+        token = message.token
+        cancelled = token is not None and token.cancelled
+        deadline = message.deadline
+        expired = deadline is not None and perf_counter() > deadline
+        if isinstance(message, BatchMessage):
+            # The decision is taken for each message in the envelope.
+            for item in message.messages:
+                if cancelled and \
+                        item.priority != TsMessage.PRIORITY_CONTROL:
+                    self.cancelled_messages = self.cancelled_messages + 1
+                    item.on_cancelled()
+                elif expired:
+                    self.expired_messages = self.expired_messages + 1
+                    item.on_expired()
                 else:
-                    raise ValueError("Unknown state: %r", self.state)
+                    self.dispatch(thread_side, item, message.enqueued)
+            return len(message.messages)
+        if cancelled and message.priority != TsMessage.PRIORITY_CONTROL:
+            self.cancelled_messages = self.cancelled_messages + 1
+            message.on_cancelled()
+            return 1
+        if expired:
+            self.expired_messages = self.expired_messages + 1
+            message.on_expired()
+            return 1
+
+        # Timing every message would cost more than handling most of them.
+        dequeued = None
+        if self.sample_every:
+            self.sample_countdown = self.sample_countdown - 1
+            if self.sample_countdown <= 0:
+                self.sample_countdown = self.sample_every
+                dequeued = perf_counter()
+        logger.debug("Received message %r in state %r",
+                     message, self.state)
+        if self.state == self.STATE_DISCONNECTED:
+            assert False, "Should not receive a message in " \
+                          "disconnected state"
+        elif self.state == self.STATE_CONNECTING:
+            assert isinstance(message, HelloMessage)
+            self.state = self.STATE_CONNECTED
+            thread_side.state = self.STATE_CONNECTED
+            outcome = self.message_accepted(message)
+        elif self.state == self.STATE_CONNECTED:
+            outcome = self.message_accepted(message)
+        else:
+            raise ValueError("Unknown state: %r", self.state)
+        if GuiTask.is_resumable(outcome):
+            self.tasks.append(GuiTask(thread_side, message, outcome))
+        else:
+            if outcome is None and GuiTask.has_resumable_handler(message):
+                self.handler_dropped(message)
+            self.message_handled(message, outcome)
+        if dequeued is not None:
+            self.message_stats.record(
+                message, message.enqueued or enqueued,
+                dequeued, perf_counter())
+        return 1
+
+    def queue_depth(self):
+        """ The number of messages waiting in the queues. """
+        return sum(thread_side.queue.qsize()
+                   for thread_side in self.side_workers)
+
+    def stats(self):
+        """
+        A snapshot of the instrumentation, suitable for json.
+
+        Returns:
+            A dictionary with:
+            - `drain`: the work done by receiver() (see DrainStats);
+            - `messages`: for each message type, the wait, handler and
+              total latency (count, mean, min, max, p50, p95, p99 in
+              seconds);
+            - `queues`: for each worker the depth and counters of its
+              queue and the work done for it (messages, busy_time, visits,
+              weight and time_share, its part of the busy time);
+            - `queue_depth`: the number of messages waiting in all queues;
+            - `cancelled_messages`: the number of messages discarded
+              because their work was cancelled;
+            - `expired_messages`: the number of messages discarded
+              because they arrived after their deadline;
+            - `tasks`: the number of resumable handlers not finished yet.
+        """
+        queues = []
+        for thread_side in list(self.side_workers):
+            queue_stats = getattr(thread_side, 'queue_stats', None)
+            entry = queue_stats() if queue_stats is not None \
+                else {'size': thread_side.queue.qsize()}
+            entry['name'] = getattr(thread_side, 'name', str(thread_side))
+            entry.update(self.scheduler.usage_of(thread_side))
+            queues.append(entry)
+        busy_time = sum(entry['busy_time'] for entry in queues)
+        for entry in queues:
+            entry['time_share'] = entry['busy_time'] / busy_time \
+                if busy_time else None
+        return {
+            'drain': self.drain_stats.as_dict(),
+            'messages': self.message_stats.as_dict(),
+            'queues': queues,
+            'queue_depth': sum(entry['size'] for entry in queues),
+            'cancelled_messages': self.cancelled_messages,
+            'expired_messages': self.expired_messages,
+            'tasks': len(self.tasks),
+        }
 
     def tie(self, thread_side):
         """
@@ -83,15 +506,251 @@ class GuiSide(Side, QObject):
 
         After this method is executed the peer should send a first message
         to check the link.
+
+        If the `thread/queue-size` setting is not zero the queue of the
+        peer is bounded, with the `thread/queue-overflow` policy.
         """
         thread_side.gui_side = self
+        thread_side.token.link(self.token)
         self.side_workers.append(thread_side)
-        self.state = self.STATE_CONNECTING
+        if self.state == self.STATE_DISCONNECTED:
+            # Workers tied later must not interfere with the ones
+            # that are already connected.
+            self.state = self.STATE_CONNECTING
+        if self.wakeup_mode is None:
+            self.wakeup_mode = thread_side.plugin.get(
+                'thread/gui-wakeup', self.WAKEUP_EVENT)
+            if self.wakeup_mode not in (self.WAKEUP_TIMER, self.WAKEUP_EVENT):
+                logger.warning("Unknown wake-up mode %r; using %r",
+                               self.wakeup_mode, self.WAKEUP_EVENT)
+                self.wakeup_mode = self.WAKEUP_EVENT
+        queue_size = int(thread_side.plugin.get('thread/queue-size', 0))
+        if queue_size and not thread_side.queue.maxsize:
+            # A bound set on the thread side itself takes precedence.
+            overflow = thread_side.plugin.get(
+                'thread/queue-overflow', LaneQueue.OVERFLOW_BLOCK)
+            if overflow not in LaneQueue.OVERFLOW_POLICIES:
+                logger.warning("Unknown overflow policy %r; using %r",
+                               overflow, LaneQueue.OVERFLOW_BLOCK)
+                overflow = LaneQueue.OVERFLOW_BLOCK
+            thread_side.bound_queue(queue_size, overflow)
         if not self.timer.isActive():
-            milliseconds = thread_side.plugin.get('thread/gui-pool-interval',
-                                                  1000)
+            if self.wakeup_mode == self.WAKEUP_TIMER:
+                milliseconds = int(thread_side.plugin.get(
+                    'thread/gui-pool-interval', 1000))
+            else:
+                milliseconds = int(thread_side.plugin.get(
+                    'thread/gui-fallback-interval', 5000))
             self.timer.start(milliseconds, self)
             logger.debug("Gui timer started at %d milliseconds", milliseconds)
 
+    def untie(self, thread_side):
+        """
+        Disconnects from a peer.
+
+        The thread side is forgotten right away: messages still in its
+        queue are not handled and later ones do not wake us up. When
+        the last peer is gone the timer is stopped, so an idle gui side
+        costs nothing. Call from the gui thread.
+
+        Returns:
+            False if the thread side was not tied to us.
+        """
+        if thread_side in self.retiring:
+            self.retiring.remove(thread_side)
+        try:
+            self.side_workers.remove(thread_side)
+        except ValueError:
+            return False
+        with self.ready_lock:
+            self.ready.pop(thread_side, None)
+        if thread_side.gui_side is self:
+            thread_side.gui_side = None
+        thread_side.token.unlink()
+        self.scheduler.forget(thread_side)
+        logger.debug("Thread side %s was untied", thread_side)
+        if not self.side_workers:
+            self.timer.stop()
+            self.state = self.STATE_DISCONNECTED
+            logger.debug("Gui timer stopped")
+        return True
+
+    def retire(self, thread_side):
+        """
+        Unties a thread side once the messages it already sent are handled.
+
+        This is how GoodbyeMessage and the timer get rid of the sides
+        whose thread ended. Call from the gui thread.
+        """
+        if thread_side in self.side_workers and \
+                thread_side not in self.retiring:
+            self.retiring.append(thread_side)
+        self.untie_retired()
+
+    def untie_retired(self):
+        """ Unties the retiring thread sides that have nothing queued. """
+        for thread_side in list(self.retiring):
+            if thread_side.queue.qsize() == 0:
+                self.untie(thread_side)
+
+    def prune_finished(self):
+        """
+        Retires the thread sides whose thread ended without saying
+        goodbye (see ThreadSide.has_finished()).
+        """
+        for thread_side in list(self.side_workers):
+            if thread_side not in self.retiring and \
+                    thread_side.has_finished():
+                logger.debug("Thread side %s ended without goodbye",
+                             thread_side)
+                self.retire(thread_side)
+
+    def shutdown(self, timeout=5.0, cancel=False):
+        """
+        Stops the thread sides, handles their last messages and unties them.
+
+        Threads running ThreadSide.run_commands() are asked to stop once
+        their queued commands are done; other threads should be asked to
+        end by their owner before this is called. Their messages keep being
+        handled while we wait, so a thread blocked on a full queue or on
+        call_in_gui() can finish. Resumable handlers that did not finish
+        in time are cancelled. Call from the gui thread.
+
+        Arguments:
+            timeout (float, None):
+                Maximum number of seconds to wait for the threads;
+                None to wait for as long as it takes.
+            cancel (bool):
+                Cancel the work of the thread sides first (see cancel()).
+
+        Returns:
+            True if all thread sides ended.
+        """
+        deadline = None if timeout is None else perf_counter() + timeout
+        if cancel:
+            self.cancel(reason="gui side shut down")
+        for thread_side in list(self.side_workers):
+            stop_commands = getattr(thread_side, 'stop_commands', None)
+            if stop_commands is not None:
+                stop_commands()
+
+        def alive():
+            return [thread_side for thread_side in self.side_workers
+                    if getattr(thread_side, 'is_alive', None) is not None
+                    and thread_side.is_alive()]
+
+        policy = self.drain_policy
+        self.drain_policy = DrainPolicy(budget=None)
+        try:
+            while True:
+                running = alive()
+                pending = any(thread_side.queue.qsize()
+                              for thread_side in self.side_workers)
+                if not running and not pending and not self.tasks:
+                    break
+                if deadline is not None and perf_counter() >= deadline:
+                    break
+                with self.ready_lock:
+                    for thread_side in self.side_workers:
+                        self.ready[thread_side] = True
+                self.receiver()
+                if running:
+                    running[0].join(0.01)
+        finally:
+            self.drain_policy = policy
+
+        while self.tasks:
+            task = self.tasks.popleft()
+            task.cancel()
+            self.cancelled_messages = self.cancelled_messages + 1
+            task.message.on_cancelled()
+        running = alive()
+        if running:
+            logger.warning("%d thread sides did not end in time: %s",
+                           len(running), ', '.join(
+                               str(thread_side) for thread_side in running))
+        for thread_side in list(self.side_workers):
+            self.untie(thread_side)
+        return not running
+
+    def submit(self, thread_side, fn, *args, **kwargs):
+        """
+        Asks a thread side to call a function.
+
+        The thread side must be running ThreadSide.run_commands() or
+        call ThreadSide.process_commands() regularly.
+
+        The command gets its own token, a child of the token of the
+        thread side; cancelling the future before the command starts
+        cancels the token, too.
+
+        Returns:
+            A concurrent.futures.Future that is resolved in the gui thread.
+        """
+        if thread_side not in self.side_workers:
+            raise ValueError("%r is not tied to this side" % thread_side)
+        command = Command(fn, args, kwargs, token=thread_side.token.child())
+        command.future.add_done_callback(
+            lambda future: future.cancelled() and command.token.cancel())
+        thread_side.commands.put(command)
+        return command.future
+
+    def cancel(self, thread_side=None, reason=None):
+        """
+        Aborts the work of a thread side, or of all of them.
+
+        The token of the thread side is cancelled, and with it the tokens
+        of its running and queued commands, and it is replaced with
+        a new one so later work is not affected. The thread is expected
+        to notice and stop; messages it already sent are discarded
+        when they reach us.
+
+        Arguments:
+            thread_side (ThreadSide, None):
+                The side to cancel; None for all of them.
+            reason (str, None):
+                Passed on to the tokens.
+        """
+        thread_sides = list(self.side_workers) if thread_side is None \
+            else [thread_side]
+        for thread_side in thread_sides:
+            thread_side.renew_token().cancel(reason)
+
+    def notify(self, thread_side):
+        """
+        Informs us that a thread side has posted a message.
+
+        This is called in the thread of the thread side.
+        """
+        with self.ready_lock:
+            self.ready[thread_side] = True
+        if self.wakeup_mode == self.WAKEUP_EVENT:
+            self.wake_up()
+
+    def wake_up(self):
+        """
+        Asks the gui side to check the queues in next turn of the event loop.
+
+        Can be called from any thread. A single event is posted no matter
+        how many times this is called before the gui side gets to it.
+        """
+        with self.wakeup_lock:
+            if self.wakeup_pending:
+                return
+            self.wakeup_pending = True
+        QCoreApplication.postEvent(self, QEvent(WAKEUP_EVENT_TYPE))
+
+    def customEvent(self, event):
+        if event.type() == WAKEUP_EVENT_TYPE:
+            # Clear the flag first so that messages arriving while we
+            # drain the queues post a new event.
+            with self.wakeup_lock:
+                self.wakeup_pending = False
+            self.receiver()
+        else:
+            super(GuiSide, self).customEvent(event)
+
     def timerEvent(self, event):
+        self.collect_ready()
         self.receiver()
+        self.prune_finished()
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Contains the definition of the LaneQueue class.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+from collections import deque
+from queue import Queue, Empty, Full
+from time import perf_counter
+
+from .messages.base import TsMessage
+
+logger = logging.getLogger('plutil.lanes')
+
+
+class LaneQueue(Queue):
+    """
+    A thread-safe queue with one FIFO lane per message priority.
+
+    Items are placed in the lane given by their `priority` attribute
+    (TsMessage.PRIORITY_NORMAL if missing). The control and interactive
+    lanes are always served first. The lanes below them are served
+    in order too, except that a waiting lower lane gets an item
+    each time `starvation_limit` items in a row were taken from
+    a higher one.
+
+    When `maxsize` is set, `overflow` decides what happens to an item
+    that does not fit: the producer waits (OVERFLOW_BLOCK), the oldest
+    item in the least urgent lane makes room (OVERFLOW_DROP_OLDEST),
+    the new item is discarded (OVERFLOW_DROP_NEWEST) or queue.Full
+    is raised (OVERFLOW_RAISE). Control messages are always accepted.
+
+    Attributes:
+        lanes (list):
+            One deque for each priority.
+        starvation_limit (int):
+            A lower non-urgent lane is served at least once every this
+            many items.
+        streak (int):
+            Number of items taken in a row from a non-urgent lane while
+            a lower one was waiting.
+        overflow (str):
+            One of the OVERFLOW_* constants.
+        block_timeout (float, None):
+            With OVERFLOW_BLOCK, the producer gives up and gets queue.Full
+            after waiting this many seconds.
+        dropped (int):
+            Number of items discarded to respect the bound.
+        rejected (int):
+            Number of items refused with queue.Full.
+        blocked (int):
+            Number of times a producer had to wait.
+        blocked_time (float):
+            Total number of seconds producers spent waiting.
+        high_water (int):
+            The largest size the queue had.
+    """
+
+    OVERFLOW_BLOCK = 'block'
+    OVERFLOW_DROP_OLDEST = 'drop-oldest'
+    OVERFLOW_DROP_NEWEST = 'drop-newest'
+    OVERFLOW_RAISE = 'raise'
+    OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST,
+                         OVERFLOW_DROP_NEWEST, OVERFLOW_RAISE)
+
+    # Lanes below this one are the urgent ones.
+    URGENT_LANES = TsMessage.PRIORITY_NORMAL
+
+    def __init__(self, maxsize=0, starvation_limit=32,
+                 overflow=OVERFLOW_BLOCK, block_timeout=None):
+        """
+        Constructor.
+
+        Arguments:
+            maxsize (int):
+                The maximum number of items; 0 for no limit.
+            starvation_limit (int):
+                A lower non-urgent lane is served at least once every this
+                many items.
+            overflow (str):
+                What to do with items that do not fit.
+            block_timeout (float, None):
+                How long a producer may wait with OVERFLOW_BLOCK.
+        """
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError("Unknown overflow policy %r" % overflow)
+        self.starvation_limit = starvation_limit
+        self.streak = 0
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self.rejected = 0
+        self.blocked = 0
+        self.blocked_time = 0.0
+        self.high_water = 0
+        super(LaneQueue, self).__init__(maxsize)
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'LaneQueue(%r)' % self.lane_sizes()
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'LaneQueue(maxsize=%r, starvation_limit=%r, ' \
+               'overflow=%r, block_timeout=%r)' % (
+                   self.maxsize, self.starvation_limit,
+                   self.overflow, self.block_timeout)
+
+    # The methods below are the hooks used by Queue; they are called
+    # with the mutex held.
+
+    def _init(self, maxsize):
+        self.lanes = [deque() for i in range(TsMessage.PRIORITY_BULK + 1)]
+
+    def _qsize(self):
+        return sum(len(lane) for lane in self.lanes)
+
+    def _put(self, item):
+        self.lanes[self.lane_of(item)].append(item)
+        size = self._qsize()
+        if size > self.high_water:
+            self.high_water = size
+
+    def _get(self):
+        for lane in self.lanes[:self.URGENT_LANES]:
+            if lane:
+                return lane.popleft()
+
+        waiting = [lane for lane in self.lanes[self.URGENT_LANES:] if lane]
+        if len(waiting) < 2:
+            self.streak = 0
+            return waiting[0].popleft()
+        if self.streak >= self.starvation_limit:
+            self.streak = 0
+            return waiting[-1].popleft()
+        self.streak = self.streak + 1
+        return waiting[0].popleft()
+
+    def put(self, item, block=True, timeout=None):
+        """
+        Places an item in its lane, applying the overflow policy if the
+        queue is full.
+
+        Arguments:
+            item (object):
+                The item to queue.
+            block (bool):
+                With OVERFLOW_BLOCK, False turns waiting into queue.Full.
+            timeout (float, None):
+                With OVERFLOW_BLOCK, overrides block_timeout.
+
+        Returns:
+            The item that was discarded to respect the bound (which is
+            `item` itself with OVERFLOW_DROP_NEWEST) or None.
+
+        Raises:
+            queue.Full if the item was not accepted.
+        """
+        if timeout is None:
+            timeout = self.block_timeout
+        lane = self.lane_of(item)
+        dropped = None
+        with self.not_full:
+            if self.maxsize > 0 and lane != TsMessage.PRIORITY_CONTROL \
+                    and self._qsize() >= self.maxsize:
+                if self.overflow == self.OVERFLOW_BLOCK and block:
+                    started = perf_counter()
+                    accepted = self.not_full.wait_for(
+                        lambda: self._qsize() < self.maxsize, timeout)
+                    self.blocked = self.blocked + 1
+                    self.blocked_time = \
+                        self.blocked_time + perf_counter() - started
+                    if not accepted:
+                        self.rejected = self.rejected + 1
+                        raise Full
+                elif self.overflow == self.OVERFLOW_DROP_OLDEST:
+                    dropped = self.make_room(lane)
+                    if dropped is None:
+                        # Everything queued is more urgent than this.
+                        self.dropped = self.dropped + 1
+                        return item
+                    self.dropped = self.dropped + 1
+                elif self.overflow == self.OVERFLOW_DROP_NEWEST:
+                    self.dropped = self.dropped + 1
+                    return item
+                else:
+                    self.rejected = self.rejected + 1
+                    raise Full
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+        return dropped
+
+    def make_room(self, lane):
+        """
+        Removes the oldest item of the least urgent non-empty lane that is
+        not more urgent than `lane`. Control items are never removed.
+
+        Must be called with the mutex held.
+
+        Returns:
+            The removed item or None.
+        """
+        for index in range(len(self.lanes) - 1, max(lane, 1) - 1, -1):
+            if self.lanes[index]:
+                self.unfinished_tasks -= 1
+                return self.lanes[index].popleft()
+        return None
+
+    def stats(self):
+        """ A snapshot of the counters as a dictionary. """
+        with self.mutex:
+            size = self._qsize()
+            return {
+                'size': size,
+                'maxsize': self.maxsize,
+                'load': float(size) / self.maxsize if self.maxsize else 0.0,
+                'lanes': [len(lane) for lane in self.lanes],
+                'overflow': self.overflow,
+                'dropped': self.dropped,
+                'rejected': self.rejected,
+                'blocked': self.blocked,
+                'blocked_time': self.blocked_time,
+                'high_water': self.high_water,
+            }
+
+    def lane_of(self, item):
+        """ The index of the lane where the item goes. """
+        priority = getattr(item, 'priority', TsMessage.PRIORITY_NORMAL)
+        return min(max(priority, 0), len(self.lanes) - 1)
+
+    def lane_sizes(self):
+        """ The number of items in each lane. """
+        with self.mutex:
+            return [len(lane) for lane in self.lanes]
+
+    def get_urgent(self):
+        """
+        Takes an item from the control or interactive lanes, without
+        blocking.
+
+        Raises:
+            queue.Empty if those lanes are empty.
+        """
+        with self.not_empty:
+            for lane in self.lanes[:self.URGENT_LANES]:
+                if lane:
+                    item = lane.popleft()
+                    self.not_full.notify()
+                    return item
+        raise Empty
@@ -6,31 +6,98 @@ from __future__ import unicode_literals
 from __future__ import print_function
 
 import logging
+from itertools import count
+from time import perf_counter
 from uuid import uuid4
 from qgis_plutil.constants import TRACE
 
 logger = logging.getLogger('plutil.th-msg')
 
+# Source of message identifiers; next() on it is atomic.
+message_ids = count(1)
+
 
 class TsMessage(object):
     """
     Base class for messages exchanged between a thread and GUI thread .
 
+    The class uses __slots__ to keep instances small; subclasses
+    should define their own __slots__ to benefit from it (those that
+    don't simply get a __dict__).
+
     Attributes:
-        message_id
+        message_id (int, str):
+            Identifies the message. By default this is a number
+            that is unique inside the process. Classes that set
+            `opaque_id` use an unguessable string instead.
+        plugin (PlUtilPlugin):
+            Easy access to plugin instance.
+        thread_side (ThreadSide):
+            The side that created the message.
+        priority (int):
+            The lane used in the queue of the thread side; one of the
+            PRIORITY_* constants. Initialized from default_priority.
+        enqueued (float, None):
+            The moment (perf_counter()) the message was placed in the
+            queue towards the gui side.
+        token (CancelToken, None):
+            The token of the job that produced the message; if it is
+            cancelled by the time the message reaches the gui side,
+            on_cancelled() is called instead of on_gui_side().
+        deadline (float, None):
+            If the gui side gets to the message after this moment
+            (perf_counter()) on_expired() is called instead of
+            on_gui_side(). perf_counter() is a system-wide clock, so the
+            deadline also holds for messages from a child process.
+        opaque_id (bool):
+            Class attribute; use an unguessable message_id.
+        default_priority (int):
+            Class attribute; the priority of new instances.
+        default_ttl (float, None):
+            Class attribute; the number of seconds new instances have to
+            reach the gui side; None for no deadline.
     """
+
+    __slots__ = ('message_id', 'plugin', 'thread_side', '_external_id',
+                 'priority', 'enqueued', 'token', 'deadline', '__weakref__')
+
+    # Handshake, shutdown, cancellation acknowledgements.
+    PRIORITY_CONTROL = 0
+    # Something the user waits for, like an error to show or a result.
+    PRIORITY_INTERACTIVE = 1
+    PRIORITY_NORMAL = 2
+    # Large amounts of data.
+    PRIORITY_BULK = 3
+
+    opaque_id = False
+    default_priority = PRIORITY_NORMAL
+    default_ttl = None
+
     def __init__(self, plugin, thread_side, *args, **kwargs):
         """
         Constructor.
 
         Arguments:
-
+            plugin (PlUtilPlugin):
+                Easy access to plugin instance.
+            thread_side (ThreadSide):
+                The side that created the message.
         """
         super(TsMessage, self).__init__(*args, **kwargs)
 
-        self.message_id = uuid4().hex
+        if self.opaque_id:
+            self.message_id = uuid4().hex
+            self._external_id = self.message_id
+        else:
+            self.message_id = next(message_ids)
+            self._external_id = None
         self.plugin = plugin
         self.thread_side = thread_side
+        self.priority = self.default_priority
+        self.enqueued = None
+        self.token = None
+        self.deadline = None if self.default_ttl is None \
+            else perf_counter() + self.default_ttl
 
     def __str__(self):
         """ Represent this object as a human-readable string. """
@@ -40,12 +107,103 @@ class TsMessage(object):
         """ Represent this object as a python constructor. """
         return 'TsMessage()'
 
+    @property
+    def external_id(self):
+        """
+        An unguessable identifier that can be shown to the outside
+        world (http clients, for example). Created on first use.
+        """
+        if self._external_id is None:
+            self._external_id = uuid4().hex
+        return self._external_id
+
+    def expire_after(self, seconds):
+        """
+        Sets the deadline; None removes it.
+
+        Returns:
+            The message, so calls can be chained.
+        """
+        self.deadline = None if seconds is None \
+            else perf_counter() + seconds
+        return self
+
+    def expired(self, now=None):
+        """ Is the deadline in the past? """
+        deadline = self.deadline
+        if deadline is None:
+            return False
+        return (perf_counter() if now is None else now) > deadline
+
+    def __getstate__(self):
+        """ The plugin, the thread side and the token are not pickled. """
+        state = dict(getattr(self, '__dict__', {}))
+        for cls in type(self).__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                if name in ('__dict__', '__weakref__'):
+                    continue
+                try:
+                    state[name] = getattr(self, name)
+                except AttributeError:
+                    pass
+        state['plugin'] = None
+        state['thread_side'] = None
+        state['token'] = None
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def attach(self, plugin, thread_side):
+        """ Sets the plugin and the thread side after unpickling. """
+        self.plugin = plugin
+        self.thread_side = thread_side
+
+    def hand_over(self):
+        """
+        Executed in the child process once the message was encoded
+        for the gui process; resources that must outlive the child
+        are given up here.
+        """
+        pass
+
+    def take_over(self):
+        """
+        Executed in the gui process after the message was decoded;
+        claims what hand_over() gave up.
+        """
+        pass
+
     def on_thread_side(self):
         """ Executed just before the messages leaves the thread side. """
-        logger.log(TRACE, "Message %r is being send from thread side",
-                   self.message_id)
+        if logger.isEnabledFor(TRACE):
+            logger.log(TRACE, "Message %r is being send from thread side",
+                       self.message_id)
+
+    def on_dropped(self):
+        """
+        Executed in the producer thread when the message was discarded
+        because the queue towards the gui side was full.
+        """
+        logger.debug("Message %r was dropped", self.message_id)
+
+    def on_cancelled(self):
+        """
+        Executed on the gui side instead of on_gui_side() when the token
+        of the message was cancelled.
+        """
+        logger.debug("Message %r belongs to cancelled work", self.message_id)
+
+    def on_expired(self):
+        """
+        Executed on the gui side instead of on_gui_side() when the
+        message arrived after its deadline.
+        """
+        logger.debug("Message %r arrived too late", self.message_id)
 
     def on_gui_side(self):
         """ Executed when the message has reached GUI side. """
-        logger.log(TRACE, "Message %r has been received on GUI side",
-                   self.message_id)
+        if logger.isEnabledFor(TRACE):
+            logger.log(TRACE, "Message %r has been received on GUI side",
+                       self.message_id)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Contains the definition of the BatchMessage class.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+
+from .base import TsMessage
+
+logger = logging.getLogger('plutil.th-msg')
+
+
+class BatchMessage(TsMessage):
+    """
+    An envelope that carries many messages as a single queue item.
+
+    The thread side creates it in ThreadSide.send_batch() after calling
+    on_thread_side() for each message. The gui side unpacks it in
+    GuiSide.dispatch() and handles each message in turn, as if it was
+    received on its own. The envelope itself never reaches on_gui_side().
+
+    Attributes:
+        messages (list):
+            The messages in this envelope.
+    """
+
+    __slots__ = ('messages',)
+
+    def __init__(self, plugin, thread_side, messages, *args, **kwargs):
+        """
+        Constructor.
+
+        Arguments:
+            messages (list):
+                The messages in this envelope.
+        """
+        super(BatchMessage, self).__init__(
+            plugin, thread_side, *args, **kwargs)
+        self.messages = messages
+        # The envelope travels in the lane of its most urgent message,
+        # but never in the control lane: that one ignores the bound of
+        # the queue and cancellation, and a batch is mostly data.
+        if messages:
+            self.priority = max(self.PRIORITY_INTERACTIVE, min(
+                getattr(message, 'priority', self.default_priority)
+                for message in messages))
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'BatchMessage(%d)' % len(self.messages)
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'BatchMessage(messages=%r)' % self.messages
+
+    def __len__(self):
+        return len(self.messages)
+
+    def attach(self, plugin, thread_side):
+        super(BatchMessage, self).attach(plugin, thread_side)
+        for message in self.messages:
+            message.attach(plugin, thread_side)
+
+    def hand_over(self):
+        for message in self.messages:
+            message.hand_over()
+
+    def take_over(self):
+        for message in self.messages:
+            message.take_over()
+
+    def on_dropped(self):
+        for message in self.messages:
+            message.on_dropped()
+
+    def on_cancelled(self):
+        for message in self.messages:
+            message.on_cancelled()
+
+    def on_expired(self):
+        for message in self.messages:
+            message.on_expired()
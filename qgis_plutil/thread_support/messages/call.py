@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Contains the definition of the CallMessage class.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+from concurrent.futures import Future, TimeoutError
+from queue import Full
+
+from qgis_plutil.constants import DONT_ADD_TO_QUEUE
+from .base import TsMessage
+
+logger = logging.getLogger('plutil.th-msg')
+
+
+class CallMessage(TsMessage):
+    """
+    Asks the gui side to call a function and resolves a future with
+    the outcome.
+
+    Created by ThreadSide.call_in_gui(). The function is called
+    in on_gui_side(), so the future is resolved in the gui thread and
+    a thread waiting on it is released right away.
+
+    Attributes:
+        fn (callable):
+            The function to call in the gui thread.
+        args (tuple):
+            Positional arguments for the function.
+        kwargs (dict):
+            Keyword arguments for the function.
+        future (Future):
+            The future that receives the outcome. If the gui side gets
+            to the message after its deadline the function is not called
+            and the future receives a TimeoutError.
+    """
+
+    __slots__ = ('fn', 'args', 'kwargs', 'future')
+
+    default_priority = TsMessage.PRIORITY_INTERACTIVE
+
+    def __init__(self, plugin, thread_side, fn, args=(), kwargs=None,
+                 timeout=None, *a, **kw):
+        """
+        Constructor.
+
+        Arguments:
+            fn (callable):
+                The function to call in the gui thread.
+            args (tuple):
+                Positional arguments for the function.
+            kwargs (dict):
+                Keyword arguments for the function.
+            timeout (float, None):
+                Number of seconds the gui side has to start the call.
+        """
+        super(CallMessage, self).__init__(plugin, thread_side, *a, **kw)
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs if kwargs else {}
+        self.future = Future()
+        if timeout is not None:
+            self.expire_after(timeout)
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'CallMessage(%r)' % self.fn
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'CallMessage(fn=%r)' % self.fn
+
+    def on_dropped(self):
+        super(CallMessage, self).on_dropped()
+        if not self.future.done():
+            self.future.set_exception(Full(
+                "The queue towards the gui side is full"))
+
+    def on_cancelled(self):
+        super(CallMessage, self).on_cancelled()
+        self.future.cancel()
+
+    def on_expired(self):
+        super(CallMessage, self).on_expired()
+        if not self.future.done():
+            self.future.set_exception(TimeoutError(
+                "The gui side did not get to the call in time"))
+
+    def on_gui_side(self):
+        if self.expired():
+            self.on_expired()
+            return DONT_ADD_TO_QUEUE
+        if not self.future.set_running_or_notify_cancel():
+            logger.debug("Call %r was cancelled", self.message_id)
+            return DONT_ADD_TO_QUEUE
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as exc:
+            logger.debug("Call %r raised %r", self.message_id, exc)
+            self.future.set_exception(exc)
+        else:
+            self.future.set_result(result)
+        return DONT_ADD_TO_QUEUE
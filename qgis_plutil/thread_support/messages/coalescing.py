@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Contains the definition of the CoalescingMessage class.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+
+from .base import TsMessage
+
+logger = logging.getLogger('plutil.th-msg')
+
+
+class CoalescingMessage(TsMessage):
+    """
+    A message for state where only the latest value matters.
+
+    When a message with the same key is already waiting for the gui side
+    the new message takes its place instead of being queued, so
+    on_gui_side() runs at most once per key each time the gui side
+    drains the queue. Subclasses carry the value and implement
+    on_gui_side().
+
+    Examples:
+        >>> class ProgressMessage(CoalescingMessage):
+        ...     __slots__ = ('percent',)
+        ...     def __init__(self, plugin, thread_side, percent):
+        ...         super(ProgressMessage, self).__init__(
+        ...             plugin, thread_side, key='progress')
+        ...         self.percent = percent
+
+    Coalescing messages are never placed inside batches; send_batch()
+    posts them on their own.
+
+    Attributes:
+        key (hashable):
+            Messages with equal keys replace each other while they wait.
+    """
+
+    __slots__ = ('key',)
+
+    def __init__(self, plugin, thread_side, key, *args, **kwargs):
+        """
+        Constructor.
+
+        Arguments:
+            key (hashable):
+                Identifies the piece of state this message updates.
+        """
+        super(CoalescingMessage, self).__init__(
+            plugin, thread_side, *args, **kwargs)
+        self.key = key
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'CoalescingMessage(%r)' % (self.key,)
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'CoalescingMessage(key=%r)' % (self.key,)
+
+    def on_dropped(self):
+        # A newer value may have taken our place while we waited; it
+        # would be lost with us, so it is queued on its own.
+        super(CoalescingMessage, self).on_dropped()
+        if self.thread_side is not None:
+            latest = self.thread_side.take_coalesced(self.key)
+            if latest is not None and latest is not self:
+                self.thread_side.post(latest)
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Contains the definition of the GoodbyeMessage class.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+
+from qgis_plutil.constants import DONT_ADD_TO_QUEUE
+from .base import TsMessage
+
+logger = logging.getLogger('plutil.th-msg')
+
+
+class GoodbyeMessage(TsMessage):
+    """
+    The last message of a thread side.
+
+    ThreadSide.thread_side_finished() sends it when the thread is about
+    to end. On the gui side the thread side is disconnected and handed
+    to GuiSide.retire(), so it is untied once the messages it sent
+    before this one are handled. Being a control message it overtakes
+    those messages but it is never dropped or cancelled.
+    """
+
+    __slots__ = ()
+
+    default_priority = TsMessage.PRIORITY_CONTROL
+
+    def __init__(self, *args, **kwargs):
+        """
+        Constructor.
+        """
+        super(GoodbyeMessage, self).__init__(*args, **kwargs)
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'GoodbyeMessage()'
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'GoodbyeMessage()'
+
+    def on_gui_side(self):
+        thread_side = self.thread_side
+        thread_side.state = thread_side.STATE_DISCONNECTED
+        logger.debug("Goodbye %r has been send to GUI", self.message_id)
+        gui_side = thread_side.gui_side
+        if gui_side is not None:
+            gui_side.retire(thread_side)
+        return DONT_ADD_TO_QUEUE
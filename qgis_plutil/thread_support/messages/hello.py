@@ -27,6 +27,10 @@ class HelloMessage(TsMessage):
     is then changed from  connecting to connected.
     """
 
+    __slots__ = ()
+
+    default_priority = TsMessage.PRIORITY_CONTROL
+
     def __init__(self, *args, **kwargs):
         """
         Constructor.
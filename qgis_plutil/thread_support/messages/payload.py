@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+Contains the definition of the SharedPayload and PayloadMessage classes.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import weakref
+
+try:
+    from multiprocessing import shared_memory, resource_tracker
+except ImportError:  # Python < 3.8
+    shared_memory = None
+    resource_tracker = None
+
+from .base import TsMessage
+
+logger = logging.getLogger('plutil.th-msg')
+
+
+def release_segment(segment, owner):
+    """ Closes the segment and, if we own it, removes it from the system. """
+    try:
+        segment.close()
+    except BufferError:
+        # Views are still around; the mapping goes away with them.
+        logger.debug("Segment %r closed while views exist", segment.name)
+    if owner:
+        try:
+            segment.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SharedPayload(object):
+    """
+    A large buffer stored in a shared memory segment.
+
+    Only the handle (name, size, format and shape) travels with
+    the message; the gui side maps the same memory, so no copy is made
+    between a worker and the gui, not even across processes.
+
+    The segment lives as long as the payload object: when the message
+    holding it is consumed and dropped the segment is released. release() can also be
+    called explicitly.
+
+    Pickling the payload only copies the handle; the unpickled copy
+    does not own the segment. When a message is sent from
+    a ProcessSide child the ownership is handed to the gui process
+    explicitly (see hand_over() and take_over()).
+
+    Examples:
+        >>> payload = SharedPayload.allocate(8 * count, format='d')
+        >>> coords = payload.view()
+        >>> coords[0] = 3.14  # write in place, no copy
+        >>> message.add_payload('coords', payload)
+
+    Attributes:
+        segment (SharedMemory):
+            The shared memory segment.
+        size (int):
+            The number of bytes used in the segment.
+        format (str):
+            The struct format of an item.
+        shape (tuple, None):
+            The shape of the data; one dimension if None.
+        owner (bool):
+            Does this object remove the segment when released?
+    """
+
+    def __init__(self, segment, size, format='B', shape=None, owner=True):
+        """
+        Constructor. Use allocate(), from_buffer() or unpickling
+        to create instances.
+        """
+        super(SharedPayload, self).__init__()
+        self.segment = segment
+        self.size = size
+        self.format = format
+        self.shape = tuple(shape) if shape is not None else None
+        self.owner = owner
+        self.finalizer = weakref.finalize(
+            self, release_segment, segment, owner)
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'SharedPayload(%s, %d)' % (self.name, self.size)
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'SharedPayload(name=%r, size=%r, format=%r, shape=%r)' % (
+            self.name, self.size, self.format, self.shape)
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def name(self):
+        """ The name of the segment. """
+        return self.segment.name
+
+    @classmethod
+    def allocate(cls, size, format='B', shape=None):
+        """
+        Creates an empty segment; fill it using view().
+
+        Arguments:
+            size (int):
+                The number of bytes.
+            format (str):
+                The struct format of an item.
+            shape (tuple, None):
+                The shape of the data; one dimension if None.
+        """
+        if shared_memory is None:
+            raise RuntimeError("Shared memory requires Python 3.8")
+        segment = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        return cls(segment, size, format, shape)
+
+    @classmethod
+    def from_buffer(cls, data):
+        """
+        Copies an object that supports the buffer protocol (bytes,
+        array.array, numpy.ndarray) into a new segment.
+        """
+        source = memoryview(data)
+        result = cls.allocate(source.nbytes, source.format,
+                              source.shape if source.ndim > 1 else None)
+        result.segment.buf[:source.nbytes] = source.cast('B')
+        return result
+
+    def view(self):
+        """ A memoryview of the data, without copying it. """
+        result = self.segment.buf[:self.size]
+        if self.format != 'B' or self.shape is not None:
+            if self.shape is not None:
+                result = result.cast(self.format, self.shape)
+            else:
+                result = result.cast(self.format)
+        return result
+
+    def as_array(self):
+        """ A numpy view of the data, without copying it. """
+        import numpy
+        result = numpy.frombuffer(
+            self.segment.buf, dtype=numpy.dtype(self.format),
+            count=self.size // numpy.dtype(self.format).itemsize)
+        if self.shape is not None:
+            result = result.reshape(self.shape)
+        return result
+
+    def release(self):
+        """ Releases the segment now instead of waiting for the gc. """
+        self.finalizer()
+
+    @property
+    def released(self):
+        return not self.finalizer.alive
+
+    def hand_over(self):
+        """
+        Gives up the ownership of the segment; another process is
+        expected to take_over() a copy of this payload.
+        """
+        if not self.owner:
+            return
+        self.owner = False
+        self.finalizer.detach()
+        self.finalizer = weakref.finalize(
+            self, release_segment, self.segment, False)
+        if resource_tracker is not None:
+            # Otherwise the segment is removed when this process ends.
+            try:
+                resource_tracker.unregister(
+                    getattr(self.segment, '_name', self.segment.name),
+                    'shared_memory')
+            except Exception:
+                pass
+
+    def take_over(self):
+        """ Becomes the owner of the segment, which hand_over() gave up. """
+        if self.owner:
+            return
+        self.owner = True
+        self.finalizer.detach()
+        self.finalizer = weakref.finalize(
+            self, release_segment, self.segment, True)
+
+    def __getstate__(self):
+        """ Only the handle is pickled, never the ownership. """
+        return {
+            'name': self.segment.name,
+            'size': self.size,
+            'format': self.format,
+            'shape': self.shape,
+        }
+
+    def __setstate__(self, state):
+        if shared_memory is None:
+            raise RuntimeError("Shared memory requires Python 3.8")
+        self.__init__(
+            shared_memory.SharedMemory(name=state['name']),
+            state['size'], state['format'], state['shape'], owner=False)
+
+
+class PayloadMessage(TsMessage):
+    """
+    A message that carries large buffers in shared memory.
+
+    Attributes:
+        payloads (dict):
+            The payloads by name.
+    """
+
+    __slots__ = ('payloads',)
+
+    def __init__(self, plugin, thread_side, payloads=None, *args, **kwargs):
+        """
+        Constructor.
+
+        Arguments:
+            payloads (dict):
+                The payloads by name.
+        """
+        super(PayloadMessage, self).__init__(
+            plugin, thread_side, *args, **kwargs)
+        self.payloads = payloads if payloads else {}
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'PayloadMessage(%s)' % ', '.join(self.payloads)
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'PayloadMessage(payloads=%r)' % self.payloads
+
+    def add_payload(self, key, data):
+        """
+        Adds a payload to this message.
+
+        Arguments:
+            key (str):
+                The name of the payload.
+            data (SharedPayload, buffer):
+                A payload or an object supporting the buffer protocol,
+                which is copied in a new segment.
+
+        Returns:
+            The payload.
+        """
+        if not isinstance(data, SharedPayload):
+            data = SharedPayload.from_buffer(data)
+        self.payloads[key] = data
+        return data
+
+    def hand_over(self):
+        for payload in self.payloads.values():
+            payload.hand_over()
+
+    def take_over(self):
+        for payload in self.payloads.values():
+            payload.take_over()
+
+    def release(self):
+        """ Releases all the payloads now instead of waiting for the gc. """
+        for payload in self.payloads.values():
+            payload.release()
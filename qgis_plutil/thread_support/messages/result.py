@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Contains the definition of the ResultMessage class.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+from concurrent.futures import CancelledError
+from queue import Full
+
+from qgis_plutil.constants import DONT_ADD_TO_QUEUE
+from .base import TsMessage
+
+logger = logging.getLogger('plutil.th-msg')
+
+
+class ResultMessage(TsMessage):
+    """
+    Carries the outcome of a Command back to the gui side.
+
+    The future is resolved in on_gui_side() so that the callbacks
+    attached to it run in the gui thread.
+
+    Attributes:
+        future (Future):
+            The future to resolve.
+        result (object):
+            The value returned by the command.
+        exception (Exception, None):
+            The exception raised by the command.
+    """
+
+    __slots__ = ('future', 'result', 'exception')
+
+    default_priority = TsMessage.PRIORITY_INTERACTIVE
+
+    def __init__(self, plugin, thread_side, future, result=None,
+                 exception=None, *args, **kwargs):
+        """
+        Constructor.
+
+        Arguments:
+            future (Future):
+                The future to resolve.
+            result (object):
+                The value returned by the command.
+            exception (Exception, None):
+                The exception raised by the command.
+        """
+        super(ResultMessage, self).__init__(
+            plugin, thread_side, *args, **kwargs)
+        self.future = future
+        self.result = result
+        self.exception = exception
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'ResultMessage()'
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'ResultMessage()'
+
+    def on_dropped(self):
+        super(ResultMessage, self).on_dropped()
+        if not self.future.done():
+            self.future.set_exception(Full(
+                "The queue towards the gui side is full"))
+
+    def on_cancelled(self):
+        # The command did run, so the future can no longer be cancelled.
+        super(ResultMessage, self).on_cancelled()
+        if not self.future.done():
+            self.future.set_exception(CancelledError(
+                "The command was cancelled"))
+
+    def on_gui_side(self):
+        if self.exception is not None:
+            self.future.set_exception(self.exception)
+        else:
+            self.future.set_result(self.result)
+        return DONT_ADD_TO_QUEUE
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+Contains the definition of the WorkerPool class.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import threading
+from queue import Empty
+
+from .worker import Worker
+
+logger = logging.getLogger('plutil.pool')
+
+
+class PoolWorker(Worker):
+    """
+    A worker that belongs to a pool.
+
+    Attributes:
+        pool (WorkerPool):
+            The pool that owns this worker.
+        pending (int):
+            Number of commands submitted through the pool that
+            did not complete yet.
+    """
+
+    def __init__(self, pool, *args, **kwargs):
+        """
+        Constructor.
+
+        Arguments:
+            pool (WorkerPool):
+                The pool that owns this worker.
+        """
+        super(PoolWorker, self).__init__(*args, **kwargs)
+        self.pool = pool
+        self.pending = 0
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'PoolWorker(%s)' % self.name
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'PoolWorker(name=%r)' % self.name
+
+    def idle(self):
+        """ Leaves the pool if it has more workers than it needs. """
+        if self.pool.retire(self):
+            self.stop_commands()
+
+
+class WorkerPool(object):
+    """
+    A set of long-lived workers tied to the same gui side.
+
+    Jobs are dispatched to the least loaded worker. When all workers
+    have at least `scale_up_load` pending jobs a new worker is started,
+    up to `max_workers`. Workers that have nothing to do for
+    `idle_timeout` seconds leave the pool, down to `min_workers`.
+
+    Examples:
+        >>> pool = WorkerPool(gui_side, plugin, min_workers=1, max_workers=4)
+        >>> pool.start()
+        >>> future = pool.submit(read_file, path)
+        >>> future.add_done_callback(show_content)
+        >>> pool.shutdown()
+
+    Attributes:
+        gui_side (GuiSide):
+            The side that receives the results.
+        plugin (PlUtilPlugin):
+            Easy access to plugin instance.
+        min_workers (int):
+            The pool never shrinks below this many workers.
+        max_workers (int):
+            The pool never grows above this many workers.
+        idle_timeout (float):
+            Number of seconds a worker waits for a job before leaving.
+        scale_up_load (int):
+            A new worker is started when every worker has at least
+            this many pending jobs.
+        name (str):
+            Used as prefix for the names of the threads.
+        workers (list):
+            The workers in the pool.
+        lock (threading.Lock):
+            Protects the list of workers.
+        started (int):
+            Number of workers started so far.
+        closed (bool):
+            Set by shutdown(); no more jobs are accepted.
+    """
+
+    def __init__(self, gui_side, plugin, min_workers=1, max_workers=4,
+                 idle_timeout=30.0, scale_up_load=1, name='plutil-pool'):
+        """
+        Constructor.
+
+        Arguments:
+            gui_side (GuiSide):
+                The side that receives the results.
+            plugin (PlUtilPlugin):
+                Easy access to plugin instance.
+            min_workers (int):
+                The pool never shrinks below this many workers.
+            max_workers (int):
+                The pool never grows above this many workers.
+            idle_timeout (float):
+                Number of seconds a worker waits for a job before leaving.
+            scale_up_load (int):
+                A new worker is started when every worker has at least
+                this many pending jobs.
+            name (str):
+                Used as prefix for the names of the threads.
+        """
+        super(WorkerPool, self).__init__()
+        if min_workers < 0 or max_workers < 1 or min_workers > max_workers:
+            raise ValueError("Invalid pool size %r..%r" % (
+                min_workers, max_workers))
+        self.gui_side = gui_side
+        self.plugin = plugin
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.idle_timeout = idle_timeout
+        self.scale_up_load = scale_up_load
+        self.name = name
+        self.workers = []
+        self.lock = threading.Lock()
+        self.started = 0
+        self.closed = False
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'WorkerPool(%s)' % self.name
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'WorkerPool(min_workers=%r, max_workers=%r, name=%r)' % (
+            self.min_workers, self.max_workers, self.name)
+
+    def __len__(self):
+        return len(self.workers)
+
+    def start(self):
+        """ Starts the minimum number of workers. Call from gui thread. """
+        with self.lock:
+            while len(self.workers) < self.min_workers:
+                self.spawn()
+
+    def spawn(self):
+        """ Creates, ties and starts a new worker. Lock must be held. """
+        self.started = self.started + 1
+        worker = PoolWorker(
+            self, self.plugin,
+            name='%s-%d' % (self.name, self.started),
+            poll_interval=self.idle_timeout)
+        self.gui_side.tie(worker)
+        self.workers.append(worker)
+        worker.start()
+        logger.debug("Pool %s started worker %s", self.name, worker.name)
+        return worker
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Asks one of the workers to call a function. Call from gui thread.
+
+        Returns:
+            A concurrent.futures.Future that is resolved in the gui thread.
+        """
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("Pool %s was shut down" % self.name)
+            self.replace_dead()
+            worker = min(self.workers, key=lambda w: w.pending) \
+                if self.workers else None
+            if worker is None or (
+                    worker.pending >= self.scale_up_load and
+                    len(self.workers) < self.max_workers):
+                worker = self.spawn()
+            worker.pending = worker.pending + 1
+
+        future = self.gui_side.submit(worker, fn, *args, **kwargs)
+        future.add_done_callback(lambda f: self.completed(worker))
+        return future
+
+    def completed(self, worker):
+        """ A job submitted to this worker is done. """
+        with self.lock:
+            worker.pending = worker.pending - 1
+
+    def retire(self, worker):
+        """
+        Called by an idle worker (in its thread) to ask if it may leave.
+
+        Returns:
+            True if the worker was removed from the pool.
+        """
+        with self.lock:
+            if worker.pending or len(self.workers) <= self.min_workers:
+                return False
+            if worker in self.workers:
+                self.workers.remove(worker)
+        logger.debug("Pool %s retired worker %s", self.name, worker.name)
+        return True
+
+    def replace_dead(self):
+        """
+        Replaces the workers that died. Lock must be held.
+
+        The commands that were waiting for a dead worker are handed to
+        its replacement, and their tokens now follow its token. The dead
+        worker is detached from the gui side once its last messages
+        are handled.
+        """
+        for worker in [w for w in self.workers
+                       if w.ident and not w.is_alive()]:
+            logger.warning("Pool %s lost worker %s", self.name, worker.name)
+            self.workers.remove(worker)
+            self.gui_side.retire(worker)
+            replacement = self.spawn()
+            while True:
+                try:
+                    command = worker.commands.get(block=False)
+                except Empty:
+                    break
+                if command is not None:
+                    if command.token is not None:
+                        command.token.link(replacement.token)
+                    replacement.commands.put(command)
+                    replacement.pending = replacement.pending + 1
+                    command.future.add_done_callback(
+                        lambda f, w=replacement: self.completed(w))
+
+    def shutdown(self, wait=True, timeout=None, cancel_pending=False,
+                 cancel_running=False):
+        """
+        Stops all workers. Call from gui thread.
+
+        Arguments:
+            wait (bool):
+                Wait for the threads to end.
+            timeout (float, None):
+                Maximum number of seconds to wait for each thread.
+            cancel_pending (bool):
+                Cancel the jobs that did not start yet.
+            cancel_running (bool):
+                Cancel the tokens of the jobs that are running.
+
+        The workers that ended are detached from the gui side; the ones
+        that are still running detach themselves when they end.
+        """
+        with self.lock:
+            self.closed = True
+            workers = self.workers
+            self.workers = []
+        for worker in workers:
+            if cancel_pending:
+                while True:
+                    try:
+                        command = worker.commands.get(block=False)
+                    except Empty:
+                        break
+                    if command is not None:
+                        command.future.cancel()
+                        if command.token is not None:
+                            command.token.unlink()
+            if cancel_running:
+                self.gui_side.cancel(worker, "pool shut down")
+            worker.stop()
+        if wait:
+            for worker in workers:
+                worker.join(timeout)
+        for worker in workers:
+            if not worker.is_alive():
+                self.gui_side.retire(worker)
+        logger.debug("Pool %s was shut down", self.name)
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Contains the definition of the ProcessSide and ChildSide classes.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import multiprocessing
+import threading
+from queue import Empty, Full
+
+from .codec import PickleCodec
+from .thread_side import ThreadSide
+
+logger = logging.getLogger('plutil.proc-side')
+
+
+class ChildSide(ThreadSide):
+    """
+    The side living in the child process.
+
+    It is passed as first argument to the target of a ProcessSide and
+    behaves like a ThreadSide: thread_side_started(), send_to_gui(),
+    send_batch() and send_buffered() can be used as usual. There is no
+    plugin in the child process so the messages created here should use
+    None for it.
+
+    Attributes:
+        codec (MessageCodec):
+            Encodes the messages for the trip to the gui process.
+        channel (multiprocessing.Queue):
+            Carries encoded messages to the gui process.
+    """
+
+    def __init__(self, codec, channel, *args, **kwargs):
+        """
+        Constructor.
+
+        Arguments:
+            codec (MessageCodec):
+                Encodes the messages for the trip to the gui process.
+            channel (multiprocessing.Queue):
+                Carries encoded messages to the gui process.
+        """
+        super(ChildSide, self).__init__(None, *args, **kwargs)
+        self.codec = codec
+        self.channel = channel
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'ChildSide()'
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'ChildSide()'
+
+    def post(self, item):
+        """
+        Encodes the item and sends it to the gui process.
+
+        Once encoded, the item hands over what the gui process
+        takes over (see TsMessage.hand_over()).
+
+        Returns:
+            True; the channel has no bound, so the item is always sent.
+        """
+        data = self.codec.encode(item)
+        item.hand_over()
+        self.channel.put(data)
+        return True
+
+
+def run_child(codec, channel, target, args, kwargs):
+    """ The entry point of the child process. """
+    side = ChildSide(codec, channel)
+    try:
+        side.thread_side_started()
+        target(side, *args, **kwargs)
+    except Exception:
+        logger.error("Process side target failed", exc_info=True)
+    finally:
+        side.thread_side_finished()
+        # Tells the pump that we're done.
+        channel.put(None)
+
+
+class ProcessSide(ThreadSide):
+    """
+    A thread side whose work is done in a child process.
+
+    CPU-bound work in a thread competes with the gui thread for the GIL.
+    This class runs `target(child_side, *args, **kwargs)` in a separate
+    process instead. The child uses a ChildSide to talk to us, with
+    the usual HelloMessage handshake. A pump thread in this
+    process decodes the messages and places them in our queue, so
+    the gui side sees this object as any other thread side.
+
+    Messages cross the boundary encoded by `codec`. The default pickles
+    them without their `plugin` and `thread_side` references and attaches
+    the local ones on arrival. Messages holding futures or other
+    process-bound objects (like the ones created by call_in_gui())
+    can't be used in the child.
+
+    Note that, inside QGIS, `sys.executable` may be the QGIS binary;
+    the `spawn` start method then needs multiprocessing.set_executable()
+    pointing to a python interpreter.
+
+    Examples:
+        >>> def work(side, polygons):
+        ...     side.send_to_gui(AreaMessage(None, side, compute(polygons)))
+        >>> proc = ProcessSide(plugin, work, args=(polygons,))
+        >>> gui_side.tie(proc)
+        >>> proc.start()
+
+    Attributes:
+        target (callable):
+            The function executed in the child process; must be
+            picklable if the start method is not fork.
+        args (tuple):
+            Positional arguments for the target.
+        kwargs (dict):
+            Keyword arguments for the target.
+        codec (MessageCodec):
+            Encodes and decodes the messages.
+        context:
+            The multiprocessing context used to create the process.
+        channel (multiprocessing.Queue):
+            Carries encoded messages from the child process.
+        name (str):
+            The name of the process.
+        process (multiprocessing.Process):
+            The child process once started.
+        pump_thread (threading.Thread):
+            Moves messages from the channel to our queue.
+    """
+
+    # How often (in seconds) the pump checks that the child is alive.
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, plugin, target, args=(), kwargs=None, codec=None,
+                 context=None, name=None, gui_side=None):
+        """
+        Constructor.
+
+        Arguments:
+            plugin (PlUtilPlugin):
+                Easy access to plugin instance.
+            target (callable):
+                The function executed in the child process.
+            args (tuple):
+                Positional arguments for the target.
+            kwargs (dict):
+                Keyword arguments for the target.
+            codec (MessageCodec):
+                Encodes and decodes the messages; PickleCodec by default.
+            context:
+                The multiprocessing context; the default one if None.
+            name (str):
+                The name of the process.
+            gui_side (GuiSide):
+                The master of this slave.
+        """
+        super(ProcessSide, self).__init__(plugin, gui_side)
+        self.target = target
+        self.args = args
+        self.kwargs = kwargs if kwargs else {}
+        self.codec = codec if codec is not None else PickleCodec()
+        self.context = context if context is not None \
+            else multiprocessing.get_context()
+        self.channel = self.context.Queue()
+        self.name = name if name else 'ProcessSide'
+        self.process = None
+        self.pump_thread = None
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'ProcessSide(%s)' % self.name
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'ProcessSide(target=%r, name=%r)' % (self.target, self.name)
+
+    def start(self):
+        """ Starts the child process and the pump. """
+        self.state = self.STATE_CONNECTING
+        self.process = self.context.Process(
+            target=run_child, name=self.name, daemon=True,
+            args=(self.codec, self.channel,
+                  self.target, self.args, self.kwargs))
+        self.process.start()
+        self.pump_thread = threading.Thread(
+            target=self.pump, name='%s-pump' % self.name, daemon=True)
+        self.pump_thread.start()
+        logger.debug("Process side %s started with pid %r",
+                     self.name, self.process.pid)
+
+    def pump(self):
+        """
+        Moves messages from the child process to our queue.
+
+        Ends when the child says it is done or, if it dies without
+        saying so (a crash in native code, os._exit()), when the
+        channel is found empty after its death.
+        """
+        while True:
+            try:
+                data = self.channel.get(timeout=self.POLL_INTERVAL)
+            except Empty:
+                if self.process is not None and \
+                        not self.process.is_alive():
+                    logger.warning("Process side %s died with exit code %r",
+                                   self.name, self.process.exitcode)
+                    break
+                continue
+            if data is None:
+                break
+            try:
+                message = self.codec.decode(data, self.plugin, self)
+            except Exception:
+                logger.error("Failed to decode a message from %s",
+                             self.name, exc_info=True)
+                continue
+            message.take_over()
+            try:
+                self.post(message)
+            except Full:
+                # The child cannot be told; the message is lost.
+                logger.debug("Queue of %s is full; %r was rejected",
+                             self.name, message)
+                message.on_dropped()
+        logger.debug("Pump of process side %s is done", self.name)
+
+    def is_alive(self):
+        """ Is the child process or the pump still running? """
+        return bool(
+            (self.process is not None and self.process.is_alive()) or
+            (self.pump_thread is not None and self.pump_thread.is_alive()))
+
+    def has_finished(self):
+        """ Did the child process and the pump run and end? """
+        return self.process is not None and not self.is_alive()
+
+    def join(self, timeout=None):
+        """ Waits for the child process and the pump to end. """
+        if self.process is not None:
+            self.process.join(timeout)
+        if self.pump_thread is not None:
+            self.pump_thread.join(timeout)
+
+    def terminate(self):
+        """ Kills the child process. """
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+            # The child did not get a chance to stop the pump.
+            self.channel.put(None)
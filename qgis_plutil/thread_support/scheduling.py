@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+Contains the definition of the RoundRobinScheduler and
+WeightedFairScheduler classes.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+
+logger = logging.getLogger('plutil.scheduling')
+
+
+class RoundRobinScheduler(object):
+    """
+    Decides the order in which GuiSide.receiver() visits the thread sides
+    and how much of the turn each of them gets.
+
+    The ready thread sides are visited in turn, starting with a different
+    one each turn, and each gets an equal share of what is left of the
+    turn. A side that does not use its share leaves it to the
+    ones visited after it; a side that has more messages than its share
+    allows stays in the ready set for the next turn.
+
+    The time and the number of messages used by each thread side are
+    recorded, so stats() can tell who is keeping the gui thread busy.
+
+    Attributes:
+        turns (int):
+            Number of turns planned so far; decides where the next one
+            starts.
+        usage (dict):
+            For each thread side a list with the number of messages,
+            the number of seconds and the number of times it was
+            visited (once per pass of receiver()).
+    """
+
+    def __init__(self):
+        """
+        Constructor.
+        """
+        super(RoundRobinScheduler, self).__init__()
+        self.turns = 0
+        self.usage = {}
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'RoundRobinScheduler(%d)' % len(self.usage)
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'RoundRobinScheduler()'
+
+    def plan(self, ready):
+        """
+        Orders the ready thread sides for this turn.
+
+        Arguments:
+            ready (list):
+                The thread sides with pending messages.
+
+        Returns:
+            A new list with the same thread sides.
+        """
+        if not ready:
+            return []
+        start = self.turns % len(ready)
+        self.turns = self.turns + 1
+        return ready[start:] + ready[:start]
+
+    def weight_of(self, thread_side):
+        """ The relative share of the gui thread for a thread side. """
+        return 1.0
+
+    def share(self, thread_side, remaining):
+        """
+        The part of what is left of the turn that a thread side may use.
+
+        Arguments:
+            thread_side (ThreadSide):
+                The side about to be visited.
+            remaining (list):
+                This side and the ones that will be visited after it.
+
+        Returns:
+            A number between 0 and 1.
+        """
+        total = sum(self.weight_of(other) for other in remaining)
+        if total <= 0:
+            return 1.0
+        return self.weight_of(thread_side) / total
+
+    def charge(self, thread_side, count, elapsed):
+        """
+        Records the work done for a thread side in this turn.
+
+        Arguments:
+            thread_side (ThreadSide):
+                The side that was visited.
+            count (int):
+                Number of messages it got.
+            elapsed (float):
+                Number of seconds spent on its messages.
+        """
+        usage = self.usage.get(thread_side)
+        if usage is None:
+            usage = [0, 0.0, 0]
+            self.usage[thread_side] = usage
+        usage[0] += count
+        usage[1] += elapsed
+        usage[2] += 1
+
+    def forget(self, thread_side):
+        """ Drops what we know about a thread side that went away. """
+        self.usage.pop(thread_side, None)
+
+    def usage_of(self, thread_side):
+        """ The work done for a thread side, suitable for json. """
+        messages, busy_time, visits = self.usage.get(
+            thread_side, (0, 0.0, 0))
+        return {
+            'messages': messages,
+            'busy_time': busy_time,
+            'visits': visits,
+            'weight': self.weight_of(thread_side),
+        }
+
+
+class WeightedFairScheduler(RoundRobinScheduler):
+    """
+    Gives each thread side a configurable share of the gui thread.
+
+    Each thread side has a weight (1 by default) and a virtual time:
+    the seconds of gui thread it used, divided by its weight. The ready
+    sides are visited in the order of their virtual times, so the one
+    that got the least service relative to its weight goes first, and
+    each gets a part of the turn proportional to its weight. Over
+    a few turns a side with weight 3 gets three times as much of the
+    gui thread as a side with weight 1, if both have work.
+
+    A side that was idle does not get to catch up: its virtual time
+    is moved forward to the smallest one of the busy sides.
+
+    Examples:
+        >>> scheduler = WeightedFairScheduler()
+        >>> scheduler.set_weight(identify_worker, 4)
+        >>> gui_side.scheduler = scheduler
+
+    Attributes:
+        weights (dict):
+            The weight of each thread side that does not use the default.
+        default_weight (float):
+            The weight of the other thread sides.
+        virtual (dict):
+            The virtual time of each thread side.
+        clock (float):
+            The smallest virtual time among the sides of last turn;
+            never goes back.
+    """
+
+    def __init__(self, weights=None, default_weight=1.0):
+        """
+        Constructor.
+
+        Arguments:
+            weights (dict, None):
+                The weight of some thread sides.
+            default_weight (float):
+                The weight of the other thread sides.
+        """
+        super(WeightedFairScheduler, self).__init__()
+        self.weights = {}
+        self.default_weight = default_weight
+        self.virtual = {}
+        self.clock = 0.0
+        if weights:
+            for thread_side, weight in weights.items():
+                self.set_weight(thread_side, weight)
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'WeightedFairScheduler(%d)' % len(self.usage)
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'WeightedFairScheduler(default_weight=%r)' % (
+            self.default_weight)
+
+    def set_weight(self, thread_side, weight):
+        """ Changes the share of a thread side. """
+        if weight <= 0:
+            raise ValueError("The weight must be positive, not %r" % weight)
+        self.weights[thread_side] = weight
+
+    def weight_of(self, thread_side):
+        """ The relative share of the gui thread for a thread side. """
+        return self.weights.get(thread_side, self.default_weight)
+
+    def plan(self, ready):
+        """
+        Orders the ready thread sides by virtual time.
+
+        Arguments:
+            ready (list):
+                The thread sides with pending messages.
+
+        Returns:
+            A new list with the same thread sides.
+        """
+        if not ready:
+            return []
+        self.turns = self.turns + 1
+        virtual = self.virtual
+        known = [virtual[thread_side] for thread_side in ready
+                 if thread_side in virtual]
+        if known:
+            self.clock = max(self.clock, min(known))
+        clock = self.clock
+        for thread_side in ready:
+            virtual[thread_side] = max(virtual.get(thread_side, clock), clock)
+        # sorted() is stable so ties keep the order of arrival.
+        return sorted(ready, key=virtual.__getitem__)
+
+    def charge(self, thread_side, count, elapsed):
+        """
+        Records the work done for a thread side in this turn.
+
+        Arguments:
+            thread_side (ThreadSide):
+                The side that was visited.
+            count (int):
+                Number of messages it got.
+            elapsed (float):
+                Number of seconds spent on its messages.
+        """
+        super(WeightedFairScheduler, self).charge(
+            thread_side, count, elapsed)
+        self.virtual[thread_side] = self.virtual.get(
+            thread_side, self.clock) + elapsed / self.weight_of(thread_side)
+
+    def forget(self, thread_side):
+        """ Drops what we know about a thread side that went away. """
+        super(WeightedFairScheduler, self).forget(thread_side)
+        self.virtual.pop(thread_side, None)
+        self.weights.pop(thread_side, None)
+
+    def usage_of(self, thread_side):
+        """ The work done for a thread side, suitable for json. """
+        result = super(WeightedFairScheduler, self).usage_of(thread_side)
+        result['virtual_time'] = self.virtual.get(thread_side)
+        return result
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Contains the definition of the LatencyHistogram and MessageStats classes.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+from math import frexp
+
+logger = logging.getLogger('plutil.stats')
+
+
+class LatencyHistogram(object):
+    """
+    Counts durations in logarithmic buckets.
+
+    Each power of two is split in SUB_BUCKETS buckets, so a percentile
+    is known within 1 / SUB_BUCKETS of its value while recording only
+    costs a frexp() and an increment. Durations under 2 ** MIN_EXPONENT
+    (about a microsecond) or over 2 ** MAX_EXPONENT seconds land in the
+    first and last bucket.
+
+    Attributes:
+        buckets (list):
+            The number of durations in each bucket.
+        count (int):
+            Number of recorded durations.
+        total (float):
+            Sum of the recorded durations.
+        maximum (float):
+            The longest duration.
+    """
+
+    SUB_BUCKETS = 8
+    MIN_EXPONENT = -19
+    MAX_EXPONENT = 8
+    BUCKET_COUNT = (MAX_EXPONENT - MIN_EXPONENT) * SUB_BUCKETS
+
+    def __init__(self):
+        """
+        Constructor.
+        """
+        super(LatencyHistogram, self).__init__()
+        self.buckets = [0] * self.BUCKET_COUNT
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'LatencyHistogram(%d)' % self.count
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'LatencyHistogram()'
+
+    def __len__(self):
+        return self.count
+
+    @classmethod
+    def bucket_of(cls, seconds):
+        """ The index of the bucket for a duration. """
+        if seconds <= 0:
+            return 0
+        mantissa, exponent = frexp(seconds)
+        index = (exponent - cls.MIN_EXPONENT) * cls.SUB_BUCKETS + \
+            int((mantissa - 0.5) * 2 * cls.SUB_BUCKETS)
+        if index < 0:
+            return 0
+        if index >= cls.BUCKET_COUNT:
+            return cls.BUCKET_COUNT - 1
+        return index
+
+    @classmethod
+    def upper_bound(cls, index):
+        """ The largest duration that goes in a bucket. """
+        exponent, sub = divmod(index, cls.SUB_BUCKETS)
+        return (0.5 + (sub + 1) / (2.0 * cls.SUB_BUCKETS)) * \
+            2.0 ** (exponent + cls.MIN_EXPONENT)
+
+    def record(self, seconds):
+        """ Adds a duration. """
+        # This is bucket_of() inlined; it runs for every message.
+        if seconds > 0:
+            mantissa, exponent = frexp(seconds)
+            index = (exponent - self.MIN_EXPONENT) * self.SUB_BUCKETS + \
+                int((mantissa - 0.5) * (2 * self.SUB_BUCKETS))
+            if index < 0:
+                index = 0
+            elif index >= self.BUCKET_COUNT:
+                index = self.BUCKET_COUNT - 1
+        else:
+            index = 0
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+
+    @property
+    def minimum(self):
+        """ The upper bound of the first non-empty bucket. """
+        for index, size in enumerate(self.buckets):
+            if size:
+                return min(self.upper_bound(index), self.maximum)
+        return None
+
+    def percentile(self, fraction):
+        """
+        An estimate of the duration under which `fraction` of the recorded
+        durations fall.
+
+        Returns:
+            The upper bound of the bucket, but never more than the
+            longest duration; None if nothing was recorded.
+        """
+        if not self.count:
+            return None
+        wanted = fraction * self.count
+        seen = 0
+        for index, size in enumerate(self.buckets):
+            seen = seen + size
+            if size and seen >= wanted:
+                return min(self.upper_bound(index), self.maximum)
+        return self.maximum
+
+    def as_dict(self):
+        """ Returns a snapshot of the histogram. """
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'min': self.minimum,
+            'max': self.maximum if self.count else None,
+            'p50': self.percentile(0.50),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+        }
+
+
+class MessageStats(object):
+    """
+    Latency histograms for each message type, as seen by the gui side.
+
+    For each handled message three durations are recorded, all measured
+    with perf_counter():
+    - wait: from ThreadSide.post() to the moment the gui side took the
+      message out of the queue;
+    - handler: the time GuiSide.message_accepted() took;
+    - total: from ThreadSide.post() to the end of the handler.
+
+    Only the gui thread records; other threads may call as_dict().
+
+    Attributes:
+        types (dict):
+            For each message class name, a tuple of three
+            LatencyHistogram instances: wait, handler and total.
+    """
+
+    def __init__(self):
+        """
+        Constructor.
+        """
+        super(MessageStats, self).__init__()
+        self.types = {}
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'MessageStats(%d types)' % len(self.types)
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'MessageStats()'
+
+    def record(self, message, enqueued, dequeued, handled):
+        """
+        Adds the timings of a message.
+
+        Arguments:
+            message (TsMessage):
+                The message.
+            enqueued (float, None):
+                The moment it was posted or None if it is not known.
+            dequeued (float):
+                The moment the gui side started working on it.
+            handled (float):
+                The moment the handler returned.
+        """
+        name = type(message).__name__
+        histograms = self.types.get(name)
+        if histograms is None:
+            histograms = (LatencyHistogram(), LatencyHistogram(),
+                          LatencyHistogram())
+            self.types[name] = histograms
+        histograms[1].record(handled - dequeued)
+        if enqueued is not None:
+            histograms[0].record(dequeued - enqueued)
+            histograms[2].record(handled - enqueued)
+
+    def reset(self):
+        """ Forgets everything recorded so far. """
+        self.types = {}
+
+    def as_dict(self):
+        """ Returns a snapshot of the statistics, by message type. """
+        return dict(
+            (name, {
+                'wait': wait.as_dict(),
+                'handler': handler.as_dict(),
+                'total': total.as_dict(),
+            })
+            for name, (wait, handler, total) in list(self.types.items()))
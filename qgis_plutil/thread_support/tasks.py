@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Contains the definition of the GuiTask class.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import inspect
+import logging
+import types
+from time import perf_counter
+
+logger = logging.getLogger('plutil.gui-task')
+
+
+@types.coroutine
+def checkpoint():
+    """
+    Lets the gui side do other things before resuming the handler.
+
+    Use it in handlers written as coroutines:
+
+        >>> async def on_gui_side(self):
+        ...     for i, feature in enumerate(self.features):
+        ...         layer.addFeature(feature)
+        ...         if i % 100 == 0:
+        ...             await checkpoint()
+
+    Handlers written as generators simply `yield`.
+    """
+    yield
+
+
+class GuiTask(object):
+    """
+    An on_gui_side() handler that gives control back to the event loop
+    from time to time.
+
+    When on_gui_side() is a generator function or a coroutine function
+    calling it only creates the generator or coroutine. GuiSide wraps it
+    in a task and advances it with step() a little in each turn of the
+    event loop, between other messages. What the handler returns at the
+    end is the result of the task.
+
+    Attributes:
+        thread_side (ThreadSide):
+            The side that sent the message.
+        message (TsMessage):
+            The message being handled.
+        routine (generator, coroutine):
+            What on_gui_side() returned.
+        done (bool):
+            Has the handler finished?
+        result (object):
+            The value returned by the handler.
+        exception (Exception, None):
+            The exception raised by the handler.
+        steps (int):
+            Number of times the handler was resumed.
+        busy_time (float):
+            Number of seconds spent in the handler.
+    """
+
+    # For each message class, is on_gui_side() resumable?
+    resumable_handlers = {}
+
+    def __init__(self, thread_side, message, routine):
+        """
+        Constructor.
+
+        Arguments:
+            thread_side (ThreadSide):
+                The side that sent the message.
+            message (TsMessage):
+                The message being handled.
+            routine (generator, coroutine):
+                What on_gui_side() returned.
+        """
+        super(GuiTask, self).__init__()
+        self.thread_side = thread_side
+        self.message = message
+        self.routine = routine
+        self.done = False
+        self.result = None
+        self.exception = None
+        self.steps = 0
+        self.busy_time = 0.0
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'GuiTask(%r)' % self.message
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'GuiTask(message=%r)' % self.message
+
+    @staticmethod
+    def is_resumable(value):
+        """ Is this what a generator or coroutine handler returns? """
+        return isinstance(value, types.GeneratorType) or \
+            inspect.iscoroutine(value)
+
+    @classmethod
+    def has_resumable_handler(cls, message):
+        """ Is on_gui_side() a generator or a coroutine function? """
+        kind = type(message)
+        known = cls.resumable_handlers.get(kind)
+        if known is None:
+            handler = getattr(kind, 'on_gui_side', None)
+            known = inspect.isgeneratorfunction(handler) or \
+                inspect.iscoroutinefunction(handler)
+            cls.resumable_handlers[kind] = known
+        return known
+
+    def step(self):
+        """
+        Runs the handler until it yields or ends.
+
+        Returns:
+            True if the handler has finished.
+        """
+        started = perf_counter()
+        try:
+            self.routine.send(None)
+        except StopIteration as stop:
+            self.done = True
+            self.result = stop.value
+        except Exception as exc:
+            logger.error("Handler of message %r failed",
+                         self.message, exc_info=True)
+            self.done = True
+            self.exception = exc
+        self.steps = self.steps + 1
+        self.busy_time = self.busy_time + perf_counter() - started
+        return self.done
+
+    def cancel(self):
+        """ Stops the handler; its finally clauses are executed. """
+        if not self.done:
+            self.done = True
+            self.routine.close()
@@ -7,11 +7,20 @@ from __future__ import print_function
 
 import logging
 import threading
-from queue import Queue
+from queue import Queue, Empty, Full
+from time import perf_counter
 
 from PyQt5.QtCore import QObject, pyqtSignal
 
+from qgis_plutil.thread_support.messages.base import TsMessage
+from qgis_plutil.thread_support.messages.batch import BatchMessage
+from qgis_plutil.thread_support.messages.call import CallMessage
+from qgis_plutil.thread_support.messages.coalescing import CoalescingMessage
+from qgis_plutil.thread_support.messages.goodbye import GoodbyeMessage
 from qgis_plutil.thread_support.messages.hello import HelloMessage
+from qgis_plutil.thread_support.messages.result import ResultMessage
+from .cancel import CancelToken
+from .lanes import LaneQueue
 from .side import Side
 
 logger = logging.getLogger('plutil.th-side')
@@ -26,13 +35,39 @@ class ThreadSide(Side):
             The master of this slave.
         plugin (PlUtilPlugin):
             Easy access to plugin instance.
-        queue (Queue):
-            The queue of messages from the thread to the gui.
+        queue (LaneQueue):
+            The queue of messages from the thread to the gui, with one
+            lane for each message priority.
+        commands (Queue):
+            The queue of commands from the gui to the thread.
+        sig (threading.Event):
+            Set when messages were posted and the gui side did not yet
+            look at the queue.
+        batch_size (int):
+            The buffer used by send_buffered() is flushed when it
+            holds this many messages.
+        batch_interval (float):
+            The buffer used by send_buffered() is flushed when its oldest
+            message is this many seconds old.
+        buffer (list):
+            Messages accumulated by send_buffered().
+        buffer_started (float):
+            The moment the first message was placed in the buffer.
+        coalesced (dict):
+            The latest CoalescingMessage for each key that is waiting
+            for the gui side.
+        coalesce_lock (threading.Lock):
+            Guards `coalesced` and `superseded`.
+        superseded (int):
+            Number of coalescing messages that were replaced by newer ones
+            before the gui side got to them.
+        token (CancelToken):
+            Cancelled by the gui side to abort all the work of this side
+            (see GuiSide.cancel()); it is then replaced by a new one.
+        job_token (CancelToken, None):
+            The token of the command being executed.
     """
 
-    # We use this to tell something to the other side.
-    sig = threading.Event()
-
     def __init__(self, plugin, gui_side=None, *args, **kwargs):
         """
         Constructor.
@@ -46,7 +81,18 @@ class ThreadSide(Side):
         super(ThreadSide, self).__init__(*args, **kwargs)
         self.gui_side = gui_side
         self.plugin = plugin
-        self.queue = Queue()
+        self.queue = LaneQueue()
+        self.commands = Queue()
+        self.sig = threading.Event()
+        self.batch_size = 100
+        self.batch_interval = 0.05
+        self.buffer = []
+        self.buffer_started = 0.0
+        self.coalesced = {}
+        self.coalesce_lock = threading.Lock()
+        self.superseded = 0
+        self.token = CancelToken()
+        self.job_token = None
 
     def __str__(self):
         """ Represent this object as a human-readable string. """
@@ -56,6 +102,31 @@ class ThreadSide(Side):
         """ Represent this object as a python constructor. """
         return 'ThreadSide()'
 
+    @property
+    def cancelled(self):
+        """
+        Should the current work stop?
+
+        Long-running code in the thread should check this regularly.
+        """
+        return (self.job_token or self.token).cancelled
+
+    def current_token(self):
+        """ The token of the work being done right now. """
+        return self.job_token or self.token
+
+    def renew_token(self):
+        """
+        Replaces our token with a fresh one, linked to the same parent.
+
+        Returns:
+            The old token.
+        """
+        old = self.token
+        self.token = CancelToken(old.parent)
+        old.unlink()
+        return old
+
     def thread_side_started(self):
         """
         One time started event.
@@ -67,11 +138,302 @@ class ThreadSide(Side):
         self.send_to_gui(HelloMessage(plugin=self.plugin, thread_side=self))
         logger.debug("Thread side has been started")
 
+    def thread_side_finished(self):
+        """
+        One time finished event.
+
+        This should be called from the thread right before it ends, after
+        its last message. The buffered messages are send and the gui side
+        unties this side once it handled them.
+        """
+        self.flush()
+        self.send_to_gui(GoodbyeMessage(plugin=self.plugin, thread_side=self))
+        logger.debug("Thread side has finished")
+
+    def has_finished(self):
+        """
+        Did the thread of this side run and end?
+
+        The gui side uses this to find the sides that ended without
+        calling thread_side_finished(). Sides that are not threads
+        never end on their own.
+        """
+        if isinstance(self, threading.Thread):
+            return self.ident is not None and not self.is_alive()
+        return False
+
     def send_to_gui(self, message):
         """
         Will send a message to the other side.
+
+        Returns:
+            False if the message was discarded because the queue is full
+            (see bound_queue()).
         """
         message.on_thread_side()
-        self.queue.put(message)
-        self.sig.set()
+        if not self.post(message):
+            return False
         logger.debug("Message %r has been send to GUI", message.message_id)
+        return True
+
+    def call_in_gui(self, fn, *args, timeout=None, **kwargs):
+        """
+        Will call a function in the gui thread.
+
+        The call happens when the gui side next drains our queue. Do not
+        block on the result from the gui thread itself.
+
+        Examples:
+            >>> layer_names = self.call_in_gui(
+            ...     lambda: [l.name() for l in
+            ...              QgsProject.instance().mapLayers().values()]
+            ... ).result(timeout=5)
+
+        Arguments:
+            fn (callable):
+                The function to call.
+            timeout (float, None):
+                If the gui side does not start the call in this many
+                seconds the function is not called and the future
+                receives a TimeoutError.
+
+        Returns:
+            A concurrent.futures.Future that receives the value returned
+            by the function or the exception it raised.
+        """
+        message = CallMessage(self.plugin, self, fn, args, kwargs,
+                              timeout=timeout)
+        self.send_to_gui(message)
+        return message.future
+
+    def send_batch(self, messages):
+        """
+        Will send a list of messages to the other side as a single item.
+
+        The gui side unpacks the envelope and handles each message
+        as if it was send using send_to_gui(). Coalescing and control
+        messages are send on their own.
+
+        Returns:
+            False if the batch was discarded because the queue is full.
+        """
+        messages = list(messages)
+        alone = [message for message in messages
+                 if isinstance(message, CoalescingMessage) or
+                 message.priority == TsMessage.PRIORITY_CONTROL]
+        if alone:
+            for message in alone:
+                self.send_to_gui(message)
+            messages = [message for message in messages
+                        if not isinstance(message, CoalescingMessage) and
+                        message.priority != TsMessage.PRIORITY_CONTROL]
+        if not messages:
+            return True
+        for message in messages:
+            message.on_thread_side()
+        if not self.post(BatchMessage(self.plugin, self, messages)):
+            return False
+        logger.debug("Batch of %d messages has been send to GUI",
+                     len(messages))
+        return True
+
+    def send_buffered(self, message):
+        """
+        Will send a message to the other side as part of a batch.
+
+        The message is kept in a buffer that is send using send_batch()
+        when it holds `batch_size` messages or when the oldest message is
+        older than `batch_interval` seconds. The age is only checked when
+        a new message is added, so call flush() when done producing.
+
+        Must be called from the thread that owns this side.
+        """
+        if not self.buffer:
+            self.buffer_started = perf_counter()
+        self.buffer.append(message)
+        if len(self.buffer) >= self.batch_size or \
+                perf_counter() - self.buffer_started >= self.batch_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Sends the messages accumulated by send_buffered().
+
+        Must be called from the thread that owns this side.
+        """
+        if self.buffer:
+            messages = self.buffer
+            self.buffer = []
+            self.send_batch(messages)
+
+    def post(self, item):
+        """
+        Places an item in the queue and lets the gui side know.
+
+        If the queue is bounded an item may be discarded to make room;
+        its on_dropped() hook is called.
+
+        A CoalescingMessage whose key is already waiting replaces
+        the waiting one and is not queued again.
+
+        Returns:
+            False if `item` itself was discarded.
+
+        Raises:
+            queue.Full if the queue is full and the policy says so.
+        """
+        item.enqueued = perf_counter()
+        if item.token is None:
+            item.token = self.job_token or self.token
+        if isinstance(item, CoalescingMessage):
+            with self.coalesce_lock:
+                waiting = item.key in self.coalesced
+                self.coalesced[item.key] = item
+                if waiting:
+                    self.superseded = self.superseded + 1
+            if waiting:
+                return True
+        try:
+            dropped = self.queue.put(item)
+        except Full:
+            if isinstance(item, CoalescingMessage):
+                self.take_coalesced(item.key)
+            raise
+        if dropped is not None:
+            logger.debug("Queue of %s is full; %r was dropped", self, dropped)
+            dropped.on_dropped()
+            if dropped is item:
+                return False
+        self.sig.set()
+        if self.gui_side is not None:
+            self.gui_side.notify(self)
+        return True
+
+    def take_coalesced(self, key):
+        """
+        Removes and returns the latest coalescing message for a key.
+
+        Returns:
+            The message or None if no message with that key is waiting.
+        """
+        with self.coalesce_lock:
+            return self.coalesced.pop(key, None)
+
+    def bound_queue(self, maxsize, overflow=LaneQueue.OVERFLOW_BLOCK,
+                    block_timeout=None):
+        """
+        Limits the number of items waiting for the gui side.
+
+        Never use OVERFLOW_BLOCK for a side that posts from the gui thread;
+        it would wait for itself.
+
+        Arguments:
+            maxsize (int):
+                The maximum number of items; 0 for no limit.
+            overflow (str):
+                One of the LaneQueue.OVERFLOW_* policies.
+            block_timeout (float, None):
+                How long the producer may wait with OVERFLOW_BLOCK before
+                getting queue.Full.
+        """
+        if overflow not in LaneQueue.OVERFLOW_POLICIES:
+            raise ValueError("Unknown overflow policy %r" % overflow)
+        with self.queue.not_full:
+            self.queue.maxsize = maxsize
+            self.queue.overflow = overflow
+            self.queue.block_timeout = block_timeout
+            # A larger bound may let waiting producers through.
+            self.queue.not_full.notify_all()
+
+    def queue_stats(self):
+        """
+        The state of the queue towards the gui side.
+
+        Producers can use this to throttle themselves, for example by
+        slowing down when `load` gets close to 1.0.
+
+        Returns:
+            A dictionary with the keys `size`, `maxsize`, `load`, `lanes`,
+            `overflow`, `dropped`, `rejected`, `blocked`, `blocked_time`,
+            `high_water`, `coalesced` (keys waiting) and `superseded`.
+        """
+        stats = self.queue.stats()
+        with self.coalesce_lock:
+            stats['coalesced'] = len(self.coalesced)
+            stats['superseded'] = self.superseded
+        return stats
+
+    def run_commands(self, poll_interval=None):
+        """
+        Executes commands from the gui side until stop_commands() is called.
+
+        This is the run loop of a long-lived worker. It blocks while
+        there is nothing to do.
+
+        Arguments:
+            poll_interval (float, None):
+                If not None, idle() is called each time this many seconds
+                pass without a command.
+        """
+        while True:
+            try:
+                command = self.commands.get(timeout=poll_interval)
+            except Empty:
+                self.idle()
+                continue
+            if command is None:
+                logger.debug("Thread side was asked to stop")
+                break
+            self.execute(command)
+
+    def process_commands(self):
+        """
+        Executes the commands that are waiting, without blocking.
+
+        Use this from threads that have their own loop.
+
+        Returns:
+            False if stop_commands() was called, True otherwise.
+        """
+        while True:
+            try:
+                command = self.commands.get(block=False)
+            except Empty:
+                return True
+            if command is None:
+                return False
+            self.execute(command)
+
+    def execute(self, command):
+        """
+        Runs a command and sends the outcome to the gui side.
+
+        While the command runs its token is the current token, so
+        the messages it sends are dropped if it is cancelled.
+        """
+        self.job_token = command.token
+        try:
+            started, result, exception = command.run()
+            if started:
+                # Messages produced by the command go before its result.
+                self.flush()
+                self.send_to_gui(ResultMessage(
+                    self.plugin, self, command.future,
+                    result=result, exception=exception))
+        finally:
+            self.job_token = None
+            if command.token is not None:
+                command.token.unlink()
+
+    def idle(self):
+        """ Called by run_commands() when no command arrived in a while. """
+        pass
+
+    def stop_commands(self):
+        """
+        Asks run_commands() to return.
+
+        Commands submitted before this call are still executed.
+        Can be called from any thread.
+        """
+        self.commands.put(None)
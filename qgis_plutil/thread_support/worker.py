@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Contains the definition of the Worker class.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import threading
+
+from .thread_side import ThreadSide
+
+logger = logging.getLogger('plutil.worker')
+
+
+class Worker(ThreadSide, threading.Thread):
+    """
+    A long-lived thread that executes commands submitted by the gui side.
+
+    Examples:
+        >>> worker = Worker(plugin)
+        >>> gui_side.tie(worker)
+        >>> worker.start()
+        >>> future = gui_side.submit(worker, sum, [1, 2, 3])
+        >>> future.add_done_callback(lambda f: print(f.result()))
+        >>> worker.stop()
+
+    Attributes:
+        poll_interval (float, None):
+            idle() is called each time this many seconds pass without
+            a command; None to never call it.
+    """
+
+    def __init__(self, plugin, gui_side=None, name=None, poll_interval=None):
+        """
+        Constructor.
+
+        Arguments:
+            plugin (PlUtilPlugin):
+                Easy access to plugin instance.
+            gui_side (GuiSide):
+                The master of this slave.
+            name (str):
+                The name of the thread.
+            poll_interval (float, None):
+                idle() is called each time this many seconds pass without
+                a command; None to never call it.
+        """
+        super(Worker, self).__init__(
+            plugin=plugin, gui_side=gui_side, name=name, daemon=True)
+        self.poll_interval = poll_interval
+
+    def __str__(self):
+        """ Represent this object as a human-readable string. """
+        return 'Worker(%s)' % self.name
+
+    def __repr__(self):
+        """ Represent this object as a python constructor. """
+        return 'Worker(name=%r)' % self.name
+
+    def run(self):
+        self.thread_side_started()
+        try:
+            self.run_commands(poll_interval=self.poll_interval)
+        finally:
+            self.thread_side_finished()
+        logger.debug("Worker %s is done", self.name)
+
+    def stop(self, timeout=None):
+        """
+        Asks the thread to end once pending commands are executed.
+
+        Arguments:
+            timeout (float, None):
+                If not None, wait this many seconds for the thread to end.
+        """
+        self.stop_commands()
+        if timeout is not None:
+            self.join(timeout)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers shared by the benchmarks.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import sys
+
+from PyQt5.QtCore import QCoreApplication, QTimer
+
+logger = logging.getLogger('tests.plutil.bench')
+
+
+class SettingsPlugin(object):
+    """ A plugin replacement that returns fixed settings. """
+    def __init__(self, **settings):
+        self.settings = settings
+        self.plugin_name = 'bench'
+
+    def get(self, key, default=None):
+        return self.settings.get(key, default)
+
+
+def application():
+    """ Returns the application, creating one if needed. """
+    return QCoreApplication.instance() or QCoreApplication(sys.argv)
+
+
+def run_until(app, condition, poll_ms=10):
+    """ Runs the event loop until the condition becomes true. """
+    def check():
+        if condition():
+            app.quit()
+    poll = QTimer()
+    poll.timeout.connect(check)
+    poll.start(poll_ms)
+    app.exec_()
+    poll.stop()
+
+
+def percentile(values, fraction):
+    """ Nearest-rank percentile of a list of values. """
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the http server modes under load.
+
+A number of clients, each with its own keep-alive connection, call
+the root route as fast as they can; requests per second and latency
+percentiles are reported for the development server with debug on
+(how the server used to run), without debug, and for the production
+mode.
+
+Run it with:
+
+    python -m tests.benchmark.http_server.bench_load
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import socket
+import threading
+from time import perf_counter
+from unittest.mock import MagicMock
+
+import requests
+
+from qgis_plutil.http_server.api import HttpServer
+from ..common import SettingsPlugin, application, run_until, percentile
+
+logger = logging.getLogger('tests.plutil.bench.load')
+
+
+class ServerPlugin(SettingsPlugin):
+    """ A plugin replacement with what HttpServer needs. """
+    def __init__(self, **settings):
+        super(ServerPlugin, self).__init__(**settings)
+        self.logger = logging.getLogger('tests.plutil.bench.load.plugin')
+        self.show_error = MagicMock()
+        self.tr = lambda text: text
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def client(url, until, latencies, errors):
+    """ Sends requests on one connection until the time is up. """
+    session = requests.Session()
+    while perf_counter() < until:
+        started = perf_counter()
+        try:
+            session.get(url, timeout=10).raise_for_status()
+        except requests.RequestException:
+            errors.append(1)
+            continue
+        latencies.append(perf_counter() - started)
+    session.close()
+
+
+def run_mode(app, label, settings, clients=16, duration=3.0):
+    """ Loads a server configured with `settings`. """
+    port = free_port()
+    settings = dict(settings)
+    settings['http-server/port'] = port
+    server = HttpServer(ServerPlugin(**settings))
+    server.start()
+    run_until(app, lambda: server.server_thread.wsgi_server is not None)
+
+    url = 'http://127.0.0.1:%d/' % port
+    latencies = []
+    errors = []
+    until = perf_counter() + duration
+    threads = [threading.Thread(target=client,
+                                args=(url, until, latencies, errors))
+               for i in range(clients)]
+    started = perf_counter()
+    for thread in threads:
+        thread.start()
+    run_until(app, lambda: not any(thread.is_alive() for thread in threads))
+    elapsed = perf_counter() - started
+    server_thread = server.server_thread
+    server.stop()
+    server_thread.join(5)
+    server.timer.stop()
+
+    return {
+        'mode': label,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'per_sec': len(latencies) / elapsed,
+        'p50_ms': 1000 * percentile(latencies, 0.50),
+        'p99_ms': 1000 * percentile(latencies, 0.99),
+    }
+
+
+def main():
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    app = application()
+    modes = (
+        ('development+debug', {'http-server/debug': True}),
+        ('development', {}),
+        ('production', {'http-server/mode': 'production',
+                        'http-server/threads': 8}),
+    )
+    for label, settings in modes:
+        result = run_mode(app, label, settings)
+        print("%(mode)-18s %(requests)6d requests %(errors)4d errors "
+              "%(per_sec)8.1f req/s p50=%(p50_ms).2fms "
+              "p99=%(p99_ms).2fms" % result)
+
+
+if __name__ == '__main__':
+    main()
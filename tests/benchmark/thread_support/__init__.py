@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+
+logger = logging.getLogger('')
+
+
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the throughput of batched and unbatched sends.
+
+Run it with:
+
+    python -m tests.benchmark.thread_support.bench_batch
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import threading
+from time import perf_counter
+
+from qgis_plutil.thread_support.gui_side import GuiSide
+from qgis_plutil.thread_support.messages.base import TsMessage
+from qgis_plutil.thread_support.thread_side import ThreadSide
+from ..common import SettingsPlugin, application, run_until
+
+logger = logging.getLogger('tests.plutil.bench.batch')
+
+
+class TinyMessage(TsMessage):
+    """ A message that does nothing, so we only measure the transport. """
+    def on_thread_side(self):
+        pass
+
+    def on_gui_side(self):
+        self.thread_side.received = self.thread_side.received + 1
+
+
+class ProducerThread(ThreadSide, threading.Thread):
+    """ Sends `count` messages as fast as possible. """
+    def __init__(self, plugin, count, mode, batch_size):
+        super(ProducerThread, self).__init__(plugin=plugin)
+        self.count = count
+        self.mode = mode
+        self.batch_size = batch_size
+        self.received = 0
+        self.send_time = 0.0
+
+    def run(self):
+        self.thread_side_started()
+        messages = [TinyMessage(self.plugin, self) for i in range(self.count)]
+        started = perf_counter()
+        if self.mode == 'single':
+            for message in messages:
+                self.send_to_gui(message)
+        elif self.mode == 'batch':
+            for i in range(0, self.count, self.batch_size):
+                self.send_batch(messages[i:i + self.batch_size])
+        else:
+            for message in messages:
+                self.send_buffered(message)
+            self.flush()
+        self.send_time = perf_counter() - started
+
+
+def run_mode(app, mode, count=100000, batch_size=100):
+    """ Measures the rate at which `count` messages are delivered. """
+    plugin = SettingsPlugin(**{'thread/gui-wakeup': GuiSide.WAKEUP_EVENT})
+    gui_side = GuiSide()
+    worker = ProducerThread(plugin, count, mode, batch_size)
+    gui_side.tie(worker)
+    started = perf_counter()
+    worker.start()
+    run_until(app, lambda: worker.received >= count, poll_ms=1)
+    elapsed = perf_counter() - started
+    gui_side.timer.stop()
+    worker.join()
+    return {
+        'mode': mode,
+        'messages': count,
+        'send_rate': count / worker.send_time,
+        'end_to_end_rate': count / elapsed,
+    }
+
+
+def main():
+    app = application()
+    for mode in ('single', 'batch', 'buffered'):
+        result = run_mode(app, mode)
+        print("%(mode)-8s messages=%(messages)d "
+              "send=%(send_rate).0f msg/s "
+              "end-to-end=%(end_to_end_rate).0f msg/s" % result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Measures the gui thread work caused by a 10 kHz progress producer, with
+and without coalescing.
+
+Run it with:
+
+    python -m tests.benchmark.thread_support.bench_coalesce
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import threading
+from time import perf_counter, sleep
+
+from qgis_plutil.thread_support.gui_side import GuiSide
+from qgis_plutil.thread_support.messages.base import TsMessage
+from qgis_plutil.thread_support.messages.coalescing import CoalescingMessage
+from qgis_plutil.thread_support.thread_side import ThreadSide
+from ..common import SettingsPlugin, application, run_until
+
+logger = logging.getLogger('tests.plutil.bench.coalesce')
+
+# Simulated cost of updating a progress bar in the gui thread.
+HANDLER_COST = 0.0002
+
+
+def update_progress_bar(thread_side, key, value):
+    started = perf_counter()
+    while perf_counter() - started < HANDLER_COST:
+        pass
+    thread_side.handled = thread_side.handled + 1
+    thread_side.latest[key] = value
+
+
+class PlainProgress(TsMessage):
+    def __init__(self, plugin, thread_side, key, value):
+        super(PlainProgress, self).__init__(plugin, thread_side)
+        self.key = key
+        self.value = value
+
+    def on_gui_side(self):
+        update_progress_bar(self.thread_side, self.key, self.value)
+
+
+class CoalescedProgress(CoalescingMessage):
+    def __init__(self, plugin, thread_side, key, value):
+        super(CoalescedProgress, self).__init__(plugin, thread_side, key)
+        self.value = value
+
+    def on_gui_side(self):
+        update_progress_bar(self.thread_side, self.key, self.value)
+
+
+class ProgressThread(ThreadSide, threading.Thread):
+    """ Sends `count` updates for each of `keys` keys at `rate` Hz. """
+    def __init__(self, plugin, message_class, count, keys, rate):
+        super(ProgressThread, self).__init__(plugin=plugin)
+        self.message_class = message_class
+        self.count = count
+        self.keys = keys
+        self.rate = rate
+        self.handled = 0
+        self.latest = {}
+
+    def up_to_date(self):
+        """ Has the gui side seen the final value of every key? """
+        return all(self.latest.get(key) == self.count - self.keys + key
+                   for key in range(self.keys))
+
+    def run(self):
+        self.thread_side_started()
+        started = perf_counter()
+        for i in range(self.count):
+            # Keep the pace without sleeping after every message.
+            ahead = started + float(i) / self.rate - perf_counter()
+            if ahead > 0.001:
+                sleep(ahead)
+            self.send_to_gui(self.message_class(
+                self.plugin, self, i % self.keys, i))
+
+
+def run_mode(app, message_class, count=20000, keys=1, rate=10000):
+    """ Runs the producer and measures what the gui side had to do. """
+    plugin = SettingsPlugin(**{'thread/gui-wakeup': GuiSide.WAKEUP_EVENT})
+    gui_side = GuiSide()
+    worker = ProgressThread(plugin, message_class, count, keys, rate)
+    gui_side.tie(worker)
+    started = perf_counter()
+    worker.start()
+    run_until(app, worker.up_to_date, poll_ms=1)
+    elapsed = perf_counter() - started
+    gui_side.timer.stop()
+    worker.join()
+    stats = gui_side.drain_stats
+    return {
+        'mode': message_class.__name__,
+        'updates': count,
+        'keys': keys,
+        'handled': worker.handled,
+        'turns': stats.turns,
+        'gui_busy': stats.busy_time,
+        'elapsed': elapsed,
+    }
+
+
+def main():
+    app = application()
+    for keys in (1, 10):
+        for message_class in (PlainProgress, CoalescedProgress):
+            result = run_mode(app, message_class, keys=keys)
+            print("%(mode)-17s keys=%(keys)-3d updates=%(updates)d "
+                  "handled=%(handled)d turns=%(turns)d "
+                  "gui-busy=%(gui_busy).2fs elapsed=%(elapsed).2fs" % result)
+
+
+if __name__ == '__main__':
+    main()
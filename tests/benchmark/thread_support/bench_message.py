@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Measures the size and construction time of messages.
+
+LegacyMessage reproduces the previous TsMessage (a __dict__ and an
+uuid4() per instance) to have a reference.
+
+Run it with:
+
+    python -m tests.benchmark.thread_support.bench_message
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import tracemalloc
+from time import perf_counter
+from uuid import uuid4
+
+from qgis_plutil.thread_support.messages.base import TsMessage
+from qgis_plutil.thread_support.messages.hello import HelloMessage
+
+logger = logging.getLogger('tests.plutil.bench.message')
+
+
+class LegacyMessage(object):
+    """ How TsMessage looked before it was made compact. """
+    def __init__(self, plugin, thread_side):
+        super(LegacyMessage, self).__init__()
+        self.message_id = uuid4().hex
+        self.plugin = plugin
+        self.thread_side = thread_side
+
+
+class LooseMessage(TsMessage):
+    """ A subclass that did not define __slots__. """
+    pass
+
+
+def bytes_per_message(cls, count=10000):
+    """ Average memory allocated for one message. """
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    messages = [cls(None, None) for i in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff
+                    for stat in after.compare_to(before, 'filename'))
+    # The list holding the messages is not part of the cost.
+    allocated = allocated - messages.__sizeof__()
+    return allocated / count
+
+
+def construction_time(cls, count=200000):
+    """ Average number of nanoseconds needed to create a message. """
+    started = perf_counter()
+    for i in range(count):
+        cls(None, None)
+    return 1e9 * (perf_counter() - started) / count
+
+
+def main():
+    for cls in (LegacyMessage, TsMessage, HelloMessage, LooseMessage):
+        print("%-14s %6.1f bytes/message %7.1f ns/message" % (
+            cls.__name__, bytes_per_message(cls), construction_time(cls)))
+
+
+if __name__ == '__main__':
+    main()
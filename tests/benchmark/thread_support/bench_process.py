@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Compares threads and processes on a CPU-bound geometry workload.
+
+Each side computes area, perimeter and centroid of a share of random
+polygons in pure python and sends the totals to the gui side.
+
+Run it with:
+
+    python -m tests.benchmark.thread_support.bench_process
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import math
+import os
+import random
+import threading
+from time import perf_counter
+
+from qgis_plutil.thread_support.gui_side import GuiSide
+from qgis_plutil.thread_support.messages.base import TsMessage
+from qgis_plutil.thread_support.process_side import ProcessSide
+from qgis_plutil.thread_support.thread_side import ThreadSide
+from ..common import SettingsPlugin, application, run_until
+
+logger = logging.getLogger('tests.plutil.bench.process')
+
+
+def make_polygon(rnd, vertices):
+    """ A random star-shaped polygon. """
+    cx, cy = rnd.uniform(-180, 180), rnd.uniform(-90, 90)
+    result = []
+    for i in range(vertices):
+        angle = 2 * math.pi * i / vertices
+        radius = rnd.uniform(0.5, 1.5)
+        result.append((cx + radius * math.cos(angle),
+                       cy + radius * math.sin(angle)))
+    return result
+
+
+def measure(polygon):
+    """ Area, perimeter and centroid of a polygon. """
+    area = 0.0
+    perimeter = 0.0
+    cx = 0.0
+    cy = 0.0
+    count = len(polygon)
+    for i in range(count):
+        x0, y0 = polygon[i]
+        x1, y1 = polygon[(i + 1) % count]
+        cross = x0 * y1 - x1 * y0
+        area = area + cross
+        cx = cx + (x0 + x1) * cross
+        cy = cy + (y0 + y1) * cross
+        perimeter = perimeter + math.hypot(x1 - x0, y1 - y0)
+    area = area / 2.0
+    return area, perimeter, cx / (6 * area), cy / (6 * area)
+
+
+class TotalsMessage(TsMessage):
+    """ Carries the totals computed by one side. """
+    def __init__(self, plugin, thread_side, area, perimeter):
+        super(TotalsMessage, self).__init__(plugin, thread_side)
+        self.area = area
+        self.perimeter = perimeter
+
+    def on_gui_side(self):
+        self.thread_side.done.append((self.area, self.perimeter))
+
+
+def geometry_work(side, seed, polygons, vertices):
+    """ The workload; used both in threads and in processes. """
+    rnd = random.Random(seed)
+    area = 0.0
+    perimeter = 0.0
+    for i in range(polygons):
+        a, p, x, y = measure(make_polygon(rnd, vertices))
+        area = area + a
+        perimeter = perimeter + p
+    side.send_to_gui(TotalsMessage(None, side, area, perimeter))
+
+
+class GeometryThread(ThreadSide, threading.Thread):
+    """ Runs the workload in a thread. """
+    def __init__(self, plugin, *args):
+        super(GeometryThread, self).__init__(plugin=plugin)
+        self.work_args = args
+
+    def run(self):
+        self.thread_side_started()
+        geometry_work(self, *self.work_args)
+
+
+def run_kind(app, kind, sides, polygons=4000, vertices=64):
+    """ Splits the polygons between `sides` sides of given kind. """
+    plugin = SettingsPlugin(**{'thread/gui-wakeup': GuiSide.WAKEUP_EVENT})
+    gui_side = GuiSide()
+    done = []
+    workers = []
+    for i in range(sides):
+        args = (i, polygons // sides, vertices)
+        if kind == 'thread':
+            worker = GeometryThread(plugin, *args)
+        else:
+            worker = ProcessSide(plugin, geometry_work, args=args)
+        worker.done = done
+        gui_side.tie(worker)
+        workers.append(worker)
+
+    started = perf_counter()
+    for worker in workers:
+        worker.start()
+    run_until(app, lambda: len(done) >= sides, poll_ms=1)
+    elapsed = perf_counter() - started
+    for worker in workers:
+        worker.join()
+    gui_side.timer.stop()
+    return {
+        'kind': kind,
+        'sides': sides,
+        'seconds': elapsed,
+        'polygons_per_second': polygons / elapsed,
+    }
+
+
+def main():
+    app = application()
+    print("cpu count: %r" % os.cpu_count())
+    for kind in ('thread', 'process'):
+        base = None
+        for sides in (1, 2, 4):
+            result = run_kind(app, kind, sides)
+            base = base if base is not None else result['seconds']
+            result['speedup'] = base / result['seconds']
+            print("%(kind)-7s sides=%(sides)d %(seconds).3fs "
+                  "%(polygons_per_second).0f polygons/s "
+                  "speedup=%(speedup).2fx" % result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Runs the headless benchmarks of thread_support and stores the results.
+
+Everything runs on a QCoreApplication, so no display and no QGIS are
+needed. Measured:
+
+- messages per second for a number of workers and message sizes;
+- end-to-end latency percentiles for timer-driven and event-driven drain;
+- memory used by each message waiting in a queue;
+- gui thread time spent on each message.
+
+The results are written as json; pass a previous file to --compare
+to see how each number changed.
+
+Run it with:
+
+    python -m tests.benchmark.thread_support.bench_suite \\
+        --output bench.json --compare baseline.json
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import argparse
+import json
+import logging
+import platform
+import threading
+import tracemalloc
+from time import perf_counter, strftime
+
+from qgis_plutil.__version__ import __version__
+from qgis_plutil.thread_support.gui_side import GuiSide
+from qgis_plutil.thread_support.messages.base import TsMessage
+from qgis_plutil.thread_support.thread_side import ThreadSide
+from ..common import SettingsPlugin, application, run_until
+from .bench_wakeup import run_mode
+
+logger = logging.getLogger('tests.plutil.bench.suite')
+
+WORKER_COUNTS = (1, 2, 4, 8)
+MESSAGE_SIZES = (0, 1024, 65536)
+
+
+class SizedMessage(TsMessage):
+    """ Carries `size` bytes and counts its arrival on the gui side. """
+    __slots__ = ('data',)
+
+    def __init__(self, plugin, thread_side, size=0):
+        super(SizedMessage, self).__init__(plugin, thread_side)
+        self.data = bytes(size)
+
+    def on_thread_side(self):
+        pass
+
+    def on_gui_side(self):
+        self.thread_side.received = self.thread_side.received + 1
+
+
+class ProducerThread(ThreadSide, threading.Thread):
+    """ Sends `count` messages of `size` bytes as fast as possible. """
+    def __init__(self, plugin, count, size):
+        super(ProducerThread, self).__init__(plugin=plugin)
+        self.count = count
+        self.size = size
+        self.received = 0
+
+    def run(self):
+        self.thread_side_started()
+        for i in range(self.count):
+            self.send_to_gui(SizedMessage(self.plugin, self, self.size))
+
+
+def run_throughput(app, workers, size, total):
+    """
+    Measures how many messages per second reach the gui side and how
+    much gui thread time each one costs.
+    """
+    plugin = SettingsPlugin()
+    gui_side = GuiSide()
+    count = max(1, total // workers)
+    producers = [ProducerThread(plugin, count, size)
+                 for i in range(workers)]
+    for producer in producers:
+        gui_side.tie(producer)
+
+    started = perf_counter()
+    for producer in producers:
+        producer.start()
+    run_until(app, lambda: all(producer.received >= count
+                               for producer in producers))
+    elapsed = perf_counter() - started
+    for producer in producers:
+        producer.join()
+    gui_side.timer.stop()
+
+    messages = count * workers
+    drain = gui_side.drain_stats
+    return {
+        'workers': workers,
+        'size': size,
+        'messages': messages,
+        'messages_per_sec': messages / elapsed,
+        'gui_us_per_message': 1e6 * drain.busy_time / max(1, drain.messages),
+    }
+
+
+def run_latency(app, count):
+    """ End-to-end latency in both wake-up modes. """
+    return [run_mode(app, mode, count=count)
+            for mode in (GuiSide.WAKEUP_TIMER, GuiSide.WAKEUP_EVENT)]
+
+
+def run_memory(size, count):
+    """ Bytes used by each message waiting in the queue of a thread side. """
+    thread_side = ThreadSide(SettingsPlugin())
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(count):
+        thread_side.send_to_gui(SizedMessage(None, thread_side, size))
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    per_message = (after - before) / count
+    return {
+        'size': size,
+        'bytes_per_message': per_message,
+        'overhead_bytes': per_message - size,
+    }
+
+
+def run_suite(app, quick=False):
+    """ Runs all the benchmarks and returns the results as a dict. """
+    total = 4000 if quick else 40000
+    latency_count = 20 if quick else 100
+    memory_count = 1000 if quick else 10000
+    throughput = []
+    for workers in WORKER_COUNTS:
+        for size in MESSAGE_SIZES:
+            result = run_throughput(app, workers, size, total)
+            logger.info("throughput %r", result)
+            throughput.append(result)
+    return {
+        'version': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created': strftime('%Y-%m-%dT%H:%M:%S'),
+        'quick': quick,
+        'throughput': throughput,
+        'latency': run_latency(app, latency_count),
+        'memory': [run_memory(size, memory_count)
+                   for size in MESSAGE_SIZES],
+    }
+
+
+def flatten(results):
+    """
+    Gives each number in the results a name like
+    `throughput[workers=2,size=0].messages_per_sec`.
+    """
+    keys = {
+        'throughput': ('workers', 'size'),
+        'latency': ('mode',),
+        'memory': ('size',),
+    }
+    flat = {}
+    for section, labels in keys.items():
+        for entry in results.get(section, ()):
+            prefix = '%s[%s]' % (section, ','.join(
+                '%s=%s' % (label, entry[label]) for label in labels))
+            for name, value in entry.items():
+                if name not in labels and isinstance(value, (int, float)):
+                    flat['%s.%s' % (prefix, name)] = value
+    return flat
+
+
+def compare(results, baseline):
+    """ Prints the relative change of each number found in both runs. """
+    current = flatten(results)
+    previous = flatten(baseline)
+    print("Compared with %s (%s):" % (
+        baseline.get('version'), baseline.get('created')))
+    for name in sorted(current):
+        if name not in previous:
+            continue
+        old = previous[name]
+        new = current[name]
+        change = (new - old) / old * 100 if old else 0.0
+        print("  %-58s %12.3f -> %12.3f %+7.1f%%" % (name, old, new, change))
+
+
+def show(results):
+    """ Prints the results in a readable form. """
+    for entry in results['throughput']:
+        print("workers=%(workers)d size=%(size)6d "
+              "%(messages_per_sec)10.0f msg/s "
+              "%(gui_us_per_message)7.2f us gui/msg" % entry)
+    for entry in results['latency']:
+        print("%(mode)-6s p50=%(p50_ms).3fms p99=%(p99_ms).3fms "
+              "max=%(max_ms).3fms" % entry)
+    for entry in results['memory']:
+        print("size=%(size)6d %(bytes_per_message)10.1f bytes/message "
+              "(%(overhead_bytes).1f overhead)" % entry)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--output', help="write the results to this file")
+    parser.add_argument('--compare', help="results of a previous run")
+    parser.add_argument('--quick', action='store_true',
+                        help="fewer messages, for a smoke test")
+    args = parser.parse_args()
+
+    results = run_suite(application(), quick=args.quick)
+    show(results)
+    if args.output:
+        with open(args.output, 'w') as stream:
+            json.dump(results, stream, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as stream:
+            compare(results, json.load(stream))
+
+
+if __name__ == '__main__':
+    main()
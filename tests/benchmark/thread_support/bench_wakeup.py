@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the latency of timer-driven and event-driven gui wake-up.
+
+Run it with:
+
+    python -m tests.benchmark.thread_support.bench_wakeup
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import threading
+from time import perf_counter, sleep
+
+from qgis_plutil.thread_support.gui_side import GuiSide
+from qgis_plutil.thread_support.messages.base import TsMessage
+from qgis_plutil.thread_support.thread_side import ThreadSide
+from ..common import SettingsPlugin, application, run_until, percentile
+
+logger = logging.getLogger('tests.plutil.bench.wakeup')
+
+
+class StampMessage(TsMessage):
+    """ Records the time it took to reach the gui side. """
+    def __init__(self, *args, **kwargs):
+        super(StampMessage, self).__init__(*args, **kwargs)
+        self.sent = None
+        self.latencies = None
+
+    def on_thread_side(self):
+        self.sent = perf_counter()
+
+    def on_gui_side(self):
+        self.latencies.append(perf_counter() - self.sent)
+
+
+class BenchThread(ThreadSide, threading.Thread):
+    """ Sends messages at regular intervals. """
+    def __init__(self, plugin, count, interval, latencies):
+        super(BenchThread, self).__init__(plugin=plugin)
+        self.count = count
+        self.interval = interval
+        self.latencies = latencies
+
+    def run(self):
+        self.thread_side_started()
+        for i in range(self.count):
+            sleep(self.interval)
+            message = StampMessage(self.plugin, self)
+            message.latencies = self.latencies
+            self.send_to_gui(message)
+
+
+def run_mode(app, mode, count=100, interval=0.02, timer_ms=100):
+    """ Measures the latency of `count` messages in given wake-up mode. """
+    latencies = []
+    plugin = SettingsPlugin(**{
+        'thread/gui-wakeup': mode,
+        'thread/gui-pool-interval': timer_ms,
+    })
+    gui_side = GuiSide()
+    worker = BenchThread(plugin, count, interval, latencies)
+    gui_side.tie(worker)
+    worker.start()
+    run_until(app, lambda: len(latencies) >= count)
+    gui_side.timer.stop()
+    worker.join()
+
+    return {
+        'mode': mode,
+        'messages': len(latencies),
+        'mean_ms': 1000 * sum(latencies) / len(latencies),
+        'p50_ms': 1000 * percentile(latencies, 0.50),
+        'p99_ms': 1000 * percentile(latencies, 0.99),
+        'max_ms': 1000 * max(latencies),
+    }
+
+
+def main():
+    app = application()
+    for mode in (GuiSide.WAKEUP_TIMER, GuiSide.WAKEUP_EVENT):
+        result = run_mode(app, mode)
+        print("%(mode)-6s messages=%(messages)d mean=%(mean_ms).3fms "
+              "p50=%(p50_ms).3fms p99=%(p99_ms).3fms "
+              "max=%(max_ms).3fms" % result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+The http server answering real requests.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import json
+import logging
+import socket
+import threading
+from time import perf_counter
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+import requests
+from PyQt5.QtCore import QCoreApplication, QEventLoop
+
+from qgis_plutil.constants import ADD_TO_QUEUE
+from qgis_plutil.http_server.api import HttpServer, ServerThread
+from qgis_plutil.http_server.message import HttpMessage
+
+logger = logging.getLogger('tests.plutil.http_server.server')
+
+
+class SquareMessage(HttpMessage):
+    __slots__ = ('value',)
+
+    def __init__(self, plugin, thread_side, value):
+        super(SquareMessage, self).__init__(plugin, thread_side)
+        self.value = value
+
+    def on_gui_side(self):
+        self.result_type = 'OK'
+        self.result_data = self.value * self.value
+        return ADD_TO_QUEUE
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class TestServer(TestCase):
+    def setUp(self):
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        self.port = free_port()
+        self.settings = {
+            'http-server/port': self.port,
+        }
+        self.plugin = MagicMock()
+        self.plugin.plugin_name = 'test'
+        self.plugin.get.side_effect = \
+            lambda key, default: self.settings.get(key, default)
+        self.testee = HttpServer(self.plugin)
+
+    def tearDown(self):
+        if self.testee.server_thread is not None:
+            self.testee.stop()
+        self.testee.timer.stop()
+        self.testee = None
+
+    def process_until(self, condition, timeout=5.0):
+        deadline = perf_counter() + timeout
+        while not condition() and perf_counter() < deadline:
+            self.app.processEvents(QEventLoop.AllEvents, 10)
+        return condition()
+
+    def url(self, path):
+        return 'http://127.0.0.1:%d%s' % (self.port, path)
+
+    def start(self):
+        self.testee.start()
+        server_thread = self.testee.server_thread
+        # The thread opens the socket.
+        self.assertTrue(self.process_until(
+            lambda: server_thread.wsgi_server is not None))
+        return server_thread
+
+    def check_serving(self):
+        server_thread = self.start()
+        response = requests.get(self.url('/?a=1'), timeout=5)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.text)['status'], 'OK')
+
+        started = perf_counter()
+        self.testee.stop()
+        self.assertLess(perf_counter() - started, 0.2)
+        server_thread.join(5)
+        self.assertFalse(server_thread.is_alive())
+        self.assertTrue(self.process_until(
+            lambda: server_thread not in self.testee.side_workers))
+        return server_thread
+
+    def test_development(self):
+        server_thread = self.check_serving()
+        self.assertEqual(server_thread.mode, ServerThread.MODE_DEVELOPMENT)
+
+    def test_production(self):
+        self.settings['http-server/mode'] = 'production'
+        self.settings['http-server/threads'] = 2
+        server_thread = self.check_serving()
+        self.assertEqual(server_thread.mode, ServerThread.MODE_PRODUCTION)
+        # Waiting requests leave a thread for the others.
+        self.assertEqual(self.testee.results.waiters_limit, 1)
+        # The port is free again.
+        self.check_serving()
+
+    def test_shutdown_route(self):
+        self.settings['http-server/mode'] = 'production'
+        server_thread = self.start()
+        requests.get(self.url('/'), timeout=5)
+        response = requests.post(
+            self.url('/shut_me_down_used_for_restarts'), timeout=5)
+        self.assertEqual(response.status_code, 200)
+        server_thread.join(5)
+        self.assertFalse(server_thread.is_alive())
+        self.assertTrue(self.process_until(
+            lambda: server_thread not in self.testee.side_workers))
+        self.testee.server_thread = None
+
+    def test_bulk(self):
+        self.settings['http-server/mode'] = 'production'
+        self.testee.register_operation(
+            'square', lambda plugin, server_thread, params: SquareMessage(
+                plugin, server_thread, params['value']))
+        server_thread = self.start()
+        posted = []
+        post = server_thread.post
+
+        def spy(item):
+            posted.append(type(item).__name__)
+            return post(item)
+        server_thread.post = spy
+        replies = []
+
+        def client():
+            response = requests.post(self.url('/submit'), json=[
+                {'op': 'square', 'params': {'value': i}}
+                for i in range(100)], timeout=5)
+            ids = json.loads(response.text)['result']
+            response = requests.post(self.url('/results'), json={
+                'ids': ids, 'wait': 5}, timeout=10)
+            replies.append((ids, json.loads(response.text)['result']))
+        thread = threading.Thread(target=client)
+        thread.start()
+        self.assertTrue(self.process_until(lambda: replies))
+        thread.join()
+        ids, results = replies[0]
+        self.assertEqual([results[result_id]['result'] for result_id in ids],
+                         [i * i for i in range(100)])
+        # All of them travelled in one envelope.
+        self.assertEqual(posted, ['BatchMessage'])
+
+    def test_events(self):
+        self.settings['http-server/mode'] = 'production'
+        self.testee.register_operation(
+            'square', lambda plugin, server_thread, params: SquareMessage(
+                plugin, server_thread, params['value']))
+        self.start()
+        events = []
+
+        def client():
+            stream = requests.get(self.url('/events?topics=result'),
+                                  stream=True, timeout=5)
+            lines = stream.iter_lines(decode_unicode=True)
+            self.assertTrue(next(lines).startswith(': subscribed'))
+            response = requests.post(self.url('/submit'), json=[
+                {'op': 'square', 'params': {'value': 7}}], timeout=5)
+            result_id = json.loads(response.text)['result'][0]
+            event = {}
+            for line in lines:
+                if line.startswith('event: '):
+                    event['event'] = line[len('event: '):]
+                elif line.startswith('data: '):
+                    event['data'] = json.loads(line[len('data: '):])
+                elif not line and event:
+                    events.append(event)
+                    if event['event'] == 'closed':
+                        break
+                    event = {}
+            events.append(result_id)
+        thread = threading.Thread(target=client)
+        thread.start()
+        self.assertTrue(self.process_until(lambda: events))
+        self.testee.stop()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+        result_id = events[-1]
+        self.assertEqual(events[0], {'event': 'result', 'data': {
+            'id': result_id, 'status': 'OK', 'result': 49}})
+        self.assertEqual(events[1], {'event': 'closed',
+                                     'data': 'server stopped'})
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+A fast producer streaming into a bounded queue.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import threading
+from time import perf_counter
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from PyQt5.QtCore import QCoreApplication, QEventLoop
+
+from qgis_plutil.thread_support.gui_side import GuiSide
+from qgis_plutil.thread_support.lanes import LaneQueue
+from qgis_plutil.thread_support.messages.base import TsMessage
+from qgis_plutil.thread_support.thread_side import ThreadSide
+
+logger = logging.getLogger('tests.plutil.thread_support.backpressure')
+
+
+class FeatureMessage(TsMessage):
+    def __init__(self, plugin, thread_side, index):
+        super(FeatureMessage, self).__init__(plugin, thread_side)
+        self.index = index
+
+    def on_gui_side(self):
+        self.plugin.seen.append(self.index)
+
+
+class Producer(ThreadSide, threading.Thread):
+    def __init__(self, plugin, count):
+        ThreadSide.__init__(self, plugin)
+        threading.Thread.__init__(self, daemon=True)
+        self.count = count
+        self.accepted = 0
+
+    def run(self):
+        self.thread_side_started()
+        for i in range(self.count):
+            if self.send_to_gui(FeatureMessage(self.plugin, self, i)):
+                self.accepted = self.accepted + 1
+
+
+class TestBackpressure(TestCase):
+    def setUp(self):
+        self.plugin = MagicMock()
+        self.plugin.get.side_effect = lambda key, default: default
+        self.plugin.seen = []
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        self.testee = GuiSide()
+        self.producer = Producer(self.plugin, 5000)
+        self.testee.tie(self.producer)
+
+    def tearDown(self):
+        self.producer.join(5)
+        self.testee.timer.stop()
+        self.testee = None
+
+    def process_until(self, condition, timeout=10.0):
+        deadline = perf_counter() + timeout
+        while not condition() and perf_counter() < deadline:
+            self.app.processEvents(QEventLoop.AllEvents, 10)
+        return condition()
+
+    def test_block(self):
+        self.producer.bound_queue(100, LaneQueue.OVERFLOW_BLOCK)
+        self.producer.start()
+        self.assertTrue(self.process_until(
+            lambda: len(self.plugin.seen) == 5000))
+        self.assertEqual(self.plugin.seen, list(range(5000)))
+        stats = self.producer.queue_stats()
+        logger.debug("blocked %d times for %.3f s", stats['blocked'],
+                     stats['blocked_time'])
+        self.assertLessEqual(stats['high_water'], 101)
+        self.assertEqual(stats['dropped'], 0)
+
+    def test_drop_oldest(self):
+        self.producer.bound_queue(100, LaneQueue.OVERFLOW_DROP_OLDEST)
+        self.producer.start()
+        self.producer.join(10)
+        self.assertTrue(self.process_until(
+            lambda: self.producer.queue.qsize() == 0))
+        stats = self.producer.queue_stats()
+        self.assertLessEqual(stats['high_water'], 101)
+        self.assertEqual(len(self.plugin.seen) + stats['dropped'], 5000)
+        # The newest ones survive.
+        self.assertEqual(self.plugin.seen[-1], 4999)
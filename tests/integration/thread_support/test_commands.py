@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Commands submitted by the gui side to a long-lived worker.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import threading
+from concurrent.futures import CancelledError
+from time import perf_counter, sleep
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from PyQt5.QtCore import QCoreApplication, QEventLoop
+
+from qgis_plutil.thread_support.gui_side import GuiSide
+from qgis_plutil.thread_support.messages.base import TsMessage
+from qgis_plutil.thread_support.worker import Worker
+
+logger = logging.getLogger('tests.plutil.thread_support.commands')
+
+
+class TestCommands(TestCase):
+    def setUp(self):
+        self.plugin = MagicMock()
+        self.plugin.get.side_effect = lambda key, default: default
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        self.testee = GuiSide()
+        self.worker = Worker(self.plugin)
+        self.testee.tie(self.worker)
+        self.worker.start()
+
+    def tearDown(self):
+        self.worker.stop(5)
+        self.testee.timer.stop()
+        self.testee = None
+
+    def process_until(self, condition, timeout=5.0):
+        deadline = perf_counter() + timeout
+        while not condition() and perf_counter() < deadline:
+            self.app.processEvents(QEventLoop.AllEvents, 10)
+        return condition()
+
+    def test_round_trip(self):
+        gui_thread = threading.current_thread()
+        seen = []
+
+        def work(a, b):
+            seen.append(threading.current_thread())
+            return a + b
+
+        callback_threads = []
+        futures = [self.testee.submit(self.worker, work, i, 1)
+                   for i in range(20)]
+        for future in futures:
+            future.add_done_callback(
+                lambda f: callback_threads.append(threading.current_thread()))
+
+        self.assertTrue(self.process_until(
+            lambda: all(future.done() for future in futures)))
+        self.assertEqual([future.result() for future in futures],
+                         list(range(1, 21)))
+        self.assertEqual(set(seen), {self.worker})
+        self.assertEqual(set(callback_threads), {gui_thread})
+
+    def test_exception(self):
+        def fail():
+            raise KeyError('x')
+        future = self.testee.submit(self.worker, fail)
+        self.assertTrue(self.process_until(future.done))
+        self.assertIsInstance(future.exception(), KeyError)
+
+    def test_call_in_gui_from_command(self):
+        gui_thread = threading.current_thread()
+
+        def in_gui(value):
+            return threading.current_thread(), value * 3
+
+        def work():
+            return self.worker.call_in_gui(in_gui, 5).result(timeout=5)
+
+        future = self.testee.submit(self.worker, work)
+        self.assertTrue(self.process_until(future.done))
+        self.assertEqual(future.result(), (gui_thread, 15))
+
+    def test_call_in_gui_exception(self):
+        def work():
+            return self.worker.call_in_gui(
+                lambda: 1 / 0).exception(timeout=5)
+
+        future = self.testee.submit(self.worker, work)
+        self.assertTrue(self.process_until(future.done))
+        self.assertIsInstance(future.result(), ZeroDivisionError)
+
+    def test_cancel_running(self):
+        handled = []
+        started = threading.Event()
+
+        class Row(TsMessage):
+            def on_gui_side(self):
+                handled.append(self)
+
+        def work():
+            rows = 0
+            started.set()
+            while not self.worker.cancelled:
+                self.worker.send_to_gui(Row(self.plugin, self.worker))
+                rows = rows + 1
+                sleep(0.001)
+            return rows
+
+        future = self.testee.submit(self.worker, work)
+        queued = self.testee.submit(self.worker, MagicMock())
+        self.assertTrue(started.wait(5))
+        sleep(0.05)
+        self.testee.cancel(self.worker)
+
+        self.assertTrue(self.process_until(
+            lambda: future.done() and queued.done()))
+        self.assertIsInstance(future.exception(), CancelledError)
+        self.assertTrue(queued.cancelled())
+        self.assertEqual(handled, [])
+        self.assertGreater(self.testee.cancelled_messages, 0)
+
+        # The worker goes on with new work.
+        later = self.testee.submit(self.worker, lambda: 5)
+        self.assertTrue(self.process_until(later.done))
+        self.assertEqual(later.result(), 5)
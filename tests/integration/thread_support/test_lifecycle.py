@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Thread sides coming and going, and the gui side shutting down.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import threading
+from time import perf_counter
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from PyQt5.QtCore import QCoreApplication, QEventLoop
+
+from qgis_plutil.thread_support.gui_side import GuiSide
+from qgis_plutil.thread_support.messages.base import TsMessage
+from qgis_plutil.thread_support.thread_side import ThreadSide
+from qgis_plutil.thread_support.worker import Worker
+
+logger = logging.getLogger('tests.plutil.thread_support.lifecycle')
+
+
+class SlowMessage(TsMessage):
+    def on_gui_side(self):
+        while True:
+            yield
+
+
+class StubbornThread(ThreadSide, threading.Thread):
+    """ Ignores everything until told otherwise. """
+    def __init__(self, *args, **kwargs):
+        super(StubbornThread, self).__init__(*args, **kwargs)
+        self.stop = threading.Event()
+
+    def run(self):
+        self.thread_side_started()
+        self.stop.wait(10)
+
+
+class TestLifecycle(TestCase):
+    def setUp(self):
+        self.plugin = MagicMock()
+        self.plugin.get.side_effect = lambda key, default: default
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        self.testee = GuiSide()
+
+    def tearDown(self):
+        self.testee.timer.stop()
+        self.testee = None
+
+    def process_until(self, condition, timeout=5.0):
+        deadline = perf_counter() + timeout
+        while not condition() and perf_counter() < deadline:
+            self.app.processEvents(QEventLoop.AllEvents, 10)
+        return condition()
+
+    def test_worker_unties_itself(self):
+        worker = Worker(self.plugin)
+        self.testee.tie(worker)
+        worker.start()
+        future = self.testee.submit(worker, sum, [1, 2, 3])
+        worker.stop()
+        self.assertTrue(self.process_until(
+            lambda: not self.testee.side_workers))
+        self.assertEqual(future.result(0), 6)
+        self.assertFalse(self.testee.timer.isActive())
+        self.assertEqual(self.testee.token.callbacks, [])
+
+    def test_shutdown(self):
+        workers = [Worker(self.plugin) for i in range(3)]
+        for worker in workers:
+            self.testee.tie(worker)
+            worker.start()
+
+        # The command needs the gui thread to finish.
+        futures = [self.testee.submit(
+            worker, lambda w=worker: w.call_in_gui(lambda: 7).result(5))
+            for worker in workers]
+        self.assertTrue(self.testee.shutdown(timeout=5))
+        self.assertEqual([future.result(0) for future in futures], [7] * 3)
+        self.assertFalse(any(worker.is_alive() for worker in workers))
+        self.assertEqual(self.testee.side_workers, [])
+        self.assertFalse(self.testee.timer.isActive())
+
+    def test_shutdown_timeout(self):
+        thread = StubbornThread(self.plugin)
+        self.testee.tie(thread)
+        thread.start()
+        slow = SlowMessage(self.plugin, thread)
+        slow.on_cancelled = MagicMock()
+        thread.send_to_gui(slow)
+
+        started = perf_counter()
+        with self.assertLogs('plutil.gui-side', logging.WARNING):
+            self.assertFalse(self.testee.shutdown(timeout=0.3))
+        self.assertLess(perf_counter() - started, 2.0)
+        self.assertEqual(len(self.testee.tasks), 0)
+        slow.on_cancelled.assert_called_once()
+        self.assertEqual(self.testee.side_workers, [])
+        thread.stop.set()
+        thread.join(5)
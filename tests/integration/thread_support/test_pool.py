@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+A pool of workers serving a gui side.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import threading
+from time import perf_counter, sleep
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from PyQt5.QtCore import QCoreApplication, QEventLoop
+
+from qgis_plutil.thread_support.gui_side import GuiSide
+from qgis_plutil.thread_support.pool import WorkerPool
+
+logger = logging.getLogger('tests.plutil.thread_support.pool')
+
+
+class TestPool(TestCase):
+    def setUp(self):
+        self.plugin = MagicMock()
+        self.plugin.get.side_effect = lambda key, default: default
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        self.gui_side = GuiSide()
+        self.testee = WorkerPool(self.gui_side, self.plugin,
+                                 min_workers=1, max_workers=4,
+                                 idle_timeout=0.2)
+        self.testee.start()
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+
+    def tearDown(self):
+        self.testee.shutdown(timeout=5)
+        self.gui_side.timer.stop()
+        self.testee = None
+
+    def process_until(self, condition, timeout=5.0):
+        deadline = perf_counter() + timeout
+        while not condition() and perf_counter() < deadline:
+            self.app.processEvents(QEventLoop.AllEvents, 10)
+        return condition()
+
+    def io_job(self, value):
+        with self.lock:
+            self.running = self.running + 1
+            self.peak = max(self.peak, self.running)
+        sleep(0.05)
+        with self.lock:
+            self.running = self.running - 1
+        return value
+
+    def test_concurrent_io(self):
+        futures = [self.testee.submit(self.io_job, i) for i in range(16)]
+        self.assertTrue(self.process_until(
+            lambda: all(future.done() for future in futures)))
+        self.assertEqual([future.result() for future in futures],
+                         list(range(16)))
+        self.assertEqual(len(self.testee), 4)
+        self.assertGreater(self.peak, 1)
+        self.assertLessEqual(self.peak, 4)
+
+        # Extra workers leave once idle.
+        self.assertTrue(self.process_until(
+            lambda: len(self.testee) == 1))
+
+    def test_scale_down_detaches(self):
+        for cycle in range(3):
+            futures = [self.testee.submit(self.io_job, i) for i in range(8)]
+            self.assertTrue(self.process_until(
+                lambda: all(future.done() for future in futures)))
+            self.assertTrue(self.process_until(
+                lambda: len(self.testee) == 1 and
+                len(self.gui_side.side_workers) == 1))
+        worker = self.testee.workers[0]
+        self.assertEqual(self.gui_side.side_workers, [worker])
+        self.assertEqual(self.gui_side.token.callbacks,
+                         [worker.token.propagate])
+
+    def test_shutdown_detaches(self):
+        futures = [self.testee.submit(self.io_job, i) for i in range(4)]
+        self.assertTrue(self.process_until(
+            lambda: all(future.done() for future in futures)))
+        self.testee.shutdown(timeout=5)
+        self.assertTrue(self.process_until(
+            lambda: not self.gui_side.side_workers))
+        self.assertEqual(self.gui_side.token.callbacks, [])
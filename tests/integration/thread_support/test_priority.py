@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Control messages overtaking a saturated bulk lane.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import threading
+from queue import Queue
+from time import perf_counter, sleep
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from PyQt5.QtCore import QCoreApplication, QEventLoop
+
+from qgis_plutil.thread_support.gui_side import GuiSide
+from qgis_plutil.thread_support.messages.base import TsMessage
+from qgis_plutil.thread_support.thread_side import ThreadSide
+
+logger = logging.getLogger('tests.plutil.thread_support.priority')
+
+
+class BulkMessage(TsMessage):
+    default_priority = TsMessage.PRIORITY_BULK
+
+    def on_gui_side(self):
+        self.plugin.bulk_seen.append(perf_counter())
+
+
+class ControlMessage(TsMessage):
+    default_priority = TsMessage.PRIORITY_CONTROL
+
+    def on_gui_side(self):
+        self.plugin.control_seen.append(perf_counter())
+
+
+class Producer(ThreadSide, threading.Thread):
+    def __init__(self, plugin):
+        ThreadSide.__init__(self, plugin)
+        threading.Thread.__init__(self, daemon=True)
+        self.running = True
+
+    def run(self):
+        self.thread_side_started()
+        while self.running:
+            for i in range(200):
+                self.send_to_gui(BulkMessage(self.plugin, self))
+
+
+class TestPriority(TestCase):
+    def setUp(self):
+        self.plugin = MagicMock()
+        self.plugin.get.side_effect = lambda key, default: default
+        self.plugin.bulk_seen = []
+        self.plugin.control_seen = []
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        self.testee = GuiSide()
+        self.producer = Producer(self.plugin)
+        self.testee.tie(self.producer)
+
+    def tearDown(self):
+        self.producer.running = False
+        self.producer.join(5)
+        self.testee.timer.stop()
+        self.testee = None
+
+    def process_until(self, condition, timeout=5.0):
+        deadline = perf_counter() + timeout
+        while not condition() and perf_counter() < deadline:
+            self.app.processEvents(QEventLoop.AllEvents, 10)
+        return condition()
+
+    def measure(self):
+        """ Returns the latency of a control message and the number of
+        bulk messages handled before it. """
+        self.producer.start()
+        # Let the bulk lane fill up while the gui side is not looking.
+        deadline = perf_counter() + 5.0
+        while self.producer.queue.qsize() < 5000 and perf_counter() < deadline:
+            sleep(0.01)
+        self.assertGreaterEqual(self.producer.queue.qsize(), 5000)
+
+        sent = perf_counter()
+        self.producer.send_to_gui(ControlMessage(self.plugin, self.producer))
+        self.assertTrue(self.process_until(
+            lambda: self.plugin.control_seen, timeout=30.0))
+        handled = self.plugin.control_seen[0]
+        overtaken = len([t for t in self.plugin.bulk_seen
+                         if sent < t < handled])
+        logger.debug("control latency %.2f ms behind %d bulk messages",
+                     (handled - sent) * 1000, overtaken)
+        return handled - sent, overtaken
+
+    def test_control_latency(self):
+        latency, overtaken = self.measure()
+
+        # The bulk lane is still saturated but the control message went
+        # through within the first turn.
+        self.assertGreater(self.producer.queue.qsize(), 1000)
+        self.assertLess(latency, 0.5)
+        self.assertLess(overtaken, 1000)
+
+    def test_control_latency_fifo(self):
+        # The same load with a plain queue: the control message waits
+        # for all the bulk messages queued before it.
+        self.producer.queue = Queue()
+        latency, overtaken = self.measure()
+        self.assertGreaterEqual(overtaken, 5000)
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+A gui side talking to a child process.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import array
+import gc
+import logging
+import os
+from time import perf_counter
+from unittest import TestCase, SkipTest
+from unittest.mock import MagicMock
+
+from PyQt5.QtCore import QCoreApplication, QEventLoop
+
+from qgis_plutil.thread_support.gui_side import GuiSide
+from qgis_plutil.thread_support.messages.base import TsMessage
+from qgis_plutil.thread_support.messages.coalescing import CoalescingMessage
+from qgis_plutil.thread_support.messages.payload import (
+    PayloadMessage, shared_memory
+)
+from qgis_plutil.thread_support.process_side import ProcessSide
+
+logger = logging.getLogger('tests.plutil.thread_support.process')
+
+
+class PidMessage(TsMessage):
+    def __init__(self, *args, **kwargs):
+        super(PidMessage, self).__init__(*args, **kwargs)
+        self.pid = os.getpid()
+        self.value = None
+
+    def on_gui_side(self):
+        self.thread_side.received.append((self.pid, self.value))
+
+
+def child_work(side, count):
+    for i in range(count):
+        message = PidMessage(None, side)
+        message.value = i * i
+        side.send_buffered(message)
+
+
+class ArrayMessage(PayloadMessage):
+    def on_gui_side(self):
+        view = self.payloads['values'].view()
+        self.thread_side.received.append(
+            (self.payloads['values'].name, view.tolist()))
+        view.release()
+
+
+def child_payload(side, count):
+    message = ArrayMessage(None, side)
+    message.add_payload('values', array.array('d', range(count)))
+    side.send_to_gui(message)
+
+
+class ProgressMessage(CoalescingMessage):
+    def __init__(self, plugin, thread_side, value):
+        super(ProgressMessage, self).__init__(plugin, thread_side, 'progress')
+        self.value = value
+
+    def on_gui_side(self):
+        self.thread_side.received.append(self.value)
+
+
+def child_progress(side, count):
+    for i in range(count):
+        side.send_to_gui(ProgressMessage(None, side, i))
+
+
+def child_crash(side):
+    side.send_to_gui(PidMessage(None, side))
+    side.flush()
+    side.channel.close()
+    side.channel.join_thread()
+    # No way for run_child() to tell the pump.
+    os._exit(3)
+
+
+class TestProcessSide(TestCase):
+    def setUp(self):
+        self.plugin = MagicMock()
+        self.plugin.get.side_effect = lambda key, default: default
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        self.testee = GuiSide()
+        self.proc = ProcessSide(self.plugin, child_work, args=(50,))
+        self.proc.received = []
+        self.testee.tie(self.proc)
+
+    def tearDown(self):
+        self.proc.terminate()
+        self.proc.join(5)
+        self.testee.timer.stop()
+        self.testee = None
+
+    def process_until(self, condition, timeout=10.0):
+        deadline = perf_counter() + timeout
+        while not condition() and perf_counter() < deadline:
+            self.app.processEvents(QEventLoop.AllEvents, 10)
+        return condition()
+
+    def test_messages_from_child(self):
+        self.proc.start()
+        self.assertTrue(self.process_until(
+            lambda: len(self.proc.received) == 50))
+        # The child said goodbye after its last message.
+        self.assertTrue(self.process_until(
+            lambda: self.proc not in self.testee.side_workers))
+        self.assertEqual(self.proc.state, self.proc.STATE_DISCONNECTED)
+        self.assertFalse(self.testee.timer.isActive())
+        pids = set(pid for pid, value in self.proc.received)
+        self.assertEqual(len(pids), 1)
+        self.assertNotIn(os.getpid(), pids)
+        self.assertEqual([value for pid, value in self.proc.received],
+                         [i * i for i in range(50)])
+        self.proc.join(5)
+        self.assertFalse(self.proc.is_alive())
+
+    def test_shared_payload_from_child(self):
+        if shared_memory is None:
+            raise SkipTest("Shared memory requires Python 3.8")
+        self.proc = ProcessSide(self.plugin, child_payload, args=(1000,))
+        self.proc.received = []
+        self.testee.tie(self.proc)
+        self.proc.start()
+        self.assertTrue(self.process_until(
+            lambda: len(self.proc.received) == 1))
+        name, values = self.proc.received[0]
+        self.assertEqual(values, [float(i) for i in range(1000)])
+
+        # The message was consumed and dropped, so is the segment.
+        self.proc.join(5)
+        gc.collect()
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+    def test_coalescing_from_child(self):
+        self.proc = ProcessSide(self.plugin, child_progress, args=(2000,))
+        self.proc.received = []
+        self.testee.tie(self.proc)
+        self.proc.start()
+        self.proc.join(10)
+        self.assertTrue(self.process_until(
+            lambda: self.proc.received and self.proc.received[-1] == 1999))
+        self.assertLess(len(self.proc.received), 2000)
+        self.assertEqual(self.proc.received, sorted(self.proc.received))
+
+    def test_child_crash(self):
+        self.proc = ProcessSide(self.plugin, child_crash)
+        self.proc.received = []
+        self.testee.tie(self.proc)
+        self.proc.start()
+        self.assertTrue(self.process_until(
+            lambda: len(self.proc.received) == 1))
+        self.proc.join(5)
+        self.assertFalse(self.proc.is_alive())
@@ -6,7 +6,7 @@ from __future__ import print_function
 
 import logging
 import threading
-from time import sleep
+from time import sleep, perf_counter
 from unittest import TestCase, SkipTest
 from unittest.mock import MagicMock
 
@@ -28,8 +28,8 @@ class WorkerThread(ThreadSide, threading.Thread):
 
     def run(self):
         self.thread_side_started()
-        while not self.stop.is_set():
-            pass
+        # Wait without spinning, so the gui side gets the cpu.
+        self.stop.wait()
 
 
 class AMessage(TsMessage):
@@ -85,3 +85,35 @@ class TestTestee(TestCase):
         self.assertEqual(msg.on_thread_side_called, 1)
         self.assertEqual(msg.on_thread_side_called, 1)
         logger.debug("Run GuiSide/ThreadSide test ends")
+
+
+class TestEventWakeup(TestCase):
+    def setUp(self):
+        self.plugin = MagicMock()
+        self.plugin.get.side_effect = lambda key, default: default
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        self.thread = WorkerThread(self.plugin)
+        self.testee = GuiSide()
+        self.testee.wakeup_mode = GuiSide.WAKEUP_EVENT
+        self.testee.tie(self.thread)
+        self.thread.start()
+
+    def tearDown(self):
+        self.thread.stop.set()
+        self.thread.join()
+        self.testee.timer.stop()
+        self.testee = None
+
+    def process_until(self, condition, timeout=2.0):
+        deadline = perf_counter() + timeout
+        while not condition() and perf_counter() < deadline:
+            self.app.processEvents(QEventLoop.AllEvents, 10)
+        return condition()
+
+    def test_drained_without_timer(self):
+        self.assertTrue(self.process_until(
+            lambda: self.thread.state == self.thread.STATE_CONNECTED))
+        msg = AMessage(self.plugin, self.thread)
+        self.thread.send_to_gui(msg)
+        self.assertTrue(self.process_until(lambda: msg.on_on_gui_side == 1))
+        self.assertFalse(self.testee.wakeup_pending)
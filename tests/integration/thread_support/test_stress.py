@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Many thread sides tied to a single gui side.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import threading
+from time import perf_counter
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from PyQt5.QtCore import QCoreApplication, QEventLoop
+
+from qgis_plutil.thread_support.gui_side import GuiSide
+from qgis_plutil.thread_support.messages.base import TsMessage
+from qgis_plutil.thread_support.thread_side import ThreadSide
+
+logger = logging.getLogger('tests.plutil.thread_support.stress')
+
+
+class CountMessage(TsMessage):
+    def on_gui_side(self):
+        self.thread_side.received = self.thread_side.received + 1
+
+
+class BurstThread(ThreadSide, threading.Thread):
+    def __init__(self, plugin, count, go):
+        super(BurstThread, self).__init__(plugin=plugin)
+        self.count = count
+        self.go = go
+        self.received = 0
+
+    def run(self):
+        self.thread_side_started()
+        self.go.wait()
+        for i in range(self.count):
+            self.send_to_gui(CountMessage(self.plugin, self))
+
+
+class TestManyWorkers(TestCase):
+    workers = 128
+    messages = 50
+
+    def setUp(self):
+        self.plugin = MagicMock()
+        self.plugin.get.side_effect = lambda key, default: default
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        self.go = threading.Event()
+        self.testee = GuiSide()
+        self.testee.wakeup_mode = GuiSide.WAKEUP_EVENT
+        self.threads = [
+            BurstThread(self.plugin, self.messages, self.go)
+            for i in range(self.workers)
+        ]
+        for thread in self.threads:
+            self.testee.tie(thread)
+            thread.start()
+
+    def tearDown(self):
+        self.go.set()
+        for thread in self.threads:
+            thread.join()
+        self.testee.timer.stop()
+        self.testee = None
+
+    def process_until(self, condition, timeout=20.0):
+        deadline = perf_counter() + timeout
+        while not condition() and perf_counter() < deadline:
+            self.app.processEvents(QEventLoop.AllEvents, 10)
+        return condition()
+
+    def test_no_lost_wakeup(self):
+        self.assertTrue(self.process_until(lambda: all(
+            thread.state == thread.STATE_CONNECTED
+            for thread in self.threads)))
+        self.go.set()
+        self.assertTrue(self.process_until(lambda: all(
+            thread.received == self.messages
+            for thread in self.threads)))
+        self.assertEqual(self.testee.queue_depth(), 0)
+        self.assertEqual(self.testee.drain_stats.messages,
+                         self.workers * (self.messages + 1))
+
+    def test_idle_workers_not_visited(self):
+        self.assertTrue(self.process_until(lambda: all(
+            thread.state == thread.STATE_CONNECTED
+            for thread in self.threads)))
+        for thread in self.threads:
+            thread.queue.get = MagicMock(side_effect=thread.queue.get)
+
+        active = self.threads[7]
+        active.send_to_gui(CountMessage(self.plugin, active))
+        self.assertTrue(self.process_until(lambda: active.received == 1))
+        for thread in self.threads:
+            if thread is not active:
+                thread.queue.get.assert_not_called()
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for HttpServer.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from PyQt5.QtCore import QCoreApplication
+
+from qgis_plutil.constants import ADD_TO_QUEUE, DONT_ADD_TO_QUEUE
+from qgis_plutil.http_server.api import HttpServer, ServerThread
+from qgis_plutil.http_server.events import EventHub
+from qgis_plutil.http_server.message import HttpMessage
+from qgis_plutil.http_server.wsgi import PooledWSGIServer
+
+logger = logging.getLogger('tests.plutil.http_server.api')
+
+
+class TestHttpServer(TestCase):
+    def setUp(self):
+        self.plugin = MagicMock()
+        self.plugin.get.side_effect = lambda key, default: default
+        self.thread_side = MagicMock()
+        self.testee = HttpServer(self.plugin)
+
+    def tearDown(self):
+        self.testee = None
+
+    def test_init(self):
+        self.assertEqual(len(self.testee.results), 0)
+        self.assertEqual(self.testee.results.ttl, 60.0)
+        self.assertEqual(self.testee.results.max_entries, 1000)
+        self.assertEqual(self.testee.results.waiters_limit, 16)
+
+    def test_message_handled(self):
+        message = HttpMessage(self.plugin, self.thread_side)
+        message.result_type = 'OK'
+        message.result_data = [1, 2]
+        self.testee.message_handled(message, DONT_ADD_TO_QUEUE)
+        self.assertEqual(len(self.testee.results), 0)
+        self.testee.message_handled(message, ADD_TO_QUEUE)
+        entry = self.testee.results.entries[message.external_id]
+        # Only the result is kept.
+        self.assertEqual(entry[2:], ['OK', [1, 2]])
+        self.assertEqual(self.testee.stats()['results']['entries'], 1)
+        self.assertEqual(self.testee.results.take(message.external_id),
+                         ('OK', [1, 2]))
+
+    def test_message_handled_publishes(self):
+        subscriber = self.testee.events.subscribe([EventHub.TOPIC_RESULT])
+        message = HttpMessage(self.plugin, self.thread_side)
+        message.result_type = 'OK'
+        message.result_data = 4
+        self.testee.message_handled(message, ADD_TO_QUEUE)
+        self.assertEqual(subscriber.next(0)[1:], (EventHub.TOPIC_RESULT, {
+            'id': message.external_id, 'status': 'OK', 'result': 4}))
+        # Still there for clients that poll.
+        self.assertIn(message.external_id, self.testee.results)
+        self.assertEqual(self.testee.stats()['events']['subscribers'], 1)
+
+    def test_event_topics_changed(self):
+        # No server, nothing to connect.
+        self.testee.events.subscribe([EventHub.TOPIC_LAYER_EDITED])
+        self.testee.server_thread = MagicMock()
+        self.testee.events.subscribe([EventHub.TOPIC_LEGEND_CHANGED])
+        self.testee.server_thread.call_in_gui.assert_called_once_with(
+            self.testee.qgis_events.sync)
+
+    def test_keeps_latest(self):
+        self.testee.results.max_entries = 3
+        messages = [HttpMessage(self.plugin, self.thread_side)
+                    for i in range(5)]
+        for message in messages:
+            self.testee.message_handled(message, ADD_TO_QUEUE)
+        self.assertEqual(list(self.testee.results.entries),
+                         [message.external_id for message in messages[2:]])
+
+    def test_submit_many(self):
+        created = []
+
+        def factory(plugin, server_thread, params):
+            if 'bad' in params:
+                raise ValueError("bad parameter")
+            message = HttpMessage(plugin, server_thread)
+            created.append(params)
+            return message
+        self.testee.register_operation('echo', factory)
+        with self.assertRaises(RuntimeError):
+            self.testee.submit_many([{'op': 'echo'}])
+
+        server_thread = MagicMock()
+        server_thread.send_batch.return_value = True
+        self.testee.server_thread = server_thread
+        ids = self.testee.submit_many([
+            {'op': 'echo', 'params': {'a': 1}}, {'op': 'echo'}])
+        self.assertEqual(created, [{'a': 1}, {}])
+        messages = server_thread.send_batch.call_args[0][0]
+        self.assertEqual(ids, [message.external_id for message in messages])
+        server_thread.send_batch.assert_called_once()
+
+        for operations in ([{'op': 'missing'}], ['echo'],
+                           [{'op': 'echo', 'params': {'bad': 1}}],
+                           [{'op': 'echo'}] * 1001):
+            with self.assertRaises(ValueError):
+                self.testee.submit_many(operations)
+        server_thread.send_batch.assert_called_once()
+
+        server_thread.send_batch.return_value = False
+        with self.assertRaises(RuntimeError):
+            self.testee.submit_many([{'op': 'echo'}])
+
+    def test_stop(self):
+        from flask import cli
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        subscriber = self.testee.events.subscribe([EventHub.TOPIC_RESULT])
+        server_thread = ServerThread(
+            app=MagicMock(), host='127.0.0.1', port=1, server=self.testee)
+        self.testee.server_thread = server_thread
+        self.testee.app = MagicMock()
+        self.testee.prev_banner = cli.show_server_banner
+        self.testee.tie(server_thread)
+        token = server_thread.token
+        self.testee.stop()
+        self.assertTrue(subscriber.closed)
+        # The thread never started; stop() must not wait for it.
+        self.assertTrue(server_thread.stopping.is_set())
+        self.assertTrue(token.cancelled)
+        self.assertNotIn(server_thread, self.testee.side_workers)
+        self.assertIsNone(server_thread.gui_side)
+        self.assertIsNone(self.testee.server_thread)
+
+
+class TestServerThread(TestCase):
+    def setUp(self):
+        self.settings = {}
+        self.server = MagicMock()
+        self.server.plugin.get.side_effect = \
+            lambda key, default: self.settings.get(key, default)
+
+    def make(self):
+        return ServerThread(app=MagicMock(), host='127.0.0.1', port=0,
+                            server=self.server)
+
+    def test_init(self):
+        testee = self.make()
+        self.assertEqual(testee.mode, ServerThread.MODE_DEVELOPMENT)
+        self.assertFalse(testee.debug)
+        self.assertIsNotNone(str(testee))
+        self.assertIsNotNone(repr(testee))
+
+        self.settings.update({
+            'http-server/mode': 'production',
+            'http-server/threads': '3',
+            'http-server/backlog': '10',
+            'http-server/keep-alive': '0',
+            'http-server/request-timeout': '2.5',
+            'http-server/debug': 'true',
+        })
+        testee = self.make()
+        self.assertEqual(testee.mode, ServerThread.MODE_PRODUCTION)
+        self.assertEqual(testee.threads, 3)
+        self.assertEqual(testee.backlog, 10)
+        self.assertEqual(testee.keep_alive, 0.0)
+        self.assertEqual(testee.request_timeout, 2.5)
+        self.assertTrue(testee.debug)
+
+    def test_make_wsgi_server(self):
+        self.settings['http-server/mode'] = 'production'
+        self.settings['http-server/threads'] = 3
+        testee = self.make()
+        wsgi_server = testee.make_wsgi_server()
+        try:
+            self.assertIsInstance(wsgi_server, PooledWSGIServer)
+            self.assertEqual(wsgi_server.threads, 3)
+            self.assertFalse(testee.app.debug)
+        finally:
+            wsgi_server.server_close()
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for EventHub and Subscriber.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import threading
+from unittest import TestCase
+
+from qgis_plutil.http_server.events import EventHub, Subscriber
+
+logger = logging.getLogger('tests.plutil.http_server.events')
+
+
+class TestSubscriber(TestCase):
+    def setUp(self):
+        self.testee = Subscriber(['a', 'b'], buffer_size=2)
+
+    def tearDown(self):
+        self.testee = None
+
+    def test_init(self):
+        self.assertEqual(self.testee.topics, frozenset(('a', 'b')))
+        self.assertFalse(self.testee.closed)
+        self.assertIsNotNone(str(self.testee))
+        self.assertIsNotNone(repr(self.testee))
+
+    def test_push(self):
+        self.assertTrue(self.testee.push((1, 'a', 1)))
+        self.assertTrue(self.testee.push((2, 'a', 2)))
+        self.assertFalse(self.testee.push((3, 'a', 3)))
+        self.assertEqual(self.testee.next(0), (1, 'a', 1))
+        self.assertEqual(self.testee.next(0), (2, 'a', 2))
+        self.assertIsNone(self.testee.next(0.01))
+
+    def test_next_waits(self):
+        timer = threading.Timer(0.05, self.testee.push, ((1, 'a', 1),))
+        timer.start()
+        self.assertEqual(self.testee.next(5), (1, 'a', 1))
+        timer.join()
+
+    def test_close(self):
+        self.testee.push((1, 'a', 1))
+        timer = threading.Timer(0.05, self.testee.close, ('done',))
+        self.testee.next(0)
+        timer.start()
+        self.assertIsNone(self.testee.next(5))
+        timer.join()
+        self.assertTrue(self.testee.closed)
+        self.assertEqual(self.testee.reason, 'done')
+        # Pushing to a closed subscriber is not an overflow.
+        self.assertTrue(self.testee.push((2, 'a', 2)))
+        self.assertIsNone(self.testee.next(0))
+
+
+class TestEventHub(TestCase):
+    def setUp(self):
+        self.changes = []
+        self.testee = EventHub(buffer_size=2, max_subscribers=3,
+                               listener=self.changes.append)
+
+    def tearDown(self):
+        self.testee = None
+
+    def test_init(self):
+        self.assertEqual(len(self.testee), 0)
+        self.assertFalse(self.testee.wanted(EventHub.TOPIC_RESULT))
+        self.assertIn(EventHub.TOPIC_RESULT, EventHub.TOPICS)
+        self.assertNotIn(EventHub.TOPIC_RESULT, EventHub.QGIS_TOPICS)
+        self.assertIsNotNone(str(self.testee))
+        self.assertIsNotNone(repr(self.testee))
+
+    def test_subscribe(self):
+        first = self.testee.subscribe(['a'])
+        self.assertEqual(self.changes, [{'a'}])
+        second = self.testee.subscribe(['a', 'b'])
+        self.assertEqual(self.changes, [{'a'}, {'a', 'b'}])
+        self.testee.subscribe(['a'])
+        # The set of topics did not change.
+        self.assertEqual(len(self.changes), 2)
+        self.assertRaises(RuntimeError, self.testee.subscribe, ['a'])
+        self.assertEqual(self.testee.topics, {'a': 3, 'b': 1})
+
+        self.testee.unsubscribe(second, 'bye')
+        self.assertTrue(second.closed)
+        self.assertEqual(self.changes[-1], {'a'})
+        self.assertEqual(self.testee.topics, {'a': 2})
+        # Twice is harmless.
+        self.testee.unsubscribe(second)
+        self.assertEqual(len(self.changes), 3)
+        self.assertFalse(first.closed)
+
+    def test_publish(self):
+        first = self.testee.subscribe(['a'])
+        second = self.testee.subscribe(['b'])
+        self.testee.publish('a', 1)
+        self.testee.publish('b', 2)
+        self.testee.publish('c', 3)
+        self.assertEqual(first.next(0), (1, 'a', 1))
+        self.assertIsNone(first.next(0))
+        self.assertEqual(second.next(0), (2, 'b', 2))
+        self.assertEqual(self.testee.stats()['published'], 2)
+
+    def test_slow_consumer(self):
+        slow = self.testee.subscribe(['a'])
+        fast = self.testee.subscribe(['a'])
+        for i in range(3):
+            self.testee.publish('a', i)
+            fast.next(0)
+        self.assertTrue(slow.closed)
+        self.assertEqual(slow.reason, 'slow consumer')
+        self.assertFalse(fast.closed)
+        self.assertEqual(len(self.testee), 1)
+        self.assertEqual(self.testee.stats()['evictions'], 1)
+        self.testee.publish('a', 3)
+        self.assertEqual(fast.next(0), (4, 'a', 3))
+
+    def test_close_all(self):
+        subscribers = [self.testee.subscribe(['a']) for i in range(2)]
+        self.testee.close_all('stopped')
+        self.assertEqual(len(self.testee), 0)
+        self.assertEqual(self.changes[-1], set())
+        self.assertTrue(all(subscriber.reason == 'stopped'
+                            for subscriber in subscribers))
+
+    def test_listener_fails(self):
+        def listener(topics):
+            raise ValueError
+        self.testee.listener = listener
+        self.testee.subscribe(['a'])
+        self.assertTrue(self.testee.wanted('a'))
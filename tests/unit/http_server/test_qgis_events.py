@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for QgisEventSource.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+from unittest import TestCase
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from qgis_plutil.http_server.events import EventHub
+from qgis_plutil.http_server.qgis_events import QgisEventSource
+
+logger = logging.getLogger('tests.plutil.http_server.qgis_events')
+
+
+class FakeLayer(QObject):
+    """ Has the signals of a vector layer. """
+    layerModified = pyqtSignal()
+    selectionChanged = pyqtSignal(list, list, bool)
+
+    def __init__(self, layer_id):
+        super(FakeLayer, self).__init__()
+        self.layer_id = layer_id
+        self.selected = 0
+
+    def id(self):
+        return self.layer_id
+
+    def name(self):
+        return 'Layer %s' % self.layer_id
+
+    def selectedFeatureCount(self):
+        return self.selected
+
+
+class FakeRasterLayer(QObject):
+    """ Has none of the signals we want. """
+    def id(self):
+        return 'raster'
+
+
+class FakeRoot(QObject):
+    addedChildren = pyqtSignal(object, int, int)
+    removedChildren = pyqtSignal(object, int, int)
+    visibilityChanged = pyqtSignal(object)
+    nameChanged = pyqtSignal(object, str)
+
+
+class FakeProject(QObject):
+    layersAdded = pyqtSignal(list)
+    layerWillBeRemoved = pyqtSignal(str)
+
+    def __init__(self):
+        super(FakeProject, self).__init__()
+        self.root = FakeRoot()
+        self.layers = {}
+
+    def layerTreeRoot(self):
+        return self.root
+
+    def mapLayers(self):
+        return self.layers
+
+
+class TestQgisEventSource(TestCase):
+    def setUp(self):
+        self.project = FakeProject()
+        self.layer = FakeLayer('one')
+        self.project.layers = {
+            'one': self.layer, 'raster': FakeRasterLayer()}
+        self.hub = EventHub()
+        self.testee = QgisEventSource(self.hub, self.project)
+
+    def tearDown(self):
+        self.testee.disconnect()
+        self.testee = None
+
+    def events(self, subscriber):
+        result = []
+        while True:
+            event = subscriber.next(0)
+            if event is None:
+                return result
+            result.append(event[1:])
+
+    def test_init(self):
+        self.assertEqual(self.testee.topics, frozenset())
+        self.assertIsNotNone(str(self.testee))
+        self.assertIsNotNone(repr(self.testee))
+
+    def test_lazy(self):
+        subscriber = self.hub.subscribe([EventHub.TOPIC_RESULT])
+        self.testee.sync()
+        self.assertEqual(self.testee.connections, [])
+        self.layer.layerModified.emit()
+        self.assertEqual(self.events(subscriber), [])
+
+    def test_layer_edited(self):
+        subscriber = self.hub.subscribe([EventHub.TOPIC_LAYER_EDITED])
+        self.testee.sync()
+        self.layer.layerModified.emit()
+        # Not subscribed.
+        self.layer.selectionChanged.emit([], [], False)
+        self.assertEqual(self.events(subscriber), [
+            (EventHub.TOPIC_LAYER_EDITED,
+             {'layer': 'one', 'name': 'Layer one'})])
+
+        self.hub.unsubscribe(subscriber)
+        self.testee.sync()
+        self.assertEqual(self.testee.connections, [])
+        self.assertEqual(self.testee.topics, frozenset())
+
+    def test_selection_changed(self):
+        subscriber = self.hub.subscribe([EventHub.TOPIC_SELECTION_CHANGED])
+        self.testee.sync()
+        self.layer.selected = 3
+        self.layer.selectionChanged.emit([1, 2, 3], [], True)
+        self.assertEqual(self.events(subscriber), [
+            (EventHub.TOPIC_SELECTION_CHANGED,
+             {'layer': 'one', 'name': 'Layer one', 'selected': 3})])
+
+    def test_layers_added_and_removed(self):
+        subscriber = self.hub.subscribe([EventHub.TOPIC_LAYER_EDITED])
+        self.testee.sync()
+        other = FakeLayer('two')
+        self.project.layersAdded.emit([other])
+        other.layerModified.emit()
+        self.assertEqual(len(self.events(subscriber)), 1)
+
+        self.project.layerWillBeRemoved.emit('two')
+        other.layerModified.emit()
+        self.assertEqual(self.events(subscriber), [])
+        self.layer.layerModified.emit()
+        self.assertEqual(len(self.events(subscriber)), 1)
+
+    def test_legend_changed(self):
+        subscriber = self.hub.subscribe([EventHub.TOPIC_LEGEND_CHANGED])
+        self.testee.sync()
+        self.project.root.addedChildren.emit(None, 0, 0)
+        self.project.root.visibilityChanged.emit(None)
+        self.layer.layerModified.emit()
+        self.assertEqual(self.events(subscriber), [
+            (EventHub.TOPIC_LEGEND_CHANGED, {'change': 'addedChildren'}),
+            (EventHub.TOPIC_LEGEND_CHANGED, {'change': 'visibilityChanged'}),
+        ])
+
+    def test_no_qgis(self):
+        self.testee.project = None
+        self.hub.subscribe([EventHub.TOPIC_LEGEND_CHANGED])
+        try:
+            import qgis.core  # noqa: F401
+        except ImportError:
+            self.testee.sync()
+            self.assertEqual(self.testee.topics, frozenset())
+        else:
+            self.skipTest("qgis is installed")
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the common routes.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import json
+import logging
+import threading
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from flask import Flask
+
+from qgis_plutil.constants import ADD_TO_QUEUE
+from qgis_plutil.http_server.api import HttpServer
+from qgis_plutil.http_server.events import EventHub
+from qgis_plutil.http_server.message import HttpMessage
+from qgis_plutil.http_server.routes import define_common_routes
+
+logger = logging.getLogger('tests.plutil.http_server.routes')
+
+
+class TestRoutes(TestCase):
+    def setUp(self):
+        self.plugin = MagicMock()
+        self.plugin.get.side_effect = lambda key, default: default
+        self.server = HttpServer(self.plugin)
+        self.app = Flask('test')
+        define_common_routes(self.plugin, self.app, self.server)
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.server = None
+
+    def get(self, url):
+        return json.loads(self.client.get(url).data)
+
+    def make_result(self, data):
+        message = HttpMessage(self.plugin, MagicMock())
+        message.result_type = 'OK'
+        message.result_data = data
+        return message
+
+    def test_result(self):
+        message = self.make_result(5)
+        self.server.message_handled(message, ADD_TO_QUEUE)
+        self.assertEqual(self.get('/result?id=%s' % message.external_id),
+                         {'status': 'OK', 'result': 5})
+        self.assertEqual(
+            self.get('/result?id=%s' % message.external_id)['status'],
+            'NotFound')
+        self.assertEqual(self.get('/result')['status'], 'Error')
+
+    def test_result_wait(self):
+        message = self.make_result('late')
+        timer = threading.Timer(
+            0.05, self.server.message_handled, (message, ADD_TO_QUEUE))
+        timer.start()
+        self.assertEqual(
+            self.get('/result?id=%s&wait=5' % message.external_id),
+            {'status': 'OK', 'result': 'late'})
+        timer.join()
+        self.assertEqual(self.get('/result?id=x&wait=0.01')['status'],
+                         'NotFound')
+
+    def test_submit(self):
+        def factory(plugin, server_thread, params):
+            message = self.make_result(params['value'])
+            return message
+        self.server.register_operation('value', factory)
+        self.server.server_thread = MagicMock()
+        self.server.server_thread.send_batch.return_value = True
+
+        response = json.loads(self.client.post('/submit', json=[
+            {'op': 'value', 'params': {'value': i}} for i in range(3)]).data)
+        self.assertEqual(response['status'], 'OK')
+        ids = response['result']
+        self.assertEqual(len(ids), 3)
+        for message in self.server.server_thread.send_batch.call_args[0][0]:
+            self.server.message_handled(message, ADD_TO_QUEUE)
+
+        response = json.loads(self.client.post('/submit', json={
+            'operations': [{'op': 'missing'}]}).data)
+        self.assertEqual(response['status'], 'Error')
+        self.assertIn('missing', response['result'])
+        self.assertEqual(json.loads(self.client.post(
+            '/submit', data='garbage').data)['status'], 'Error')
+
+        self.assertEqual(self.get('/results?ids=%s,x' % ','.join(ids[:2])), {
+            'status': 'OK',
+            'result': {ids[0]: {'status': 'OK', 'result': 0},
+                       ids[1]: {'status': 'OK', 'result': 1}}})
+        response = json.loads(self.client.post('/results', json={
+            'ids': ids, 'wait': 0.01}).data)
+        self.assertEqual(response['result'],
+                         {ids[2]: {'status': 'OK', 'result': 2}})
+
+    def test_results_wait(self):
+        messages = [self.make_result(i) for i in range(2)]
+        timers = [threading.Timer(0.05 * (i + 1), self.server.message_handled,
+                                  (message, ADD_TO_QUEUE))
+                  for i, message in enumerate(messages)]
+        for timer in timers:
+            timer.start()
+        response = self.get('/results?wait=5&ids=%s' % ','.join(
+            message.external_id for message in messages))
+        for timer in timers:
+            timer.join()
+        self.assertEqual(len(response['result']), 2)
+
+    def test_events(self):
+        self.server.event_heartbeat = 0.01
+        response = self.client.get('/events', buffered=False)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        chunks = iter(response.response)
+        self.assertIn(b'subscribed to result', next(chunks))
+        self.assertEqual(self.server.events.topics,
+                         {EventHub.TOPIC_RESULT: 1})
+
+        # Nothing happened.
+        self.assertEqual(next(chunks), b': keep-alive\n\n')
+        message = self.make_result([1])
+        self.server.message_handled(message, ADD_TO_QUEUE)
+        chunk = next(chunks).decode('utf-8')
+        while chunk.startswith(':'):
+            chunk = next(chunks).decode('utf-8')
+        lines = chunk.split('\n')
+        self.assertEqual(lines[1], 'event: result')
+        self.assertEqual(json.loads(lines[2][len('data: '):]), {
+            'id': message.external_id, 'status': 'OK', 'result': [1]})
+
+        self.server.events.close_all('server stopped')
+        chunk = next(chunks)
+        while chunk.startswith(b':'):
+            chunk = next(chunks)
+        self.assertEqual(chunk, b'event: closed\ndata: "server stopped"\n\n')
+        self.assertRaises(StopIteration, next, chunks)
+        response.close()
+
+    def test_events_disconnect(self):
+        response = self.client.get(
+            '/events?topics=result,layer-edited', buffered=False)
+        chunks = iter(response.response)
+        next(chunks)
+        self.assertEqual(len(self.server.events), 1)
+        # The client went away.
+        response.close()
+        self.assertEqual(len(self.server.events), 0)
+
+    def test_events_errors(self):
+        self.assertEqual(self.get('/events?topics=result,bogus'), {
+            'status': 'Error', 'result': 'Unknown topics: bogus'})
+        self.server.events.max_subscribers = 0
+        self.assertEqual(self.get('/events')['status'], 'Error')
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for ResultStore.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import threading
+from time import perf_counter
+from unittest import TestCase
+
+from qgis_plutil.http_server.store import ResultStore, estimate_size
+
+logger = logging.getLogger('tests.plutil.http_server.store')
+
+
+class TestResultStore(TestCase):
+    def setUp(self):
+        self.testee = ResultStore(max_entries=3, max_bytes=10000, ttl=10)
+
+    def tearDown(self):
+        self.testee = None
+
+    def test_init(self):
+        self.assertEqual(len(self.testee), 0)
+        self.assertIsNotNone(str(self.testee))
+        self.assertIsNotNone(repr(self.testee))
+        stats = self.testee.stats()
+        self.assertEqual(stats['entries'], 0)
+        self.assertEqual(stats['bytes'], 0)
+
+    def test_estimate_size(self):
+        self.assertGreater(estimate_size('x' * 1000), 1000)
+        self.assertGreater(estimate_size({'a': ['x' * 1000]}), 1000)
+        self.assertGreater(estimate_size(['x' * 1000] * 3), 3000)
+
+    def test_put_take(self):
+        self.testee.put('a', 'OK', 1)
+        self.assertIn('a', self.testee)
+        self.assertEqual(self.testee.take('a'), ('OK', 1))
+        self.assertIsNone(self.testee.take('a'))
+        stats = self.testee.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['bytes'], 0)
+
+    def test_replace(self):
+        self.testee.put('a', 'OK', 'x' * 100)
+        self.testee.put('a', 'OK', 1)
+        self.assertEqual(len(self.testee), 1)
+        self.assertEqual(self.testee.bytes,
+                         estimate_size('a') + estimate_size(1))
+
+    def test_evict_oldest(self):
+        for name in 'abcde':
+            self.testee.put(name, 'OK', name)
+        self.assertEqual(list(self.testee.entries), ['c', 'd', 'e'])
+        self.assertEqual(self.testee.evictions, 2)
+
+    def test_evict_bytes(self):
+        self.testee.put('a', 'OK', 'x' * 4000)
+        self.testee.put('b', 'OK', 'x' * 4000)
+        self.testee.put('c', 'OK', 'x' * 4000)
+        self.assertEqual(list(self.testee.entries), ['b', 'c'])
+        self.assertLessEqual(self.testee.bytes, 10000)
+
+        # The newest result is kept even if it is too large alone.
+        self.testee.put('d', 'OK', 'x' * 20000)
+        self.assertEqual(list(self.testee.entries), ['d'])
+        self.assertEqual(self.testee.take('d')[0], 'OK')
+
+    def test_expired(self):
+        started = perf_counter()
+        self.testee.put('a', 'OK', 1, now=started - 20)
+        self.testee.put('b', 'OK', 2, now=started)
+        self.assertEqual(list(self.testee.entries), ['b'])
+        self.assertEqual(self.testee.expirations, 1)
+        with self.testee.lock:
+            self.assertEqual(self.testee.drop_expired(started + 11), 1)
+        self.assertIsNone(self.testee.take('b'))
+        self.assertEqual(self.testee.bytes, 0)
+
+    def test_take_wait(self):
+        timer = threading.Timer(0.05, self.testee.put, ('a', 'OK', 1))
+        timer.start()
+        started = perf_counter()
+        self.assertEqual(self.testee.take('a', 5), ('OK', 1))
+        self.assertLess(perf_counter() - started, 4)
+        timer.join()
+        self.assertEqual(self.testee.events, {})
+
+        started = perf_counter()
+        self.assertIsNone(self.testee.take('missing', 0.05))
+        self.assertGreaterEqual(perf_counter() - started, 0.05)
+        self.assertEqual(self.testee.events, {})
+        self.assertEqual(self.testee.stats()['waiting'], 0)
+
+    def test_waiters_limit(self):
+        self.testee.limit_waiters(1)
+        self.assertTrue(self.testee.waiters.acquire(blocking=False))
+        started = perf_counter()
+        self.assertIsNone(self.testee.take('missing', 5))
+        self.assertLess(perf_counter() - started, 1)
+        self.assertEqual(self.testee.events, {})
+
+    def test_take_many(self):
+        self.testee.max_entries = 10
+        self.testee.put('a', 'OK', 1)
+        self.testee.put('b', 'OK', 2)
+        self.assertEqual(self.testee.take_many(['a', 'x', 'a']),
+                         {'a': ('OK', 1)})
+        self.assertEqual(self.testee.hits, 1)
+        self.assertEqual(self.testee.misses, 1)
+
+        timers = [threading.Timer(0.05, self.testee.put, ('c', 'OK', 3)),
+                  threading.Timer(0.1, self.testee.put, ('d', 'OK', 4))]
+        for timer in timers:
+            timer.start()
+        started = perf_counter()
+        # Returns as soon as all are there.
+        self.assertEqual(self.testee.take_many(['b', 'c', 'd'], 5), {
+            'b': ('OK', 2), 'c': ('OK', 3), 'd': ('OK', 4)})
+        self.assertLess(perf_counter() - started, 4)
+        for timer in timers:
+            timer.join()
+        self.assertEqual(self.testee.events, {})
+        self.assertEqual(self.testee.waiting, 0)
+        self.assertEqual(len(self.testee), 0)
+
+        # The ones that are ready are returned at the timeout.
+        self.testee.put('e', 'OK', 5)
+        self.assertEqual(self.testee.take_many(['e', 'f'], 0.05),
+                         {'e': ('OK', 5)})
+        self.assertEqual(self.testee.events, {})
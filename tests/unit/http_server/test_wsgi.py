@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for PooledWSGIServer.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import threading
+from http.client import HTTPConnection
+from unittest import TestCase
+
+from qgis_plutil.http_server.wsgi import PooledWSGIServer
+
+logger = logging.getLogger('tests.plutil.http_server.wsgi')
+
+
+class TestPooledWSGIServer(TestCase):
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+        self.release = threading.Event()
+        self.release.set()
+        self.testee = None
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def tearDown(self):
+        self.release.set()
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(5)
+        self.testee = None
+
+    def app(self, environ, start_response):
+        with self.lock:
+            self.running = self.running + 1
+            self.peak = max(self.peak, self.running)
+        self.release.wait(5)
+        with self.lock:
+            self.running = self.running - 1
+        body = environ['PATH_INFO'].encode('utf-8')
+        start_response('200 OK', [('Content-Type', 'text/plain'),
+                                  ('Content-Length', str(len(body)))])
+        return [body]
+
+    def serve(self, **kwargs):
+        self.testee = PooledWSGIServer('127.0.0.1', 0, self.app, **kwargs)
+        self.testee.timeout = 0.05
+
+        def loop():
+            while not self.stopping.is_set():
+                self.testee.handle_request()
+            self.testee.server_close()
+        self.thread = threading.Thread(target=loop)
+        self.thread.start()
+        return self.testee.server_address[1]
+
+    def get(self, port, path, results):
+        connection = HTTPConnection('127.0.0.1', port, timeout=5)
+        connection.request('GET', path)
+        response = connection.getresponse()
+        results.append((response.status, response.read()))
+        connection.close()
+
+    def test_init(self):
+        self.serve(threads=2, backlog=5)
+        self.assertEqual(self.testee.request_queue_size, 5)
+        self.assertTrue(self.testee.multithread)
+        self.assertIsNotNone(str(self.testee))
+        self.assertIsNotNone(repr(self.testee))
+
+    def test_keep_alive(self):
+        port = self.serve(threads=2, keep_alive=5)
+        connection = HTTPConnection('127.0.0.1', port, timeout=5)
+        for path in ('/a', '/b'):
+            connection.request('GET', path)
+            response = connection.getresponse()
+            self.assertEqual(response.read(), path.encode('utf-8'))
+            self.assertEqual(response.version, 11)
+        connection.close()
+
+    def test_no_keep_alive(self):
+        port = self.serve(threads=2, keep_alive=0)
+        connection = HTTPConnection('127.0.0.1', port, timeout=5)
+        connection.request('GET', '/a')
+        response = connection.getresponse()
+        self.assertEqual(response.read(), b'/a')
+        self.assertEqual(response.version, 10)
+        connection.close()
+
+    def test_bounded(self):
+        port = self.serve(threads=2, keep_alive=0)
+        self.release.clear()
+        results = []
+        clients = [threading.Thread(target=self.get,
+                                    args=(port, '/%d' % i, results))
+                   for i in range(5)]
+        for client in clients:
+            client.start()
+        # The other connections wait to be accepted.
+        self.release.wait(0.3)
+        self.assertEqual(self.running, 2)
+        self.release.set()
+        for client in clients:
+            client.join(5)
+        self.assertEqual(len(results), 5)
+        self.assertEqual(self.peak, 2)
+        self.assertTrue(all(status == 200 for status, body in results))
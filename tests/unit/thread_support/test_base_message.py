@@ -31,3 +31,60 @@ class TestBaseMessage(TestCase):
         self.assertEqual(self.testee.plugin, self.plugin)
         self.assertEqual(self.testee.thread_side, self.thread_side)
         self.assertIsNotNone(self.testee.message_id)
+
+    def test_ids(self):
+        other = TsMessage(self.plugin, self.thread_side)
+        self.assertIsInstance(self.testee.message_id, int)
+        self.assertGreater(other.message_id, self.testee.message_id)
+
+    def test_slots(self):
+        self.assertFalse(hasattr(self.testee, '__dict__'))
+
+    def test_external_id(self):
+        self.assertIsNone(self.testee._external_id)
+        external_id = self.testee.external_id
+        self.assertIsInstance(external_id, str)
+        self.assertEqual(len(external_id), 32)
+        self.assertEqual(self.testee.external_id, external_id)
+
+    def test_deadline(self):
+        self.assertIsNone(self.testee.deadline)
+        self.assertFalse(self.testee.expired())
+        self.assertIs(self.testee.expire_after(-1), self.testee)
+        self.assertTrue(self.testee.expired())
+        self.testee.expire_after(100)
+        self.assertFalse(self.testee.expired())
+        self.assertTrue(self.testee.expired(self.testee.deadline + 1))
+        self.testee.expire_after(None)
+        self.assertIsNone(self.testee.deadline)
+        self.testee.on_expired()
+
+    def test_default_ttl(self):
+        class Short(TsMessage):
+            __slots__ = ()
+            default_ttl = -1
+        self.assertTrue(Short(self.plugin, self.thread_side).expired())
+
+    def test_opaque_id(self):
+        class Opaque(TsMessage):
+            __slots__ = ()
+            opaque_id = True
+        testee = Opaque(self.plugin, self.thread_side)
+        self.assertIsInstance(testee.message_id, str)
+        self.assertEqual(testee.external_id, testee.message_id)
+
+    def test_pickle(self):
+        class Loose(TsMessage):
+            pass
+        testee = Loose(self.plugin, self.thread_side)
+        testee.extra = 5
+        state = testee.__getstate__()
+        self.assertIsNone(state['plugin'])
+        self.assertIsNone(state['thread_side'])
+        self.assertEqual(state['extra'], 5)
+        self.assertEqual(state['message_id'], testee.message_id)
+
+        back = Loose.__new__(Loose)
+        back.__setstate__(state)
+        self.assertEqual(back.extra, 5)
+        self.assertEqual(back.message_id, testee.message_id)
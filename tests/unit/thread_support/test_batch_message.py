@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for BatchMessage.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from qgis_plutil.thread_support.messages.base import TsMessage
+from qgis_plutil.thread_support.messages.batch import BatchMessage
+
+logger = logging.getLogger('tests.plutil.thread_support.batch')
+
+
+class TestBatchMessage(TestCase):
+    def setUp(self):
+        self.plugin = MagicMock()
+        self.thread_side = MagicMock()
+        self.messages = [
+            MagicMock(priority=TsMessage.PRIORITY_NORMAL),
+            MagicMock(priority=TsMessage.PRIORITY_BULK)]
+        self.testee = BatchMessage(
+            self.plugin, self.thread_side, self.messages)
+
+    def tearDown(self):
+        self.testee = None
+
+    def test_init(self):
+        self.assertEqual(self.testee.plugin, self.plugin)
+        self.assertEqual(self.testee.thread_side, self.thread_side)
+        self.assertIs(self.testee.messages, self.messages)
+        self.assertEqual(len(self.testee), 2)
+        self.assertIsNotNone(self.testee.message_id)
+        self.assertEqual(self.testee.priority, TsMessage.PRIORITY_NORMAL)
+
+    def test_dropped(self):
+        self.testee.on_dropped()
+        for message in self.messages:
+            message.on_dropped.assert_called_once()
+
+    def test_cancelled(self):
+        self.testee.on_cancelled()
+        for message in self.messages:
+            message.on_cancelled.assert_called_once()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for CallMessage.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+from concurrent.futures import TimeoutError, CancelledError
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from qgis_plutil.constants import DONT_ADD_TO_QUEUE
+from qgis_plutil.thread_support.messages.call import CallMessage
+
+logger = logging.getLogger('tests.plutil.thread_support.call')
+
+
+class TestCallMessage(TestCase):
+    def setUp(self):
+        self.plugin = MagicMock()
+        self.thread_side = MagicMock()
+
+    def test_init(self):
+        fn = MagicMock()
+        testee = CallMessage(self.plugin, self.thread_side, fn, (1,), {'a': 2})
+        self.assertEqual(testee.fn, fn)
+        self.assertEqual(testee.args, (1,))
+        self.assertEqual(testee.kwargs, {'a': 2})
+        self.assertIsNone(testee.deadline)
+        self.assertFalse(testee.future.done())
+
+        testee = CallMessage(self.plugin, self.thread_side, fn, timeout=1)
+        self.assertIsNotNone(testee.deadline)
+
+    def test_result(self):
+        fn = MagicMock(return_value=11)
+        testee = CallMessage(self.plugin, self.thread_side, fn, (1,), {'a': 2})
+        self.assertEqual(testee.on_gui_side(), DONT_ADD_TO_QUEUE)
+        fn.assert_called_once_with(1, a=2)
+        self.assertEqual(testee.future.result(0), 11)
+
+    def test_exception(self):
+        testee = CallMessage(self.plugin, self.thread_side,
+                             MagicMock(side_effect=IndexError))
+        testee.on_gui_side()
+        self.assertIsInstance(testee.future.exception(0), IndexError)
+
+    def test_cancelled(self):
+        fn = MagicMock()
+        testee = CallMessage(self.plugin, self.thread_side, fn)
+        testee.future.cancel()
+        self.assertEqual(testee.on_gui_side(), DONT_ADD_TO_QUEUE)
+        fn.assert_not_called()
+        with self.assertRaises(CancelledError):
+            testee.future.result(0)
+
+    def test_too_late(self):
+        fn = MagicMock()
+        testee = CallMessage(self.plugin, self.thread_side, fn, timeout=-1)
+        testee.on_gui_side()
+        fn.assert_not_called()
+        self.assertIsInstance(testee.future.exception(0), TimeoutError)
+
+    def test_expired(self):
+        testee = CallMessage(self.plugin, self.thread_side, MagicMock())
+        testee.on_expired()
+        self.assertIsInstance(testee.future.exception(0), TimeoutError)
+        testee.on_expired()
+
+    def test_token_cancelled(self):
+        testee = CallMessage(self.plugin, self.thread_side, MagicMock())
+        testee.on_cancelled()
+        self.assertTrue(testee.future.cancelled())
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for CancelToken.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import threading
+from concurrent.futures import CancelledError
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from qgis_plutil.thread_support.cancel import CancelToken
+
+logger = logging.getLogger('tests.plutil.thread_support.cancel')
+
+
+class TestCancelToken(TestCase):
+    def setUp(self):
+        self.testee = CancelToken()
+
+    def tearDown(self):
+        self.testee = None
+
+    def test_init(self):
+        self.assertFalse(self.testee.cancelled)
+        self.assertIsNone(self.testee.reason)
+        self.assertIsNone(self.testee.parent)
+        self.testee.raise_if_cancelled()
+        self.assertFalse(self.testee.wait(0))
+        self.assertIsNotNone(str(self.testee))
+        self.assertIsNotNone(repr(self.testee))
+
+    def test_cancel(self):
+        callback = MagicMock()
+        self.testee.add_callback(callback)
+        self.assertTrue(self.testee.cancel('bored'))
+        self.assertFalse(self.testee.cancel('again'))
+        self.assertTrue(self.testee.cancelled)
+        self.assertEqual(self.testee.reason, 'bored')
+        self.assertTrue(self.testee.wait(0))
+        callback.assert_called_once_with(self.testee)
+        with self.assertRaises(CancelledError):
+            self.testee.raise_if_cancelled()
+
+        # Late callbacks are called right away.
+        late = MagicMock()
+        self.testee.add_callback(late)
+        late.assert_called_once_with(self.testee)
+
+    def test_remove_callback(self):
+        callback = MagicMock()
+        self.testee.add_callback(callback)
+        self.testee.remove_callback(callback)
+        self.testee.remove_callback(callback)
+        self.testee.cancel()
+        callback.assert_not_called()
+
+    def test_failing_callback(self):
+        callback = MagicMock()
+        self.testee.add_callback(MagicMock(side_effect=ValueError))
+        self.testee.add_callback(callback)
+        self.testee.cancel()
+        callback.assert_called_once()
+
+    def test_children(self):
+        child = self.testee.child()
+        grandchild = child.child()
+        other = self.testee.child()
+        other.unlink()
+        self.assertIs(child.parent, self.testee)
+        self.assertIsNone(other.parent)
+
+        self.testee.cancel('stop')
+        self.assertTrue(child.cancelled)
+        self.assertTrue(grandchild.cancelled)
+        self.assertEqual(grandchild.reason, 'stop')
+        self.assertFalse(other.cancelled)
+
+        # Cancelling a child leaves the parent alone.
+        parent = CancelToken()
+        parent.child().cancel()
+        self.assertFalse(parent.cancelled)
+
+        # A token linked to a cancelled parent is cancelled right away.
+        self.assertTrue(CancelToken(self.testee).cancelled)
+
+    def test_wait_from_thread(self):
+        thread = threading.Thread(target=self.testee.wait, daemon=True)
+        thread.start()
+        self.testee.cancel()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
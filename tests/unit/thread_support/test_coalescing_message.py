@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for CoalescingMessage.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import pickle
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from qgis_plutil.thread_support.messages.coalescing import CoalescingMessage
+
+logger = logging.getLogger('tests.plutil.thread_support.coalescing')
+
+
+class TestCoalescingMessage(TestCase):
+    def setUp(self):
+        self.plugin = MagicMock()
+        self.thread_side = MagicMock()
+        self.testee = CoalescingMessage(
+            self.plugin, self.thread_side, key='progress')
+
+    def tearDown(self):
+        self.testee = None
+
+    def test_init(self):
+        self.assertEqual(self.testee.key, 'progress')
+        self.assertEqual(self.testee.plugin, self.plugin)
+        self.assertEqual(self.testee.thread_side, self.thread_side)
+        self.assertIsNotNone(str(self.testee))
+        self.assertIsNotNone(repr(self.testee))
+
+    def test_dropped(self):
+        self.thread_side.take_coalesced.return_value = self.testee
+        self.testee.on_dropped()
+        self.thread_side.take_coalesced.assert_called_once_with('progress')
+        self.thread_side.post.assert_not_called()
+
+    def test_dropped_superseded(self):
+        latest = CoalescingMessage(
+            self.plugin, self.thread_side, key='progress')
+        self.thread_side.take_coalesced.return_value = latest
+        self.testee.on_dropped()
+        self.thread_side.post.assert_called_once_with(latest)
+
+    def test_pickle(self):
+        back = pickle.loads(pickle.dumps(self.testee))
+        self.assertEqual(back.key, 'progress')
+        self.assertIsNone(back.thread_side)
+        back.on_dropped()
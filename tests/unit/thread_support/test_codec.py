@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for PickleCodec.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import threading
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from qgis_plutil.thread_support.codec import MessageCodec, PickleCodec
+from qgis_plutil.thread_support.messages.batch import BatchMessage
+from qgis_plutil.thread_support.messages.hello import HelloMessage
+
+logger = logging.getLogger('tests.plutil.thread_support.codec')
+
+
+class TestPickleCodec(TestCase):
+    def setUp(self):
+        self.testee = PickleCodec()
+        self.plugin = MagicMock()
+        self.thread_side = MagicMock()
+
+    def tearDown(self):
+        self.testee = None
+
+    def test_base(self):
+        with self.assertRaises(NotImplementedError):
+            MessageCodec().encode(None)
+        with self.assertRaises(NotImplementedError):
+            MessageCodec().decode(None, None, None)
+
+    def test_round_trip(self):
+        # A lock can't be pickled, so this also checks that the
+        # references are left behind.
+        message = HelloMessage(threading.Lock(), threading.Lock())
+        data = self.testee.encode(message)
+        self.assertIsInstance(data, bytes)
+        back = self.testee.decode(data, self.plugin, self.thread_side)
+        self.assertIsInstance(back, HelloMessage)
+        self.assertEqual(back.message_id, message.message_id)
+        self.assertIs(back.plugin, self.plugin)
+        self.assertIs(back.thread_side, self.thread_side)
+
+    def test_batch(self):
+        messages = [HelloMessage(None, threading.Lock()) for i in range(3)]
+        batch = BatchMessage(None, threading.Lock(), messages)
+        back = self.testee.decode(
+            self.testee.encode(batch), self.plugin, self.thread_side)
+        self.assertEqual([m.message_id for m in back.messages],
+                         [m.message_id for m in messages])
+        for message in back.messages:
+            self.assertIs(message.thread_side, self.thread_side)
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for Command.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+from concurrent.futures import Future
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from qgis_plutil.thread_support.cancel import CancelToken
+from qgis_plutil.thread_support.command import Command
+
+logger = logging.getLogger('tests.plutil.thread_support.command')
+
+
+class TestCommand(TestCase):
+    def test_init(self):
+        fn = MagicMock()
+        testee = Command(fn, (1, 2), {'a': 3})
+        self.assertEqual(testee.fn, fn)
+        self.assertEqual(testee.args, (1, 2))
+        self.assertEqual(testee.kwargs, {'a': 3})
+        self.assertIsInstance(testee.future, Future)
+
+        future = Future()
+        testee = Command(fn, future=future)
+        self.assertIs(testee.future, future)
+        self.assertEqual(testee.kwargs, {})
+
+    def test_run(self):
+        fn = MagicMock(return_value=5)
+        testee = Command(fn, (1, 2), {'a': 3})
+        self.assertEqual(testee.run(), (True, 5, None))
+        fn.assert_called_once_with(1, 2, a=3)
+        self.assertTrue(testee.future.running())
+
+    def test_run_exception(self):
+        exc = RuntimeError("boom")
+        testee = Command(MagicMock(side_effect=exc))
+        self.assertEqual(testee.run(), (True, None, exc))
+
+    def test_run_cancelled(self):
+        fn = MagicMock()
+        testee = Command(fn)
+        testee.future.cancel()
+        self.assertEqual(testee.run(), (False, None, None))
+        fn.assert_not_called()
+
+    def test_run_token_cancelled(self):
+        fn = MagicMock()
+        token = CancelToken()
+        testee = Command(fn, token=token)
+        self.assertIs(testee.token, token)
+        token.cancel()
+        self.assertEqual(testee.run(), (False, None, None))
+        self.assertTrue(testee.future.cancelled())
+        fn.assert_not_called()
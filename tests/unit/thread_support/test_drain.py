@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for DrainPolicy and DrainStats.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+from unittest import TestCase
+
+from qgis_plutil.thread_support.drain import DrainPolicy, DrainStats
+
+logger = logging.getLogger('tests.plutil.thread_support.drain')
+
+
+class TestDrainPolicy(TestCase):
+    def test_init(self):
+        testee = DrainPolicy()
+        self.assertEqual(testee.budget, 0.008)
+        self.assertIsNone(testee.max_messages)
+
+    def test_budget(self):
+        testee = DrainPolicy(budget=0.01)
+        self.assertFalse(testee.exhausted(1.0, 1.005, 1000))
+        self.assertTrue(testee.exhausted(1.0, 1.01, 0))
+
+    def test_max_messages(self):
+        testee = DrainPolicy(budget=None, max_messages=5)
+        self.assertFalse(testee.exhausted(1.0, 100.0, 4))
+        self.assertTrue(testee.exhausted(1.0, 1.0, 5))
+
+    def test_unlimited(self):
+        testee = DrainPolicy(budget=None)
+        self.assertFalse(testee.exhausted(1.0, 100.0, 10 ** 9))
+
+
+class TestDrainStats(TestCase):
+    def setUp(self):
+        self.testee = DrainStats(smoothing=0.5)
+
+    def tearDown(self):
+        self.testee = None
+
+    def test_empty_turn(self):
+        self.testee.record(0, 0.001, 3)
+        self.assertEqual(self.testee.turns, 0)
+        self.assertEqual(self.testee.backlog, 3)
+        self.assertEqual(self.testee.rate, 0.0)
+
+    def test_record(self):
+        self.testee.record(10, 0.01, 5)
+        self.assertEqual(self.testee.turns, 1)
+        self.assertEqual(self.testee.messages, 10)
+        self.assertAlmostEqual(self.testee.rate, 1000.0)
+        self.testee.record(30, 0.01, 0)
+        self.assertEqual(self.testee.turns, 2)
+        self.assertEqual(self.testee.messages, 40)
+        self.assertEqual(self.testee.last_count, 30)
+        self.assertEqual(self.testee.backlog, 0)
+        self.assertAlmostEqual(self.testee.rate, 2000.0)
+
+        result = self.testee.as_dict()
+        self.assertEqual(result['messages'], 40)
+        self.assertAlmostEqual(result['busy_time'], 0.02)
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for GoodbyeMessage.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from qgis_plutil.constants import DONT_ADD_TO_QUEUE
+from qgis_plutil.thread_support.messages.base import TsMessage
+from qgis_plutil.thread_support.messages.goodbye import GoodbyeMessage
+
+logger = logging.getLogger('tests.plutil.thread_support.goodbye')
+
+
+class TestGoodbyeMessage(TestCase):
+    def setUp(self):
+        self.plugin = MagicMock()
+        self.thread_side = MagicMock()
+        self.testee = GoodbyeMessage(self.plugin, self.thread_side)
+
+    def tearDown(self):
+        self.testee = None
+
+    def test_init(self):
+        self.assertEqual(self.testee.priority, TsMessage.PRIORITY_CONTROL)
+        self.assertIsNotNone(str(self.testee))
+        self.assertIsNotNone(repr(self.testee))
+
+    def test_on_gui_side(self):
+        self.assertEqual(self.testee.on_gui_side(), DONT_ADD_TO_QUEUE)
+        self.assertEqual(self.thread_side.state,
+                         self.thread_side.STATE_DISCONNECTED)
+        self.thread_side.gui_side.retire.assert_called_once_with(
+            self.thread_side)
+
+    def test_untied(self):
+        self.thread_side.gui_side = None
+        self.testee.on_gui_side()
@@ -5,24 +5,41 @@ Unit tests for GuiSide.
 from __future__ import unicode_literals
 from __future__ import print_function
 
+import json
 import logging
 import os
 import shutil
 import tempfile
 import threading
 from queue import Queue
+from time import perf_counter
 from unittest import TestCase, SkipTest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
-from PyQt5.QtCore import QBasicTimer
+from PyQt5.QtCore import QBasicTimer, QCoreApplication
 
-from qgis_plutil.thread_support.gui_side import GuiSide
+from qgis_plutil.thread_support.cancel import CancelToken
+from qgis_plutil.thread_support.drain import DrainPolicy, DrainStats
+from qgis_plutil.thread_support.gui_side import GuiSide, WAKEUP_EVENT_TYPE
+from qgis_plutil.thread_support.lanes import LaneQueue
 from qgis_plutil.thread_support.messages.base import TsMessage
+from qgis_plutil.thread_support.messages.batch import BatchMessage
+from qgis_plutil.thread_support.messages.call import CallMessage
+from qgis_plutil.thread_support.messages.coalescing import CoalescingMessage
 from qgis_plutil.thread_support.messages.hello import HelloMessage
+from qgis_plutil.thread_support.tasks import GuiTask
+from qgis_plutil.thread_support.scheduling import WeightedFairScheduler
+from qgis_plutil.thread_support.thread_side import ThreadSide
 
 logger = logging.getLogger('tests.plutil.thread_support.gui_side')
 
 
+def make_message():
+    """ A stand-in for a message in the normal lane. """
+    return MagicMock(spec=TsMessage, priority=TsMessage.PRIORITY_NORMAL,
+                     enqueued=None, token=None, deadline=None)
+
+
 class TestGuiSide(TestCase):
     def setUp(self):
         self.testee = GuiSide()
@@ -31,6 +48,8 @@ class TestGuiSide(TestCase):
         self.thread_side.sig = MagicMock(spec=threading.Event)
         self.testee.side_workers.append(self.thread_side)
         self.thread_side.queue = Queue()
+        # The tests that are about the budget set their own policy.
+        self.testee.drain_policy = DrainPolicy(budget=None)
 
     def tearDown(self):
         self.testee = None
@@ -38,6 +57,145 @@ class TestGuiSide(TestCase):
     def test_init(self):
         self.assertIsInstance(self.testee.side_workers, list)
         self.assertIsInstance(self.testee.timer, QBasicTimer)
+        self.assertIsInstance(self.testee.drain_policy, DrainPolicy)
+        self.assertIsInstance(self.testee.drain_stats, DrainStats)
+
+    def test_tie_wakeup_mode(self):
+        thread_side = MagicMock()
+        thread_side.plugin.get.side_effect = lambda key, default: default
+        self.testee.tie(thread_side)
+        self.assertEqual(self.testee.wakeup_mode, GuiSide.WAKEUP_EVENT)
+        self.assertEqual(thread_side.gui_side, self.testee)
+        self.testee.timer.stop()
+
+        testee = GuiSide()
+        thread_side.plugin.get.side_effect = \
+            lambda key, default: 'timer' if key == 'thread/gui-wakeup' \
+            else default
+        testee.tie(thread_side)
+        self.assertEqual(testee.wakeup_mode, GuiSide.WAKEUP_TIMER)
+        testee.timer.stop()
+
+    def test_tie_queue_size(self):
+        settings = {'thread/queue-size': 50,
+                    'thread/queue-overflow': LaneQueue.OVERFLOW_DROP_OLDEST}
+        thread_side = MagicMock()
+        thread_side.queue = LaneQueue()
+        thread_side.plugin.get.side_effect = \
+            lambda key, default: settings.get(key, default)
+        self.testee.tie(thread_side)
+        thread_side.bound_queue.assert_called_once_with(
+            50, LaneQueue.OVERFLOW_DROP_OLDEST)
+
+        # A bound set by the thread side is kept.
+        thread_side = MagicMock()
+        thread_side.queue = LaneQueue(10)
+        thread_side.plugin.get.side_effect = \
+            lambda key, default: settings.get(key, default)
+        self.testee.tie(thread_side)
+        thread_side.bound_queue.assert_not_called()
+        self.testee.timer.stop()
+
+    def test_untie(self):
+        # The timer needs an application.
+        app = QCoreApplication.instance() or QCoreApplication([])
+        self.testee.side_workers = []
+        thread_side = ThreadSide(self.plugin)
+        self.plugin.get.side_effect = lambda key, default: default
+        self.testee.tie(thread_side)
+        other = ThreadSide(self.plugin)
+        self.testee.tie(other)
+        self.assertTrue(self.testee.timer.isActive())
+        self.testee.notify(thread_side)
+        self.testee.scheduler.charge(thread_side, 1, 0.1)
+
+        self.assertTrue(self.testee.untie(thread_side))
+        self.assertFalse(self.testee.untie(thread_side))
+        self.assertEqual(self.testee.side_workers, [other])
+        self.assertNotIn(thread_side, self.testee.ready)
+        self.assertIsNone(thread_side.gui_side)
+        self.assertIsNone(thread_side.token.parent)
+        self.assertEqual(self.testee.token.callbacks,
+                         [other.token.propagate])
+        self.assertNotIn(thread_side, self.testee.scheduler.usage)
+        self.assertTrue(self.testee.timer.isActive())
+
+        # The last one stops the timer.
+        self.testee.untie(other)
+        self.assertFalse(self.testee.timer.isActive())
+        self.assertEqual(self.testee.state, self.testee.STATE_DISCONNECTED)
+
+    def test_retire(self):
+        self.testee.wake_up = MagicMock()
+        self.testee.state = self.testee.STATE_CONNECTED
+        self.testee.side_workers = []
+        thread_side = ThreadSide(self.plugin)
+        self.plugin.get.side_effect = lambda key, default: default
+        self.testee.tie(thread_side)
+        self.testee.state = self.testee.STATE_CONNECTED
+        handled = []
+
+        class Message(TsMessage):
+            def on_gui_side(self):
+                handled.append(self)
+
+        messages = [Message(self.plugin, thread_side) for i in range(3)]
+        for message in messages:
+            thread_side.send_to_gui(message)
+        thread_side.thread_side_finished()
+
+        # The goodbye goes first but the side is only untied once
+        # the other messages are handled.
+        self.testee.drain_policy = DrainPolicy(budget=None, max_messages=2)
+        self.testee.receiver()
+        self.assertEqual(self.testee.retiring, [thread_side])
+        self.assertIn(thread_side, self.testee.side_workers)
+        self.testee.receiver()
+        self.assertEqual(handled, messages)
+        self.assertEqual(self.testee.side_workers, [])
+        self.assertEqual(self.testee.retiring, [])
+        self.assertFalse(self.testee.timer.isActive())
+
+    def test_prune_finished(self):
+        self.testee.side_workers = []
+        thread_side = ThreadSide(self.plugin)
+        thread_side.has_finished = MagicMock(return_value=False)
+        self.plugin.get.side_effect = lambda key, default: default
+        self.testee.tie(thread_side)
+        self.testee.prune_finished()
+        self.assertEqual(self.testee.side_workers, [thread_side])
+        thread_side.has_finished.return_value = True
+        self.testee.timerEvent(None)
+        self.assertEqual(self.testee.side_workers, [])
+
+    def test_notify(self):
+        self.testee.wake_up = MagicMock()
+        self.testee.wakeup_mode = GuiSide.WAKEUP_TIMER
+        self.testee.notify(self.thread_side)
+        self.testee.wake_up.assert_not_called()
+        self.testee.wakeup_mode = GuiSide.WAKEUP_EVENT
+        self.testee.notify(self.thread_side)
+        self.testee.wake_up.assert_called_once()
+
+    def test_wake_up(self):
+        with patch('qgis_plutil.thread_support.gui_side.'
+                   'QCoreApplication') as QCoreApplication:
+            self.testee.wake_up()
+            self.testee.wake_up()
+            self.assertTrue(self.testee.wakeup_pending)
+            QCoreApplication.postEvent.assert_called_once()
+            args, kwargs = QCoreApplication.postEvent.call_args
+            self.assertEqual(args[0], self.testee)
+            self.assertEqual(args[1].type(), WAKEUP_EVENT_TYPE)
+
+    def test_custom_event(self):
+        self.testee.receiver = MagicMock()
+        self.testee.wakeup_pending = True
+        event = MagicMock()
+        event.type.return_value = WAKEUP_EVENT_TYPE
+        self.testee.customEvent(event)
+        self.assertFalse(self.testee.wakeup_pending)
+        self.testee.receiver.assert_called_once()
 
     def test_message_accepted(self):
         message = MagicMock()
@@ -46,25 +204,26 @@ class TestGuiSide(TestCase):
 
     def test_receiver(self):
         self.testee.message_accepted = MagicMock()
-        self.thread_side.sig.is_set.return_value=False
         self.testee.receiver()
         self.thread_side.sig.clear.assert_not_called()
 
-        self.thread_side.sig.is_set.return_value = True
+        self.testee.notify(self.thread_side)
         self.testee.receiver()
         self.thread_side.sig.clear.assert_called_once()
 
-        message = MagicMock(spec=TsMessage)
+        message = make_message()
         message.plugin = self.plugin
         message.thread_side = self.thread_side
         self.thread_side.queue.put(message)
 
+        self.testee.notify(self.thread_side)
         self.testee.state = self.testee.STATE_DISCONNECTED
         with self.assertRaises(AssertionError):
             self.testee.receiver()
 
         message = HelloMessage(self.plugin, self.thread_side)
         self.thread_side.queue.put(message)
+        self.testee.notify(self.thread_side)
         self.testee.state = self.testee.STATE_CONNECTING
         logger.debug("is --------------- STATE_CONNECTING")
         self.testee.receiver()
@@ -74,9 +233,9 @@ class TestGuiSide(TestCase):
 
     def test_receiver_unknown_state(self):
         self.testee.state = 99999
-        self.thread_side.sig.is_set.return_value = True
+        self.testee.notify(self.thread_side)
 
-        message = MagicMock(spec=TsMessage)
+        message = make_message()
         message.plugin = self.plugin
         message.thread_side = self.thread_side
         self.thread_side.queue.put(message)
@@ -87,9 +246,9 @@ class TestGuiSide(TestCase):
     def test_receiver_connected(self):
         self.testee.message_accepted = MagicMock()
         self.testee.state = self.testee.STATE_CONNECTED
-        self.thread_side.sig.is_set.return_value = True
+        self.testee.notify(self.thread_side)
 
-        message = MagicMock(spec=TsMessage)
+        message = make_message()
         message.plugin = self.plugin
         message.thread_side = self.thread_side
         self.thread_side.queue.put(message)
@@ -99,9 +258,9 @@ class TestGuiSide(TestCase):
 
     def test_receiver_bad_message(self):
         self.testee.message_accepted = MagicMock()
-        self.thread_side.sig.is_set.return_value = True
+        self.testee.notify(self.thread_side)
 
-        message = MagicMock(spec=TsMessage)
+        message = make_message()
         message.plugin = self.plugin
         message.thread_side = self.thread_side
         self.thread_side.queue.put(message)
@@ -110,3 +269,494 @@ class TestGuiSide(TestCase):
         self.testee.state = self.testee.STATE_CONNECTING
         with self.assertRaises(AssertionError):
             self.testee.receiver()
+
+    def test_receiver_drains_everything(self):
+        self.testee.message_accepted = MagicMock()
+        self.testee.wake_up = MagicMock()
+        self.testee.drain_policy = DrainPolicy(budget=None)
+        self.testee.state = self.testee.STATE_CONNECTED
+        self.testee.notify(self.thread_side)
+        for i in range(100):
+            self.thread_side.queue.put(make_message())
+
+        self.testee.receiver()
+        self.assertEqual(self.testee.message_accepted.call_count, 100)
+        self.assertEqual(self.testee.drain_stats.messages, 100)
+        self.assertEqual(self.testee.drain_stats.backlog, 0)
+        self.testee.wake_up.assert_not_called()
+
+    def test_receiver_reschedules_backlog(self):
+        self.testee.message_accepted = MagicMock()
+        self.testee.wake_up = MagicMock()
+        self.testee.drain_policy = DrainPolicy(budget=None, max_messages=30)
+        self.testee.state = self.testee.STATE_CONNECTED
+        self.testee.notify(self.thread_side)
+        for i in range(100):
+            self.thread_side.queue.put(make_message())
+
+        self.testee.receiver()
+        self.assertEqual(self.testee.message_accepted.call_count, 30)
+        self.assertEqual(self.testee.drain_stats.backlog, 70)
+        self.thread_side.sig.set.assert_called_once()
+        self.assertIn(self.thread_side, self.testee.ready)
+        self.testee.wake_up.assert_called_once()
+
+        for i in range(3):
+            self.testee.receiver()
+        self.assertEqual(self.testee.message_accepted.call_count, 100)
+        self.assertEqual(self.testee.drain_stats.backlog, 0)
+        self.assertEqual(self.testee.wake_up.call_count, 3)
+
+    def test_notify_ready_set(self):
+        self.testee.notify(self.thread_side)
+        self.testee.notify(self.thread_side)
+        self.assertEqual(list(self.testee.ready), [self.thread_side])
+
+    def test_collect_ready(self):
+        self.thread_side.sig.is_set.return_value = False
+        self.testee.collect_ready()
+        self.assertEqual(len(self.testee.ready), 0)
+        self.thread_side.sig.is_set.return_value = True
+        self.testee.collect_ready()
+        self.assertEqual(list(self.testee.ready), [self.thread_side])
+
+    def test_receiver_visits_ready_only(self):
+        self.testee.message_accepted = MagicMock()
+        self.testee.state = self.testee.STATE_CONNECTED
+        idle = []
+        for i in range(200):
+            thread_side = MagicMock()
+            thread_side.queue = MagicMock()
+            self.testee.side_workers.append(thread_side)
+            idle.append(thread_side)
+        self.thread_side.queue.put(make_message())
+        self.testee.notify(self.thread_side)
+
+        self.testee.receiver()
+        self.testee.message_accepted.assert_called_once()
+        for thread_side in idle:
+            thread_side.queue.get.assert_not_called()
+            thread_side.sig.clear.assert_not_called()
+
+    def test_requeue_ready(self):
+        other = MagicMock()
+        newcomer = MagicMock()
+        self.testee.notify(newcomer)
+        self.testee.requeue_ready([self.thread_side, other])
+        self.assertEqual(list(self.testee.ready),
+                         [self.thread_side, other, newcomer])
+        self.thread_side.sig.set.assert_called_once()
+
+    def test_receiver_urgent_lanes_first(self):
+        self.testee.message_accepted = MagicMock()
+        self.testee.wake_up = MagicMock()
+        self.testee.drain_policy = DrainPolicy(budget=None, max_messages=5)
+        self.testee.state = self.testee.STATE_CONNECTED
+        self.thread_side.queue = LaneQueue()
+        other = MagicMock()
+        other.sig = MagicMock(spec=threading.Event)
+        other.queue = LaneQueue()
+        self.testee.side_workers.append(other)
+        for i in range(10):
+            self.thread_side.queue.put(
+                MagicMock(spec=TsMessage, priority=TsMessage.PRIORITY_BULK,
+                          enqueued=None, token=None, deadline=None))
+        urgent = MagicMock(spec=TsMessage,
+                           priority=TsMessage.PRIORITY_INTERACTIVE,
+                           enqueued=None, token=None, deadline=None)
+        other.queue.put(urgent)
+        self.testee.notify(self.thread_side)
+        self.testee.notify(other)
+
+        self.testee.receiver()
+        self.assertIs(
+            self.testee.message_accepted.call_args_list[0][0][0], urgent)
+        self.assertEqual(self.testee.message_accepted.call_count, 5)
+        self.assertEqual(list(self.testee.ready), [self.thread_side])
+
+    def make_side(self, count):
+        thread_side = MagicMock()
+        thread_side.sig = MagicMock(spec=threading.Event)
+        thread_side.queue = Queue()
+        thread_side.queue_stats = lambda: {
+            'size': thread_side.queue.qsize()}
+        for i in range(count):
+            thread_side.queue.put(make_message())
+        self.testee.side_workers.append(thread_side)
+        return thread_side
+
+    def test_receiver_fair_share(self):
+        self.testee.message_accepted = MagicMock()
+        self.testee.wake_up = MagicMock()
+        self.testee.drain_policy = DrainPolicy(budget=None, max_messages=20)
+        self.testee.state = self.testee.STATE_CONNECTED
+        self.testee.side_workers = []
+        bulk = self.make_side(1000)
+        interactive = self.make_side(6)
+        self.testee.notify(bulk)
+        self.testee.notify(interactive)
+
+        # The second side gets all it needs, the first one the rest.
+        self.testee.receiver()
+        self.assertEqual(interactive.queue.qsize(), 0)
+        self.assertEqual(bulk.queue.qsize(), 1000 - 14)
+        self.assertEqual(list(self.testee.ready), [bulk])
+
+        stats = self.testee.stats()
+        queues = dict((id(thread_side), entry) for thread_side, entry in
+                      zip(self.testee.side_workers, stats['queues']))
+        self.assertEqual(queues[id(bulk)]['messages'], 14)
+        self.assertEqual(queues[id(interactive)]['messages'], 6)
+        self.assertEqual(queues[id(bulk)]['visits'], 2)
+        self.assertAlmostEqual(
+            sum(entry['time_share'] for entry in stats['queues']), 1.0)
+
+    def test_receiver_rotates_start(self):
+        self.testee.message_accepted = MagicMock()
+        self.testee.wake_up = MagicMock()
+        self.testee.drain_policy = DrainPolicy(budget=None, max_messages=1)
+        self.testee.state = self.testee.STATE_CONNECTED
+        self.testee.side_workers = []
+        first = self.make_side(5)
+        second = self.make_side(5)
+        self.testee.notify(first)
+        self.testee.notify(second)
+        for i in range(4):
+            self.testee.receiver()
+        self.assertEqual(first.queue.qsize(), 3)
+        self.assertEqual(second.queue.qsize(), 3)
+
+    def test_receiver_weighted(self):
+        self.testee.message_accepted = MagicMock()
+        self.testee.wake_up = MagicMock()
+        self.testee.drain_policy = DrainPolicy(budget=None, max_messages=20)
+        self.testee.state = self.testee.STATE_CONNECTED
+        self.testee.side_workers = []
+        heavy = self.make_side(100)
+        light = self.make_side(100)
+        self.testee.scheduler = WeightedFairScheduler(weights={heavy: 3})
+        self.testee.notify(heavy)
+        self.testee.notify(light)
+        self.testee.receiver()
+        self.assertEqual(heavy.queue.qsize(), 100 - 15)
+        self.assertEqual(light.queue.qsize(), 100 - 5)
+        self.assertEqual(self.testee.stats()['queues'][0]['weight'], 3)
+
+    def test_receiver_coalescing(self):
+        self.testee.message_accepted = MagicMock()
+        self.testee.state = self.testee.STATE_CONNECTED
+        first = CoalescingMessage(self.plugin, self.thread_side, 'a')
+        latest = CoalescingMessage(self.plugin, self.thread_side, 'a')
+        self.thread_side.take_coalesced.return_value = latest
+        self.thread_side.queue.put(first)
+        self.testee.notify(self.thread_side)
+
+        self.testee.receiver()
+        self.thread_side.take_coalesced.assert_called_once_with('a')
+        self.testee.message_accepted.assert_called_once_with(latest)
+
+    def test_receiver_unpacks_batch(self):
+        self.testee.message_accepted = MagicMock()
+        self.testee.state = self.testee.STATE_CONNECTING
+        hello = HelloMessage(self.plugin, self.thread_side)
+        messages = [make_message() for i in range(4)]
+        self.thread_side.queue.put(BatchMessage(
+            self.plugin, self.thread_side, [hello] + messages))
+        self.testee.notify(self.thread_side)
+
+        self.testee.receiver()
+        self.assertEqual(self.testee.state, self.testee.STATE_CONNECTED)
+        self.assertEqual(
+            [args[0] for args, kwargs in
+             self.testee.message_accepted.call_args_list],
+            [hello] + messages)
+        self.assertEqual(self.testee.drain_stats.messages, 5)
+
+    def test_stats(self):
+        self.testee.sample_every = 1
+        self.testee.state = self.testee.STATE_CONNECTED
+        thread_side = ThreadSide(self.plugin)
+        thread_side.name = 'worker'
+        thread_side.gui_side = self.testee
+        self.testee.side_workers = [thread_side]
+        thread_side.send_to_gui(TsMessage(self.plugin, thread_side))
+        thread_side.send_batch([TsMessage(self.plugin, thread_side)
+                                for i in range(3)])
+        thread_side.send_to_gui(TsMessage(self.plugin, thread_side))
+        self.testee.receiver()
+
+        stats = self.testee.stats()
+        self.assertEqual(stats['drain']['messages'], 5)
+        self.assertEqual(stats['queue_depth'], 0)
+        self.assertEqual(stats['queues'][0]['name'], 'worker')
+        self.assertEqual(stats['queues'][0]['high_water'], 3)
+        timings = stats['messages']['TsMessage']
+        for key in ('wait', 'handler', 'total'):
+            self.assertEqual(timings[key]['count'], 5)
+            self.assertGreaterEqual(timings[key]['p99'],
+                                    timings[key]['p50'])
+        json.dumps(stats)
+
+    def test_stats_sampling(self):
+        self.testee.message_accepted = MagicMock()
+        self.testee.state = self.testee.STATE_CONNECTED
+        self.testee.drain_policy = DrainPolicy(budget=None)
+        self.testee.sample_every = 4
+        for i in range(10):
+            self.thread_side.queue.put(
+                TsMessage(self.plugin, self.thread_side))
+        self.testee.notify(self.thread_side)
+        self.testee.receiver()
+        self.assertEqual(
+            self.testee.message_stats.types['TsMessage'][1].count, 3)
+
+        self.testee.message_stats.reset()
+        self.testee.sample_every = 0
+        self.thread_side.queue.put(TsMessage(self.plugin, self.thread_side))
+        self.testee.notify(self.thread_side)
+        self.testee.receiver()
+        self.assertEqual(self.testee.message_stats.types, {})
+
+    def test_cancel(self):
+        self.testee.state = self.testee.STATE_CONNECTED
+        thread_side = ThreadSide(self.plugin)
+        thread_side.gui_side = self.testee
+        thread_side.token.link(self.testee.token)
+        self.testee.side_workers = [thread_side]
+        handled = []
+
+        class Message(TsMessage):
+            def on_gui_side(self):
+                handled.append(self)
+
+        class Control(Message):
+            default_priority = TsMessage.PRIORITY_CONTROL
+
+        old = Message(self.plugin, thread_side)
+        control = Control(self.plugin, thread_side)
+        call = CallMessage(self.plugin, thread_side, MagicMock())
+        thread_side.send_to_gui(old)
+        thread_side.send_to_gui(control)
+        thread_side.send_to_gui(call)
+        token = thread_side.token
+
+        self.testee.cancel(thread_side, 'no longer needed')
+        self.assertTrue(token.cancelled)
+        self.assertEqual(token.reason, 'no longer needed')
+        self.assertIsNot(thread_side.token, token)
+        self.assertFalse(thread_side.cancelled)
+        self.assertIs(thread_side.token.parent, self.testee.token)
+
+        new = Message(self.plugin, thread_side)
+        thread_side.send_to_gui(new)
+        self.testee.receiver()
+        self.assertEqual(handled, [control, new])
+        self.assertTrue(call.future.cancelled())
+        self.assertEqual(self.testee.cancelled_messages, 2)
+        self.assertEqual(self.testee.stats()['cancelled_messages'], 2)
+
+        # All thread sides at once.
+        token = thread_side.token
+        self.testee.cancel()
+        self.assertTrue(token.cancelled)
+
+    def test_submit_tokens(self):
+        thread_side = ThreadSide(self.plugin)
+        self.testee.side_workers.append(thread_side)
+        first = self.testee.submit(thread_side, MagicMock())
+        second = self.testee.submit(thread_side, MagicMock())
+        commands = [thread_side.commands.get_nowait() for i in range(2)]
+        for command in commands:
+            self.assertIs(command.token.parent, thread_side.token)
+
+        second.cancel()
+        self.assertTrue(commands[1].token.cancelled)
+        self.assertFalse(commands[0].token.cancelled)
+        self.testee.cancel(thread_side)
+        self.assertTrue(commands[0].token.cancelled)
+        self.assertFalse(first.cancelled())
+
+    def test_cancel_batch(self):
+        self.testee.state = self.testee.STATE_CONNECTED
+        handled = []
+
+        class Message(TsMessage):
+            def on_gui_side(self):
+                handled.append(self)
+
+        class Control(Message):
+            default_priority = TsMessage.PRIORITY_CONTROL
+
+        control = Control(self.plugin, self.thread_side)
+        data = [Message(self.plugin, self.thread_side) for i in range(3)]
+        batch = BatchMessage(
+            self.plugin, self.thread_side, [control] + data)
+        self.assertEqual(batch.priority, TsMessage.PRIORITY_INTERACTIVE)
+        batch.token = CancelToken()
+        batch.token.cancel()
+        self.assertEqual(self.testee.dispatch(self.thread_side, batch), 4)
+        self.assertEqual(handled, [control])
+        self.assertEqual(self.testee.cancelled_messages, 3)
+
+    def test_expired(self):
+        self.testee.state = self.testee.STATE_CONNECTED
+        handled = []
+        expired = []
+
+        class Message(TsMessage):
+            def on_gui_side(self):
+                handled.append(self)
+
+            def on_expired(self):
+                expired.append(self)
+
+        late = Message(self.plugin, self.thread_side).expire_after(-1)
+        fresh = Message(self.plugin, self.thread_side).expire_after(100)
+        plain = Message(self.plugin, self.thread_side)
+        for message in (late, fresh, plain):
+            self.thread_side.queue.put(message)
+        self.testee.notify(self.thread_side)
+        self.testee.receiver()
+        self.assertEqual(handled, [fresh, plain])
+        self.assertEqual(expired, [late])
+        self.assertEqual(self.testee.stats()['expired_messages'], 1)
+
+        # In a batch each message has its own deadline...
+        batch = BatchMessage(self.plugin, self.thread_side, [
+            Message(self.plugin, self.thread_side).expire_after(-1),
+            plain])
+        self.assertEqual(self.testee.dispatch(self.thread_side, batch), 2)
+        self.assertEqual(handled, [fresh, plain, plain])
+        # ...and the deadline of the envelope applies to all of them.
+        batch.expire_after(-1)
+        self.testee.dispatch(self.thread_side, batch)
+        self.assertEqual(len(handled), 3)
+        self.assertEqual(self.testee.expired_messages, 4)
+
+    def test_resumable_handler(self):
+        self.testee.state = self.testee.STATE_CONNECTED
+        self.testee.wake_up = MagicMock()
+        self.testee.message_handled = MagicMock()
+        log = []
+
+        class Slow(TsMessage):
+            def on_gui_side(self):
+                for i in range(3):
+                    log.append(i)
+                    yield
+                return 'applied'
+
+        class Quick(TsMessage):
+            def on_gui_side(self):
+                log.append('quick')
+                return 'quick'
+
+        slow = Slow(self.plugin, self.thread_side)
+        slow.token = None
+        self.thread_side.queue.put(slow)
+        self.testee.notify(self.thread_side)
+        self.testee.receiver()
+        self.assertEqual(len(self.testee.tasks), 1)
+        self.assertEqual(log, [])
+        self.testee.message_handled.assert_not_called()
+        self.testee.wake_up.assert_called_once()
+
+        # Without a budget the handler is resumed once per turn,
+        # before the other messages.
+        quick = Quick(self.plugin, self.thread_side)
+        self.thread_side.queue.put(quick)
+        self.testee.notify(self.thread_side)
+        self.testee.receiver()
+        self.assertEqual(log, [0, 'quick'])
+        self.testee.message_handled.assert_called_once_with(quick, 'quick')
+
+        self.testee.receiver()
+        self.testee.receiver()
+        self.assertEqual(log, [0, 'quick', 1, 2])
+        self.assertEqual(len(self.testee.tasks), 1)
+        self.testee.receiver()
+        self.assertEqual(len(self.testee.tasks), 0)
+        self.testee.message_handled.assert_called_with(slow, 'applied')
+
+    def test_resumable_handler_dropped(self):
+        self.testee.state = self.testee.STATE_CONNECTED
+        # An old style implementation that does not return the value.
+        self.testee.message_accepted = lambda message: None
+
+        class Slow(TsMessage):
+            def on_gui_side(self):
+                yield
+
+        message = Slow(self.plugin, self.thread_side)
+        message.token = None
+        with self.assertLogs('plutil.gui-side', logging.WARNING):
+            self.testee.dispatch(self.thread_side, message)
+        self.assertEqual(len(self.testee.tasks), 0)
+        self.assertIn(Slow, self.testee.dropped_handlers)
+
+    def test_run_tasks_deadline(self):
+        calls = []
+
+        def handler(name):
+            while True:
+                calls.append(name)
+                yield
+
+        for name in ('a', 'b'):
+            message = TsMessage(self.plugin, self.thread_side)
+            self.testee.tasks.append(GuiTask(
+                self.thread_side, message, handler(name)))
+        self.testee.run_tasks(perf_counter() + 0.01)
+        self.assertGreater(len(calls), 2)
+        # Round robin.
+        self.assertEqual(calls[:4], ['a', 'b', 'a', 'b'])
+        self.assertEqual(len(self.testee.tasks), 2)
+
+        self.testee.run_tasks(perf_counter() - 1)
+        count = len(calls)
+        self.testee.run_tasks(perf_counter() - 1)
+        self.assertEqual(len(calls), count)
+
+    def test_run_tasks_cancelled(self):
+        def handler():
+            while True:
+                yield
+
+        message = make_message()
+        message.token = CancelToken()
+        task = GuiTask(self.thread_side, message, handler())
+        self.testee.tasks.append(task)
+        # Without a deadline each handler makes a single step.
+        self.testee.run_tasks(None)
+        self.assertEqual(task.steps, 1)
+        self.assertEqual(len(self.testee.tasks), 1)
+
+        message.token.cancel()
+        self.testee.run_tasks(None)
+        self.assertEqual(len(self.testee.tasks), 0)
+        self.assertTrue(task.done)
+        message.on_cancelled.assert_called_once()
+        self.assertEqual(self.testee.cancelled_messages, 1)
+
+    def test_submit(self):
+        self.thread_side.commands = Queue()
+        fn = MagicMock()
+        future = self.testee.submit(self.thread_side, fn, 1, b=2)
+        command = self.thread_side.commands.get(block=False)
+        self.assertIs(command.future, future)
+        self.assertEqual(command.fn, fn)
+        self.assertEqual(command.args, (1,))
+        self.assertEqual(command.kwargs, {'b': 2})
+
+        with self.assertRaises(ValueError):
+            self.testee.submit(MagicMock(), fn)
+
+    def test_tie_keeps_connected_state(self):
+        thread_side = MagicMock()
+        thread_side.plugin.get.side_effect = lambda key, default: default
+        self.testee.tie(thread_side)
+        self.assertEqual(self.testee.state, self.testee.STATE_CONNECTING)
+        self.testee.state = self.testee.STATE_CONNECTED
+        self.testee.tie(MagicMock())
+        self.assertEqual(self.testee.state, self.testee.STATE_CONNECTED)
+        self.testee.timer.stop()
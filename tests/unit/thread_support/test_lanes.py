@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for LaneQueue.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import threading
+from queue import Empty, Full
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from qgis_plutil.thread_support.lanes import LaneQueue
+from qgis_plutil.thread_support.messages.base import TsMessage
+
+logger = logging.getLogger('tests.plutil.thread_support.lanes')
+
+
+def make_message(priority):
+    return MagicMock(spec=TsMessage, priority=priority)
+
+
+class TestLaneQueue(TestCase):
+    def setUp(self):
+        self.testee = LaneQueue(starvation_limit=3)
+
+    def tearDown(self):
+        self.testee = None
+
+    def test_init(self):
+        self.assertEqual(self.testee.qsize(), 0)
+        self.assertTrue(self.testee.empty())
+        self.assertEqual(self.testee.lane_sizes(), [0, 0, 0, 0])
+        self.assertIsNotNone(str(self.testee))
+        self.assertIsNotNone(repr(self.testee))
+
+    def test_fifo_in_lane(self):
+        messages = [make_message(TsMessage.PRIORITY_NORMAL)
+                    for i in range(5)]
+        for message in messages:
+            self.testee.put(message)
+        self.assertEqual(self.testee.qsize(), 5)
+        self.assertEqual([self.testee.get_nowait() for i in range(5)],
+                         messages)
+
+    def test_unknown_items(self):
+        self.testee.put(object())
+        self.testee.put(make_message(-5))
+        self.testee.put(make_message(99))
+        self.assertEqual(self.testee.lane_sizes(), [1, 0, 1, 1])
+
+    def test_urgent_first(self):
+        bulk = [make_message(TsMessage.PRIORITY_BULK) for i in range(10)]
+        for message in bulk:
+            self.testee.put(message)
+        interactive = make_message(TsMessage.PRIORITY_INTERACTIVE)
+        control = make_message(TsMessage.PRIORITY_CONTROL)
+        self.testee.put(interactive)
+        self.testee.put(control)
+        self.assertIs(self.testee.get_nowait(), control)
+        self.assertIs(self.testee.get_nowait(), interactive)
+        self.assertIs(self.testee.get_nowait(), bulk[0])
+
+    def test_anti_starvation(self):
+        normal = [make_message(TsMessage.PRIORITY_NORMAL)
+                  for i in range(8)]
+        bulk = [make_message(TsMessage.PRIORITY_BULK) for i in range(2)]
+        for message in bulk + normal:
+            self.testee.put(message)
+        got = [self.testee.get_nowait() for i in range(10)]
+        self.assertEqual(got, normal[0:3] + bulk[0:1] +
+                         normal[3:6] + bulk[1:2] + normal[6:8])
+        self.assertRaises(Empty, self.testee.get_nowait)
+
+    def test_get_urgent(self):
+        self.assertRaises(Empty, self.testee.get_urgent)
+        normal = make_message(TsMessage.PRIORITY_NORMAL)
+        interactive = make_message(TsMessage.PRIORITY_INTERACTIVE)
+        self.testee.put(normal)
+        self.testee.put(interactive)
+        self.assertIs(self.testee.get_urgent(), interactive)
+        self.assertRaises(Empty, self.testee.get_urgent)
+        self.assertEqual(self.testee.qsize(), 1)
+
+
+class TestBoundedLaneQueue(TestCase):
+    def fill(self, testee, count, priority=TsMessage.PRIORITY_NORMAL):
+        messages = [make_message(priority) for i in range(count)]
+        for message in messages:
+            self.assertIsNone(testee.put(message))
+        return messages
+
+    def test_bad_policy(self):
+        with self.assertRaises(ValueError):
+            LaneQueue(overflow='xxx')
+
+    def test_raise(self):
+        testee = LaneQueue(3, overflow=LaneQueue.OVERFLOW_RAISE)
+        self.fill(testee, 3)
+        with self.assertRaises(Full):
+            testee.put(make_message(TsMessage.PRIORITY_NORMAL))
+        self.assertEqual(testee.qsize(), 3)
+        self.assertEqual(testee.stats()['rejected'], 1)
+        self.assertEqual(testee.stats()['load'], 1.0)
+
+    def test_control_exempt(self):
+        testee = LaneQueue(3, overflow=LaneQueue.OVERFLOW_RAISE)
+        self.fill(testee, 3)
+        control = make_message(TsMessage.PRIORITY_CONTROL)
+        self.assertIsNone(testee.put(control))
+        self.assertEqual(testee.qsize(), 4)
+        self.assertEqual(testee.stats()['high_water'], 4)
+        self.assertIs(testee.get_nowait(), control)
+
+    def test_drop_newest(self):
+        testee = LaneQueue(3, overflow=LaneQueue.OVERFLOW_DROP_NEWEST)
+        messages = self.fill(testee, 3)
+        extra = make_message(TsMessage.PRIORITY_NORMAL)
+        self.assertIs(testee.put(extra), extra)
+        self.assertEqual(testee.stats()['dropped'], 1)
+        self.assertEqual([testee.get_nowait() for i in range(3)], messages)
+
+    def test_drop_oldest(self):
+        testee = LaneQueue(3, overflow=LaneQueue.OVERFLOW_DROP_OLDEST)
+        normal = self.fill(testee, 2)
+        bulk = self.fill(testee, 1, TsMessage.PRIORITY_BULK)
+
+        # The least urgent lane makes room first.
+        extra = make_message(TsMessage.PRIORITY_NORMAL)
+        self.assertIs(testee.put(extra), bulk[0])
+        extra2 = make_message(TsMessage.PRIORITY_NORMAL)
+        self.assertIs(testee.put(extra2), normal[0])
+        self.assertEqual(testee.qsize(), 3)
+        self.assertEqual(testee.unfinished_tasks, 3)
+
+        # A bulk message does not push out more urgent ones.
+        late = make_message(TsMessage.PRIORITY_BULK)
+        self.assertIs(testee.put(late), late)
+        self.assertEqual(testee.stats()['dropped'], 3)
+        self.assertEqual([testee.get_nowait() for i in range(3)],
+                         [normal[1], extra, extra2])
+
+    def test_block(self):
+        testee = LaneQueue(2, overflow=LaneQueue.OVERFLOW_BLOCK)
+        messages = self.fill(testee, 2)
+        extra = make_message(TsMessage.PRIORITY_NORMAL)
+        done = threading.Event()
+
+        def produce():
+            testee.put(extra)
+            done.set()
+
+        thread = threading.Thread(target=produce, daemon=True)
+        thread.start()
+        self.assertFalse(done.wait(0.05))
+        self.assertIs(testee.get_nowait(), messages[0])
+        self.assertTrue(done.wait(5))
+        thread.join(5)
+        stats = testee.stats()
+        self.assertEqual(stats['blocked'], 1)
+        self.assertGreater(stats['blocked_time'], 0.0)
+        self.assertEqual([testee.get_nowait() for i in range(2)],
+                         [messages[1], extra])
+
+    def test_block_timeout(self):
+        testee = LaneQueue(1, overflow=LaneQueue.OVERFLOW_BLOCK,
+                           block_timeout=0.01)
+        self.fill(testee, 1)
+        with self.assertRaises(Full):
+            testee.put(make_message(TsMessage.PRIORITY_NORMAL))
+        with self.assertRaises(Full):
+            testee.put_nowait(make_message(TsMessage.PRIORITY_NORMAL))
+        self.assertEqual(testee.stats()['rejected'], 2)
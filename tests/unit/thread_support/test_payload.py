@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for SharedPayload and PayloadMessage.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import array
+import gc
+import logging
+import pickle
+from unittest import TestCase, SkipTest
+from unittest.mock import MagicMock
+
+from qgis_plutil.thread_support.messages.payload import (
+    SharedPayload, PayloadMessage, shared_memory
+)
+
+logger = logging.getLogger('tests.plutil.thread_support.payload')
+
+
+def segment_exists(name):
+    try:
+        segment = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return False
+    segment.close()
+    return True
+
+
+class TestSharedPayload(TestCase):
+    def setUp(self):
+        if shared_memory is None:
+            raise SkipTest("Shared memory requires Python 3.8")
+
+    def test_allocate(self):
+        testee = SharedPayload.allocate(16, format='i')
+        self.assertEqual(len(testee), 16)
+        self.assertTrue(testee.owner)
+        view = testee.view()
+        self.assertEqual(len(view), 4)
+        view[2] = 7
+        self.assertEqual(testee.view()[2], 7)
+        view.release()
+        testee.release()
+        self.assertTrue(testee.released)
+        self.assertFalse(segment_exists(testee.name))
+
+    def test_from_buffer(self):
+        data = array.array('d', [1.5, 2.5, 3.5])
+        testee = SharedPayload.from_buffer(data)
+        self.assertEqual(testee.format, 'd')
+        self.assertIsNone(testee.shape)
+        self.assertEqual(testee.view().tolist(), [1.5, 2.5, 3.5])
+
+        testee = SharedPayload.from_buffer(b'abc')
+        self.assertEqual(bytes(testee.view()), b'abc')
+
+    def test_shape(self):
+        source = memoryview(bytearray(24)).cast('B', (4, 6))
+        testee = SharedPayload.from_buffer(source)
+        self.assertEqual(testee.shape, (4, 6))
+        self.assertEqual(testee.view().shape, (4, 6))
+
+    def test_released_by_gc(self):
+        testee = SharedPayload.from_buffer(b'x' * 100)
+        name = testee.name
+        self.assertTrue(segment_exists(name))
+        testee = None
+        gc.collect()
+        self.assertFalse(segment_exists(name))
+
+    def test_pickle_keeps_ownership(self):
+        testee = SharedPayload.from_buffer(b'0123456789')
+        back = pickle.loads(pickle.dumps(testee))
+        self.assertTrue(testee.owner)
+        self.assertFalse(back.owner)
+        self.assertEqual(bytes(back.view()), b'0123456789')
+
+        back.release()
+        self.assertTrue(segment_exists(testee.name))
+        testee.release()
+        self.assertFalse(segment_exists(testee.name))
+
+    def test_hand_over(self):
+        testee = SharedPayload.from_buffer(b'0123456789')
+        back = pickle.loads(pickle.dumps(testee))
+        testee.hand_over()
+        back.take_over()
+        self.assertFalse(testee.owner)
+        self.assertTrue(back.owner)
+        self.assertEqual(back.name, testee.name)
+
+        testee.release()
+        self.assertTrue(segment_exists(back.name))
+        back.release()
+        self.assertFalse(segment_exists(back.name))
+
+    def test_as_array(self):
+        try:
+            import numpy
+        except ImportError:
+            raise SkipTest("numpy is not installed")
+        testee = SharedPayload.from_buffer(numpy.arange(6.0).reshape(2, 3))
+        result = testee.as_array()
+        self.assertEqual(result.shape, (2, 3))
+        self.assertEqual(result[1, 2], 5.0)
+
+
+class TestPayloadMessage(TestCase):
+    def setUp(self):
+        if shared_memory is None:
+            raise SkipTest("Shared memory requires Python 3.8")
+        self.testee = PayloadMessage(MagicMock(), MagicMock())
+
+    def test_add_payload(self):
+        payload = self.testee.add_payload('raw', b'abc')
+        self.assertIsInstance(payload, SharedPayload)
+        self.assertIs(self.testee.payloads['raw'], payload)
+
+        other = SharedPayload.allocate(4)
+        self.assertIs(self.testee.add_payload('other', other), other)
+
+        self.testee.release()
+        self.assertTrue(payload.released)
+        self.assertTrue(other.released)
+
+    def test_released_with_message(self):
+        name = self.testee.add_payload('raw', b'abc').name
+        self.testee = None
+        gc.collect()
+        self.assertFalse(segment_exists(name))
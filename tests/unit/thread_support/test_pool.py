@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for WorkerPool.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+import threading
+from concurrent.futures import Future
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from qgis_plutil.thread_support.command import Command
+from qgis_plutil.thread_support.pool import WorkerPool, PoolWorker
+
+logger = logging.getLogger('tests.plutil.thread_support.pool')
+
+
+class TestWorkerPool(TestCase):
+    def setUp(self):
+        self.plugin = MagicMock()
+        self.gui_side = MagicMock()
+        self.futures = []
+
+        def submit(worker, fn, *args, **kwargs):
+            future = Future()
+            self.futures.append((worker, future))
+            return future
+        self.gui_side.submit.side_effect = submit
+        self.testee = WorkerPool(self.gui_side, self.plugin,
+                                 min_workers=1, max_workers=3,
+                                 idle_timeout=1000)
+
+    def tearDown(self):
+        self.testee.shutdown(timeout=5)
+        self.testee = None
+
+    def test_init(self):
+        self.assertEqual(len(self.testee), 0)
+        with self.assertRaises(ValueError):
+            WorkerPool(self.gui_side, self.plugin, 3, 2)
+        with self.assertRaises(ValueError):
+            WorkerPool(self.gui_side, self.plugin, 0, 0)
+
+    def test_start(self):
+        self.testee.start()
+        self.assertEqual(len(self.testee), 1)
+        worker = self.testee.workers[0]
+        self.assertIsInstance(worker, PoolWorker)
+        self.assertTrue(worker.is_alive())
+        self.gui_side.tie.assert_called_once_with(worker)
+
+    def test_least_loaded_and_scale_up(self):
+        self.testee.start()
+        for i in range(5):
+            self.testee.submit(MagicMock())
+        self.assertEqual(len(self.testee), 3)
+        self.assertEqual(sorted(w.pending for w in self.testee.workers),
+                         [1, 2, 2])
+
+        worker, future = self.futures[0]
+        future.set_result(None)
+        self.assertEqual(worker.pending, 1)
+        self.testee.submit(MagicMock())
+        self.assertEqual(len(self.testee), 3)
+        self.assertEqual(self.futures[-1][0], self.futures[0][0])
+
+    def test_retire(self):
+        self.testee.start()
+        self.testee.submit(MagicMock())
+        self.testee.submit(MagicMock())
+        first, second = self.testee.workers
+        self.assertFalse(self.testee.retire(second))
+
+        self.futures[1][1].set_result(None)
+        self.assertTrue(self.testee.retire(second))
+        self.assertEqual(self.testee.workers, [first])
+
+        self.futures[0][1].set_result(None)
+        self.assertFalse(self.testee.retire(first))
+
+    def test_replace_dead(self):
+        self.testee.start()
+        dead = self.testee.workers[0]
+        ran = threading.Event()
+        parents = []
+
+        def job():
+            parents.append(command.token.parent)
+            ran.set()
+        command = Command(job, token=dead.token.child())
+        dead.stop(5)
+        dead.commands.put(command)
+        self.testee.submit(MagicMock())
+        self.assertNotIn(dead, self.testee.workers)
+        self.gui_side.retire.assert_called_once_with(dead)
+        replacement = self.testee.workers[0]
+        self.assertEqual(replacement.pending, 1)
+        self.assertTrue(ran.wait(5))
+        self.assertEqual(parents, [replacement.token])
+        self.assertEqual(dead.token.callbacks, [])
+        self.assertEqual(self.futures[-1][0], self.testee.workers[1])
+
+    def test_shutdown(self):
+        self.testee.start()
+        worker = self.testee.workers[0]
+        command = Command(MagicMock(), token=worker.token.child())
+        worker.commands.put(command)
+        worker.commands.put(Command(MagicMock()))
+        self.testee.shutdown(timeout=5, cancel_pending=True)
+        self.assertFalse(worker.is_alive())
+        self.assertTrue(command.future.cancelled())
+        self.assertIsNone(command.token.parent)
+        self.assertEqual(worker.token.callbacks, [])
+        self.gui_side.retire.assert_called_once_with(worker)
+        with self.assertRaises(RuntimeError):
+            self.testee.submit(MagicMock())
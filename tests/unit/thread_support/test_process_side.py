@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for ProcessSide and ChildSide.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+from queue import Queue
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from qgis_plutil.thread_support.codec import PickleCodec
+from qgis_plutil.thread_support.messages.goodbye import GoodbyeMessage
+from qgis_plutil.thread_support.messages.hello import HelloMessage
+from qgis_plutil.thread_support.process_side import (
+    ProcessSide, ChildSide, run_child
+)
+
+logger = logging.getLogger('tests.plutil.thread_support.process_side')
+
+
+class TestChildSide(TestCase):
+    def test_run_child(self):
+        channel = Queue()
+        codec = PickleCodec()
+        target = MagicMock()
+        run_child(codec, channel, target, (1,), {'a': 2})
+
+        args, kwargs = target.call_args
+        self.assertIsInstance(args[0], ChildSide)
+        self.assertEqual(args[1:], (1,))
+        self.assertEqual(kwargs, {'a': 2})
+
+        hello = codec.decode(channel.get(block=False), None, None)
+        self.assertIsInstance(hello, HelloMessage)
+        goodbye = codec.decode(channel.get(block=False), None, None)
+        self.assertIsInstance(goodbye, GoodbyeMessage)
+        self.assertIsNone(channel.get(block=False))
+
+    def test_post(self):
+        channel = Queue()
+        codec = PickleCodec()
+        testee = ChildSide(codec, channel)
+        self.assertTrue(testee.send_to_gui(HelloMessage(None, None)))
+        self.assertEqual(channel.qsize(), 1)
+
+    def test_post_hands_over(self):
+        codec = MagicMock()
+        testee = ChildSide(codec, Queue())
+        message = MagicMock()
+        self.assertTrue(testee.post(message))
+        codec.encode.assert_called_once_with(message)
+        message.hand_over.assert_called_once_with()
+
+    def test_run_child_failure(self):
+        channel = Queue()
+        run_child(PickleCodec(), channel,
+                  MagicMock(side_effect=RuntimeError), (), {})
+        channel.get(block=False)
+        channel.get(block=False)
+        self.assertIsNone(channel.get(block=False))
+
+
+class TestProcessSide(TestCase):
+    def setUp(self):
+        self.plugin = MagicMock()
+        self.testee = ProcessSide(self.plugin, MagicMock(), args=(1,))
+
+    def tearDown(self):
+        self.testee = None
+
+    def test_init(self):
+        self.assertIsInstance(self.testee.codec, PickleCodec)
+        self.assertEqual(self.testee.args, (1,))
+        self.assertEqual(self.testee.kwargs, {})
+        self.assertIsNone(self.testee.process)
+        self.assertFalse(self.testee.is_alive())
+
+    def test_pump(self):
+        gui_side = MagicMock()
+        self.testee.gui_side = gui_side
+        codec = self.testee.codec
+        self.testee.channel = Queue()
+        self.testee.channel.put(codec.encode(HelloMessage(None, None)))
+        self.testee.channel.put(b'garbage')
+        self.testee.channel.put(None)
+        self.testee.pump()
+
+        message = self.testee.queue.get(block=False)
+        self.assertIsInstance(message, HelloMessage)
+        self.assertIs(message.plugin, self.plugin)
+        self.assertIs(message.thread_side, self.testee)
+        self.assertTrue(self.testee.queue.empty())
+        gui_side.notify.assert_called_once_with(self.testee)
+
+    def test_pump_dead_child(self):
+        self.testee.gui_side = MagicMock()
+        self.testee.channel = Queue()
+        self.testee.channel.put(
+            self.testee.codec.encode(HelloMessage(None, None)))
+        # The child died without telling the pump.
+        self.testee.process = MagicMock()
+        self.testee.process.is_alive.return_value = False
+        self.testee.POLL_INTERVAL = 0.01
+        self.testee.pump()
+        self.assertEqual(self.testee.queue.qsize(), 1)
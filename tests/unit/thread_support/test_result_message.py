@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for ResultMessage.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+from concurrent.futures import CancelledError, Future
+from queue import Full
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from qgis_plutil.constants import DONT_ADD_TO_QUEUE
+from qgis_plutil.thread_support.messages.result import ResultMessage
+
+logger = logging.getLogger('tests.plutil.thread_support.result')
+
+
+class TestResultMessage(TestCase):
+    def setUp(self):
+        self.plugin = MagicMock()
+        self.thread_side = MagicMock()
+        self.future = Future()
+        self.future.set_running_or_notify_cancel()
+
+    def test_result(self):
+        testee = ResultMessage(
+            self.plugin, self.thread_side, self.future, result=7)
+        self.assertEqual(testee.on_gui_side(), DONT_ADD_TO_QUEUE)
+        self.assertEqual(self.future.result(0), 7)
+
+    def test_exception(self):
+        exc = ValueError()
+        testee = ResultMessage(
+            self.plugin, self.thread_side, self.future, exception=exc)
+        self.assertEqual(testee.on_gui_side(), DONT_ADD_TO_QUEUE)
+        self.assertIs(self.future.exception(0), exc)
+
+    def test_dropped(self):
+        testee = ResultMessage(
+            self.plugin, self.thread_side, self.future, result=7)
+        testee.on_dropped()
+        self.assertIsInstance(self.future.exception(0), Full)
+
+    def test_cancelled(self):
+        testee = ResultMessage(
+            self.plugin, self.thread_side, self.future, result=7)
+        testee.on_cancelled()
+        self.assertIsInstance(self.future.exception(0), CancelledError)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for RoundRobinScheduler and WeightedFairScheduler.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+from unittest import TestCase
+
+from qgis_plutil.thread_support.scheduling import (
+    RoundRobinScheduler, WeightedFairScheduler
+)
+
+logger = logging.getLogger('tests.plutil.thread_support.scheduling')
+
+
+class TestRoundRobinScheduler(TestCase):
+    def setUp(self):
+        self.testee = RoundRobinScheduler()
+
+    def tearDown(self):
+        self.testee = None
+
+    def test_init(self):
+        self.assertEqual(self.testee.turns, 0)
+        self.assertEqual(self.testee.usage, {})
+        self.assertIsNotNone(str(self.testee))
+        self.assertIsNotNone(repr(self.testee))
+
+    def test_plan_rotates(self):
+        self.assertEqual(self.testee.plan([]), [])
+        ready = ['a', 'b', 'c']
+        self.assertEqual(self.testee.plan(ready), ['a', 'b', 'c'])
+        self.assertEqual(self.testee.plan(ready), ['b', 'c', 'a'])
+        self.assertEqual(self.testee.plan(ready), ['c', 'a', 'b'])
+        self.assertEqual(self.testee.plan(ready), ['a', 'b', 'c'])
+        self.assertEqual(ready, ['a', 'b', 'c'])
+
+    def test_share(self):
+        self.assertAlmostEqual(self.testee.share('a', ['a', 'b', 'c']), 1 / 3)
+        self.assertAlmostEqual(self.testee.share('b', ['b', 'c']), 0.5)
+        self.assertAlmostEqual(self.testee.share('c', ['c']), 1.0)
+
+    def test_charge(self):
+        self.testee.charge('a', 3, 0.5)
+        self.testee.charge('a', 2, 0.25)
+        self.assertEqual(self.testee.usage_of('a'), {
+            'messages': 5, 'busy_time': 0.75, 'visits': 2, 'weight': 1.0})
+        self.assertEqual(self.testee.usage_of('b')['messages'], 0)
+        self.testee.forget('a')
+        self.assertEqual(self.testee.usage, {})
+
+
+class TestWeightedFairScheduler(TestCase):
+    def setUp(self):
+        self.testee = WeightedFairScheduler(weights={'a': 3})
+
+    def tearDown(self):
+        self.testee = None
+
+    def test_weights(self):
+        self.assertEqual(self.testee.weight_of('a'), 3)
+        self.assertEqual(self.testee.weight_of('b'), 1.0)
+        self.assertAlmostEqual(self.testee.share('a', ['a', 'b']), 0.75)
+        self.assertAlmostEqual(self.testee.share('b', ['a', 'b']), 0.25)
+        with self.assertRaises(ValueError):
+            self.testee.set_weight('b', 0)
+
+    def test_plan_least_served_first(self):
+        self.assertEqual(self.testee.plan(['a', 'b']), ['a', 'b'])
+        self.testee.charge('a', 1, 0.3)
+        self.testee.charge('b', 1, 0.2)
+        # a used more time but has three times the weight.
+        self.assertEqual(self.testee.plan(['a', 'b']), ['a', 'b'])
+        self.testee.charge('a', 1, 0.6)
+        self.assertEqual(self.testee.plan(['a', 'b']), ['b', 'a'])
+
+    def test_idle_side_does_not_catch_up(self):
+        self.testee.plan(['a', 'b'])
+        for i in range(10):
+            self.testee.charge('a', 1, 3.0)
+            self.testee.plan(['a'])
+        # b was idle; it starts from the clock, not from zero.
+        self.testee.plan(['a', 'b'])
+        self.assertEqual(self.testee.virtual['b'], self.testee.clock)
+        self.assertGreater(self.testee.clock, 0)
+        self.testee.charge('b', 1, 100.0)
+        self.assertEqual(self.testee.plan(['a', 'b']), ['a', 'b'])
+
+    def test_forget(self):
+        self.testee.charge('a', 1, 0.3)
+        self.assertIn('virtual_time', self.testee.usage_of('a'))
+        self.testee.forget('a')
+        self.assertEqual(self.testee.virtual, {})
+        self.assertEqual(self.testee.weights, {})
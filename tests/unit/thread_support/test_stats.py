@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for LatencyHistogram and MessageStats.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import json
+import logging
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from qgis_plutil.thread_support.messages.base import TsMessage
+from qgis_plutil.thread_support.messages.hello import HelloMessage
+from qgis_plutil.thread_support.stats import LatencyHistogram, MessageStats
+
+logger = logging.getLogger('tests.plutil.thread_support.stats')
+
+
+class TestLatencyHistogram(TestCase):
+    def setUp(self):
+        self.testee = LatencyHistogram()
+
+    def tearDown(self):
+        self.testee = None
+
+    def test_empty(self):
+        self.assertEqual(len(self.testee), 0)
+        self.assertIsNone(self.testee.percentile(0.5))
+        self.assertEqual(self.testee.as_dict(), {
+            'count': 0, 'mean': None, 'min': None, 'max': None,
+            'p50': None, 'p95': None, 'p99': None})
+        self.assertIsNotNone(str(self.testee))
+        self.assertIsNotNone(repr(self.testee))
+
+    def test_buckets(self):
+        self.assertEqual(LatencyHistogram.bucket_of(0), 0)
+        self.assertEqual(LatencyHistogram.bucket_of(-1.0), 0)
+        self.assertEqual(LatencyHistogram.bucket_of(1e-12), 0)
+        self.assertEqual(LatencyHistogram.bucket_of(1e6),
+                         LatencyHistogram.BUCKET_COUNT - 1)
+        for seconds in (2e-6, 1e-5, 3.3e-4, 0.0123, 0.5, 1.0, 7.0, 100.0):
+            index = LatencyHistogram.bucket_of(seconds)
+            self.assertLess(seconds, LatencyHistogram.upper_bound(index))
+            self.assertGreaterEqual(
+                seconds, LatencyHistogram.upper_bound(index - 1))
+
+    def test_percentiles(self):
+        # 1 ms to 100 ms in 1 ms steps.
+        for i in range(1, 101):
+            self.testee.record(i / 1000.0)
+        self.assertEqual(len(self.testee), 100)
+        stats = self.testee.as_dict()
+        self.assertAlmostEqual(stats['mean'], 0.0505)
+        self.assertEqual(stats['max'], 0.1)
+        for key, exact in (('p50', 0.050), ('p95', 0.095), ('p99', 0.099),
+                           ('min', 0.001)):
+            self.assertGreaterEqual(stats[key], exact)
+            self.assertLessEqual(
+                stats[key], exact * (1 + 1.0 / LatencyHistogram.SUB_BUCKETS))
+
+
+class TestMessageStats(TestCase):
+    def setUp(self):
+        self.testee = MessageStats()
+
+    def tearDown(self):
+        self.testee = None
+
+    def test_record(self):
+        message = TsMessage(None, None)
+        self.testee.record(message, 1.0, 1.5, 1.75)
+        self.testee.record(HelloMessage(None, None), None, 2.0, 2.25)
+        stats = self.testee.as_dict()
+        self.assertEqual(set(stats), {'TsMessage', 'HelloMessage'})
+        self.assertEqual(stats['TsMessage']['wait']['max'], 0.5)
+        self.assertEqual(stats['TsMessage']['handler']['max'], 0.25)
+        self.assertEqual(stats['TsMessage']['total']['max'], 0.75)
+        # Without the moment it was posted only the handler is known.
+        self.assertEqual(stats['HelloMessage']['wait']['count'], 0)
+        self.assertEqual(stats['HelloMessage']['handler']['count'], 1)
+        json.dumps(stats)
+
+        self.testee.reset()
+        self.assertEqual(self.testee.as_dict(), {})
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for GuiTask.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from qgis_plutil.thread_support.tasks import GuiTask, checkpoint
+
+logger = logging.getLogger('tests.plutil.thread_support.tasks')
+
+
+def generator_handler(log, count):
+    for i in range(count):
+        log.append(i)
+        yield
+    return 'done'
+
+
+async def coroutine_handler(log, count):
+    for i in range(count):
+        log.append(i)
+        await checkpoint()
+    return 'done'
+
+
+class TestGuiTask(TestCase):
+    def setUp(self):
+        self.thread_side = MagicMock()
+        self.message = MagicMock()
+
+    def test_is_resumable(self):
+        self.assertTrue(GuiTask.is_resumable(generator_handler([], 1)))
+        routine = coroutine_handler([], 1)
+        self.assertTrue(GuiTask.is_resumable(routine))
+        routine.close()
+        self.assertFalse(GuiTask.is_resumable(None))
+        self.assertFalse(GuiTask.is_resumable(True))
+        self.assertFalse(GuiTask.is_resumable([1, 2]))
+
+    def test_has_resumable_handler(self):
+        class Plain(object):
+            def on_gui_side(self):
+                return 1
+
+        class Generator(object):
+            def on_gui_side(self):
+                yield
+
+        class Coroutine(object):
+            async def on_gui_side(self):
+                await checkpoint()
+
+        self.assertFalse(GuiTask.has_resumable_handler(Plain()))
+        self.assertTrue(GuiTask.has_resumable_handler(Generator()))
+        self.assertTrue(GuiTask.has_resumable_handler(Coroutine()))
+
+    def check_steps(self, handler):
+        log = []
+        testee = GuiTask(self.thread_side, self.message, handler(log, 3))
+        self.assertIsNotNone(str(testee))
+        self.assertIsNotNone(repr(testee))
+        self.assertFalse(testee.step())
+        self.assertEqual(log, [0])
+        self.assertFalse(testee.step())
+        self.assertFalse(testee.step())
+        self.assertEqual(log, [0, 1, 2])
+        self.assertTrue(testee.step())
+        self.assertTrue(testee.done)
+        self.assertEqual(testee.result, 'done')
+        self.assertIsNone(testee.exception)
+        self.assertEqual(testee.steps, 4)
+        self.assertGreater(testee.busy_time, 0.0)
+
+    def test_generator(self):
+        self.check_steps(generator_handler)
+
+    def test_coroutine(self):
+        self.check_steps(coroutine_handler)
+
+    def test_exception(self):
+        def failing():
+            yield
+            raise KeyError('x')
+
+        testee = GuiTask(self.thread_side, self.message, failing())
+        self.assertFalse(testee.step())
+        self.assertTrue(testee.step())
+        self.assertIsInstance(testee.exception, KeyError)
+
+    def test_cancel(self):
+        cleaned = []
+
+        def handler():
+            try:
+                while True:
+                    yield
+            finally:
+                cleaned.append(True)
+
+        testee = GuiTask(self.thread_side, self.message, handler())
+        testee.step()
+        testee.cancel()
+        self.assertTrue(testee.done)
+        self.assertEqual(cleaned, [True])
+        testee.cancel()
@@ -9,17 +9,32 @@ import logging
 import os
 import shutil
 import tempfile
-from queue import Queue
+import threading
+from queue import Queue, Full
 from unittest import TestCase, SkipTest
 from unittest.mock import MagicMock
 
+from qgis_plutil.thread_support.cancel import CancelToken
+from qgis_plutil.thread_support.command import Command
+from qgis_plutil.thread_support.lanes import LaneQueue
 from qgis_plutil.thread_support.messages.base import TsMessage
+from qgis_plutil.thread_support.messages.batch import BatchMessage
+from qgis_plutil.thread_support.messages.call import CallMessage
+from qgis_plutil.thread_support.messages.coalescing import CoalescingMessage
+from qgis_plutil.thread_support.messages.goodbye import GoodbyeMessage
 from qgis_plutil.thread_support.messages.hello import HelloMessage
+from qgis_plutil.thread_support.messages.result import ResultMessage
 from qgis_plutil.thread_support.thread_side import ThreadSide
 
 logger = logging.getLogger('tests.plutil.thread_side')
 
 
+def make_message():
+    """ A stand-in for a message in the normal lane. """
+    return MagicMock(spec=TsMessage, priority=TsMessage.PRIORITY_NORMAL,
+                     enqueued=None, token=None, deadline=None)
+
+
 class TestThreadSide(TestCase):
     def setUp(self):
         self.plugin = MagicMock()
@@ -35,6 +50,7 @@ class TestThreadSide(TestCase):
         self.assertEqual(testee.plugin, plugin)
         self.assertIsInstance(testee.queue, Queue)
         self.assertEqual(testee.state, testee.STATE_DISCONNECTED)
+        self.assertIsNot(testee.sig, self.testee.sig)
 
     def test_thread_side_started(self):
         self.assertEqual(self.testee.state, self.testee.STATE_DISCONNECTED)
@@ -48,13 +64,285 @@ class TestThreadSide(TestCase):
         message = args[0]
         self.assertIsInstance(message, HelloMessage)
 
+    def test_thread_side_finished(self):
+        self.testee.gui_side = MagicMock()
+        buffered = make_message()
+        self.testee.send_buffered(buffered)
+        self.testee.thread_side_finished()
+        # The buffered messages are send before the goodbye, which
+        # overtakes them in the control lane.
+        self.assertIsInstance(self.testee.queue.get(), GoodbyeMessage)
+        self.assertEqual(self.testee.queue.get().messages, [buffered])
+
+    def test_has_finished(self):
+        self.assertFalse(self.testee.has_finished())
+
+        class Thread(ThreadSide, threading.Thread):
+            def run(self):
+                pass
+
+        thread = Thread(self.plugin)
+        self.assertFalse(thread.has_finished())
+        thread.start()
+        thread.join()
+        self.assertTrue(thread.has_finished())
+
     def test_send_to_gui(self):
         self.testee.sig.clear()
-        message = MagicMock(spec=TsMessage)
+        message = make_message()
         message.message_id = 999
-        self.testee.send_to_gui(message)
+        self.assertTrue(self.testee.send_to_gui(message))
+        self.assertIsInstance(message.enqueued, float)
         message.on_thread_side.assert_called_once()
         self.assertEqual(self.testee.queue.qsize(), 1)
         back = self.testee.queue.get()
         self.assertEqual(back, message)
         self.assertTrue(self.testee.sig.is_set())
+
+    def test_bound_queue(self):
+        gui_side = MagicMock()
+        self.testee.gui_side = gui_side
+        with self.assertRaises(ValueError):
+            self.testee.bound_queue(2, 'xxx')
+        self.testee.bound_queue(2, LaneQueue.OVERFLOW_DROP_NEWEST)
+        messages = [make_message() for i in range(3)]
+        self.assertEqual([self.testee.send_to_gui(message)
+                          for message in messages], [True, True, False])
+        messages[2].on_dropped.assert_called_once()
+        self.assertEqual(gui_side.notify.call_count, 2)
+        stats = self.testee.queue_stats()
+        self.assertEqual(stats['size'], 2)
+        self.assertEqual(stats['maxsize'], 2)
+        self.assertEqual(stats['dropped'], 1)
+
+        self.testee.bound_queue(2, LaneQueue.OVERFLOW_DROP_OLDEST)
+        self.assertTrue(self.testee.send_to_gui(messages[2]))
+        messages[0].on_dropped.assert_called_once()
+
+        self.testee.bound_queue(2, LaneQueue.OVERFLOW_RAISE)
+        with self.assertRaises(Full):
+            self.testee.send_to_gui(make_message())
+
+    def test_call_in_gui_dropped(self):
+        self.testee.bound_queue(1, LaneQueue.OVERFLOW_DROP_NEWEST)
+        self.testee.send_to_gui(MagicMock(
+            spec=TsMessage, priority=TsMessage.PRIORITY_INTERACTIVE))
+        future = self.testee.call_in_gui(MagicMock())
+        self.assertIsInstance(future.exception(timeout=0), Full)
+
+    def test_coalescing(self):
+        gui_side = MagicMock()
+        self.testee.gui_side = gui_side
+        first = CoalescingMessage(self.plugin, self.testee, 'a')
+        second = CoalescingMessage(self.plugin, self.testee, 'a')
+        other = CoalescingMessage(self.plugin, self.testee, 'b')
+        for message in (first, second, other):
+            self.assertTrue(self.testee.send_to_gui(message))
+        self.assertEqual(self.testee.queue.qsize(), 2)
+        self.assertEqual(gui_side.notify.call_count, 2)
+        stats = self.testee.queue_stats()
+        self.assertEqual(stats['coalesced'], 2)
+        self.assertEqual(stats['superseded'], 1)
+
+        self.assertIs(self.testee.queue.get_nowait(), first)
+        self.assertIs(self.testee.take_coalesced('a'), second)
+        self.assertIsNone(self.testee.take_coalesced('a'))
+
+        # Once taken, the next update is queued again.
+        third = CoalescingMessage(self.plugin, self.testee, 'a')
+        self.testee.send_to_gui(third)
+        self.assertEqual(self.testee.queue.qsize(), 2)
+
+    def test_coalescing_dropped(self):
+        self.testee.bound_queue(1, LaneQueue.OVERFLOW_DROP_NEWEST)
+        self.testee.send_to_gui(make_message())
+        first = CoalescingMessage(self.plugin, self.testee, 'a')
+        self.assertFalse(self.testee.send_to_gui(first))
+        self.assertEqual(self.testee.coalesced, {})
+
+        self.testee.bound_queue(1, LaneQueue.OVERFLOW_RAISE)
+        with self.assertRaises(Full):
+            self.testee.send_to_gui(first)
+        self.assertEqual(self.testee.coalesced, {})
+
+    def test_coalescing_dropped_oldest(self):
+        self.testee.bound_queue(2, LaneQueue.OVERFLOW_DROP_OLDEST)
+        first = CoalescingMessage(self.plugin, self.testee, 'a')
+        latest = CoalescingMessage(self.plugin, self.testee, 'a')
+        self.testee.send_to_gui(first)
+        self.testee.send_to_gui(latest)
+        self.testee.send_to_gui(make_message())
+        self.testee.send_to_gui(make_message())
+        self.assertEqual(self.testee.queue.qsize(), 2)
+        self.assertEqual(self.testee.coalesced, {'a': latest})
+        queued = [self.testee.queue.get_nowait() for i in range(2)]
+        self.assertIs(queued[-1], latest)
+
+    def test_coalescing_not_batched(self):
+        messages = [make_message(),
+                    CoalescingMessage(self.plugin, self.testee, 'a'),
+                    make_message()]
+        self.testee.send_batch(messages)
+        self.assertEqual(self.testee.queue.qsize(), 2)
+        self.assertIs(self.testee.queue.get_nowait(), messages[1])
+        self.assertEqual(self.testee.queue.get_nowait().messages,
+                         [messages[0], messages[2]])
+
+    def test_tokens(self):
+        self.assertIsInstance(self.testee.token, CancelToken)
+        self.assertIsNone(self.testee.job_token)
+        self.assertFalse(self.testee.cancelled)
+        self.assertIs(self.testee.current_token(), self.testee.token)
+
+        message = TsMessage(self.plugin, self.testee)
+        self.testee.send_to_gui(message)
+        self.assertIs(message.token, self.testee.token)
+
+        parent = CancelToken()
+        self.testee.token.link(parent)
+        old = self.testee.renew_token()
+        self.assertIsNot(old, self.testee.token)
+        self.assertIs(self.testee.token.parent, parent)
+        self.assertIsNone(old.parent)
+        old.cancel()
+        self.assertFalse(self.testee.cancelled)
+        parent.cancel()
+        self.assertTrue(self.testee.cancelled)
+
+    def test_execute_with_token(self):
+        seen = []
+        token = self.testee.token.child()
+
+        def work():
+            seen.append(self.testee.current_token())
+            self.testee.send_to_gui(TsMessage(self.plugin, self.testee))
+            return 1
+
+        command = Command(work, token=token)
+        self.testee.execute(command)
+        self.assertEqual(seen, [token])
+        self.assertIsNone(self.testee.job_token)
+        self.assertIsNone(token.parent)
+        message = self.testee.queue.get_nowait()
+        result = self.testee.queue.get_nowait()
+        self.assertIs(message.token, token)
+        self.assertIs(result.token, token)
+
+        # A cancelled command does not run and sends nothing.
+        fn = MagicMock()
+        token = CancelToken()
+        token.cancel()
+        self.testee.execute(Command(fn, token=token))
+        fn.assert_not_called()
+        self.assertEqual(self.testee.queue.qsize(), 0)
+
+    def test_send_to_gui_notifies(self):
+        gui_side = MagicMock()
+        self.testee.gui_side = gui_side
+        message = make_message()
+        message.message_id = 999
+        self.testee.send_to_gui(message)
+        gui_side.notify.assert_called_once_with(self.testee)
+
+    def test_send_batch(self):
+        gui_side = MagicMock()
+        self.testee.gui_side = gui_side
+        messages = [make_message() for i in range(5)]
+        self.testee.send_batch(messages)
+        for message in messages:
+            message.on_thread_side.assert_called_once()
+        self.assertEqual(self.testee.queue.qsize(), 1)
+        back = self.testee.queue.get()
+        self.assertIsInstance(back, BatchMessage)
+        self.assertEqual(back.messages, messages)
+        gui_side.notify.assert_called_once_with(self.testee)
+
+        self.testee.send_batch([])
+        self.assertEqual(self.testee.queue.qsize(), 0)
+
+    def test_send_batch_control(self):
+        self.testee.gui_side = MagicMock()
+        self.testee.bound_queue(2, LaneQueue.OVERFLOW_DROP_NEWEST)
+        hello = HelloMessage(self.plugin, self.testee)
+        messages = [make_message() for i in range(5)]
+        self.assertTrue(self.testee.send_batch([hello] + messages))
+        # The control message travels alone, the data in the envelope.
+        self.assertIs(self.testee.queue.get(), hello)
+        back = self.testee.queue.get()
+        self.assertEqual(back.messages, messages)
+        self.assertEqual(back.priority, TsMessage.PRIORITY_NORMAL)
+
+    def test_send_buffered_size(self):
+        self.testee.batch_size = 3
+        self.testee.batch_interval = 1000
+        messages = [make_message() for i in range(7)]
+        for message in messages:
+            self.testee.send_buffered(message)
+        self.assertEqual(self.testee.queue.qsize(), 2)
+        self.assertEqual(self.testee.queue.get().messages, messages[0:3])
+        self.assertEqual(self.testee.queue.get().messages, messages[3:6])
+        self.assertEqual(self.testee.buffer, messages[6:])
+
+        self.testee.flush()
+        self.assertEqual(self.testee.queue.get().messages, messages[6:])
+        self.assertEqual(self.testee.buffer, [])
+        self.testee.flush()
+        self.assertEqual(self.testee.queue.qsize(), 0)
+
+    def test_send_buffered_time(self):
+        self.testee.batch_size = 1000
+        self.testee.batch_interval = 0.0
+        message = make_message()
+        self.testee.send_buffered(message)
+        self.assertEqual(self.testee.queue.get().messages, [message])
+
+    def test_process_commands(self):
+        self.testee.send_to_gui = MagicMock()
+        command = Command(MagicMock(return_value=3))
+        self.testee.commands.put(command)
+        self.assertTrue(self.testee.process_commands())
+        self.testee.send_to_gui.assert_called_once()
+        args, kwargs = self.testee.send_to_gui.call_args
+        self.assertIsInstance(args[0], ResultMessage)
+        self.assertEqual(args[0].result, 3)
+
+        self.testee.stop_commands()
+        self.assertFalse(self.testee.process_commands())
+
+    def test_run_commands(self):
+        self.testee.send_to_gui = MagicMock()
+        self.testee.idle = MagicMock()
+        commands = [Command(MagicMock()) for i in range(3)]
+        commands[1].future.cancel()
+        for command in commands:
+            self.testee.commands.put(command)
+        self.testee.stop_commands()
+        self.testee.run_commands(poll_interval=0.001)
+        self.assertEqual(self.testee.send_to_gui.call_count, 2)
+        commands[1].fn.assert_not_called()
+
+    def test_execute_flushes_first(self):
+        self.testee.send_batch = MagicMock()
+        self.testee.send_to_gui = MagicMock()
+        buffered = make_message()
+
+        def produce():
+            self.testee.send_buffered(buffered)
+            self.testee.send_batch.assert_not_called()
+        self.testee.batch_interval = 1000
+        self.testee.execute(Command(produce))
+        self.testee.send_batch.assert_called_once_with([buffered])
+        self.testee.send_to_gui.assert_called_once()
+
+    def test_call_in_gui(self):
+        self.testee.send_to_gui = MagicMock()
+        fn = MagicMock()
+        future = self.testee.call_in_gui(fn, 1, timeout=2, b=3)
+        self.testee.send_to_gui.assert_called_once()
+        args, kwargs = self.testee.send_to_gui.call_args
+        message = args[0]
+        self.assertIsInstance(message, CallMessage)
+        self.assertIs(message.future, future)
+        self.assertEqual(message.args, (1,))
+        self.assertEqual(message.kwargs, {'b': 3})
+        self.assertIsNotNone(message.deadline)
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for Worker.
+"""
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import logging
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from qgis_plutil.thread_support.command import Command
+from qgis_plutil.thread_support.messages.goodbye import GoodbyeMessage
+from qgis_plutil.thread_support.messages.hello import HelloMessage
+from qgis_plutil.thread_support.messages.result import ResultMessage
+from qgis_plutil.thread_support.worker import Worker
+
+logger = logging.getLogger('tests.plutil.thread_support.worker')
+
+
+class TestWorker(TestCase):
+    def setUp(self):
+        self.plugin = MagicMock()
+        self.testee = Worker(self.plugin, name="TestWorker")
+
+    def tearDown(self):
+        if self.testee.is_alive():
+            self.testee.stop(1)
+        self.testee = None
+
+    def test_init(self):
+        self.assertEqual(self.testee.name, "TestWorker")
+        self.assertTrue(self.testee.daemon)
+        self.assertEqual(self.testee.plugin, self.plugin)
+        self.assertIsNone(self.testee.gui_side)
+        self.assertIsNone(self.testee.poll_interval)
+
+    def test_run(self):
+        command = Command(lambda x: x * 2, (21,))
+        self.testee.commands.put(command)
+        self.testee.start()
+        self.testee.stop(5)
+        self.assertFalse(self.testee.is_alive())
+
+        self.assertIsInstance(self.testee.queue.get(block=False),
+                              HelloMessage)
+        # Control messages go first.
+        self.assertIsInstance(self.testee.queue.get(block=False),
+                              GoodbyeMessage)
+        result = self.testee.queue.get(block=False)
+        self.assertIsInstance(result, ResultMessage)
+        self.assertEqual(result.result, 42)
+        self.assertIs(result.future, command.future)